@@ -0,0 +1,243 @@
+import json
+import os
+import platform
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import _backend as b
+
+
+# ---------------- unlock agent --------------------
+# An ssh-agent style daemon: it unlocks the vault once and answers read requests over a Unix
+# domain socket until its TTL runs out, so scripts don't pay for the master password hash and
+# the key derivation on every call.
+#
+# Protocol: one JSON object per line in both directions, answered in order, so clients can keep
+# the connection open and pipeline as many requests as they like.
+#   {"op": "get", "name": "github"}       -> {"ok": true, "value": "..."}
+#   {"op": "get", "name": "github", "field": "username"}
+#   {"op": "list"}                        -> {"ok": true, "names": [...]}
+#   {"op": "list", "filters": [["tag", "work"], ["host", "github.com"]]}
+#   {"op": "search", "query": "git tag:work", "limit": 5}
+#   {"op": "ping"} / {"op": "stop"}
+# An "id" in the request is echoed back in its response.
+SOCKET_ENV = 'PM_AGENT_SOCK'
+SOCKET_NAME = 'agent.sock'
+DEFAULT_TTL = 15 * 60
+REQUIRED_ARGUMENTS = {'get': ('name',), 'search': ('query',)}
+PIPELINE_BYTES = 64 * 1024  # unanswered request bytes per client, well inside a socket buffer so sends never block
+
+
+class AgentError(Exception):
+    pass
+
+
+def get_socket_path() -> Path:
+    # one agent per profile, it serves the vault of the profile it was started for
+    if os.getenv(SOCKET_ENV):
+        return Path(os.environ[SOCKET_ENV])
+    runtime_dir = Path(os.getenv('XDG_RUNTIME_DIR', tempfile.gettempdir()))
+    name = SOCKET_NAME if b.get_profile() == b.DEFAULT_PROFILE else f'{b.get_profile()}.{SOCKET_NAME}'
+    return runtime_dir / f'pm-agent-{os.getuid()}' / name
+
+def agent_is_supported() -> bool:
+    return hasattr(socket, 'AF_UNIX') and platform.system() != 'Windows'
+
+
+class AgentRequestHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        # the socket directory is private already, refuse other users anyway where the OS tells us who they are
+        if hasattr(socket, 'SO_PEERCRED'):
+            creds = self.request.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+            _, uid, _ = struct.unpack('3i', creds)
+            if uid != os.getuid():
+                raise PermissionError(f"agent connection from uid {uid} refused")
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as exc:
+                request, response = {}, {'ok': False, 'error': f"bad request: {exc}"}
+            else:
+                try:
+                    response = self.server.agent.handle(request)
+                except Exception as exc:
+                    response = {'ok': False, 'error': str(exc)}
+
+            if 'id' in request:
+                response['id'] = request['id']
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+            if request.get('op') == 'stop':
+                break
+
+
+class AgentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class Agent:
+    def __init__(self, socket_path: Path = None, ttl: float = DEFAULT_TTL):
+        self.socket_path = get_socket_path() if socket_path is None else Path(socket_path)
+        self.ttl = ttl
+        self.expires_at = None
+        self.server: AgentServer | None = None
+        # names and their search index (only the names are decrypted), rebuilt only when the vault changed on disk
+        self._listing_lock = threading.Lock()
+        self._listing_signature = None
+        self._names: list[str] = []
+        self._index = None
+
+    def listing(self):
+        from _search import SearchIndex
+        with self._listing_lock:
+            signature = b.get_vault_signature()
+            if signature != self._listing_signature:
+                entries = b.get_entries_from_vault()
+                self._names = sorted(entries, key=str.lower)
+                self._index = SearchIndex(self._names, {name: entry.terms for name, entry in entries.items()})
+                self._listing_signature = signature
+            return self._names, self._index
+
+    def handle(self, request: dict) -> dict:
+        from _search import parse_query
+        op = request.get('op')
+        if op == 'ping':
+            return {'ok': True, 'expires_in': round(self.expires_at - time.monotonic())}
+        for key in REQUIRED_ARGUMENTS.get(op, ()):
+            if not isinstance(request.get(key), str):
+                return {'ok': False, 'error': f"{op} needs a {key!r} string"}
+        if op == 'get':
+            value = b.get_password_from_vault(request['name'], request.get('field', 'value'))
+            if value is None:
+                return {'ok': False, 'error': 'not found'}
+            return {'ok': True, 'value': value}
+        if op == 'list':
+            names, index = self.listing()
+            if request.get('filters'):
+                names = index.search('', terms=b.query_terms(request['filters']))
+            return {'ok': True, 'names': names}
+        if op == 'search':
+            _, index = self.listing()
+            query, filters = parse_query(request['query'])
+            terms = b.query_terms(filters) if filters else None
+            return {'ok': True, 'names': index.search(query, limit=request.get('limit'), terms=terms)}
+        if op == 'stop':
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return {'ok': True}
+        return {'ok': False, 'error': f'unknown op {op!r}'}
+
+    def bind(self) -> None:
+        # private directory first, so there is no window where the socket is reachable by others
+        directory = self.socket_path.parent
+        directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        os.chmod(directory, 0o700)
+        if self.socket_path.exists():
+            if AgentClient(self.socket_path).is_alive():
+                raise AgentError(f"an agent is already listening on {self.socket_path}")
+            self.socket_path.unlink()
+
+        old_umask = os.umask(0o177)
+        try:
+            self.server = AgentServer(str(self.socket_path), AgentRequestHandler)
+        finally:
+            os.umask(old_umask)
+        self.server.agent = self
+
+    def serve(self) -> None:
+        # expects an unlocked session, see `cli.py`
+        if self.server is None:
+            self.bind()
+        self.expires_at = time.monotonic() + self.ttl
+        timer = threading.Timer(self.ttl, self.server.shutdown)
+        timer.daemon = True
+        timer.start()
+        try:
+            self.server.serve_forever()
+        finally:
+            timer.cancel()
+            self.server.server_close()
+            try:
+                self.socket_path.unlink()
+            except FileNotFoundError:
+                pass
+            b.wait_for_compaction()
+            b.lock_session()
+
+
+class AgentClient:
+    def __init__(self, socket_path: Path = None, timeout: float = 5.0):
+        self.socket_path = get_socket_path() if socket_path is None else Path(socket_path)
+        self.timeout = timeout
+        self._sock = None
+        self._rfile = None
+
+    def connect(self) -> None:
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.settimeout(self.timeout)
+            try:
+                self._sock.connect(str(self.socket_path))
+            except OSError:
+                self.close()
+                raise
+            self._rfile = self._sock.makefile('rb')
+
+    def close(self) -> None:
+        if self._rfile is not None:
+            self._rfile.close()
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = self._rfile = None
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def request_many(self, requests: list[dict]) -> list[dict]:
+        # pipelined, but at most `PIPELINE_BYTES` ahead of the answers: sending everything first
+        # deadlocks once the agent blocks on writing answers nobody reads yet
+        self.connect()
+        lines = [json.dumps(request).encode() + b'\n' for request in requests]
+        responses = []
+        sent = in_flight = 0
+        while len(responses) < len(lines):
+            if in_flight <= PIPELINE_BYTES // 2:
+                end = sent
+                while end < len(lines) and (end == len(responses) or in_flight + len(lines[end]) <= PIPELINE_BYTES):
+                    in_flight += len(lines[end])
+                    end += 1
+                self._sock.sendall(b''.join(lines[sent:end]))
+                sent = end
+            line = self._rfile.readline()
+            if not line:
+                raise AgentError("agent closed the connection")
+            in_flight -= len(lines[len(responses)])
+            responses.append(json.loads(line))
+        return responses
+
+    def request(self, request: dict) -> dict:
+        return self.request_many([request])[0]
+
+    def is_alive(self) -> bool:
+        try:
+            return self.request({'op': 'ping'}).get('ok', False)
+        except (OSError, AgentError, ValueError):
+            return False
+        finally:
+            self.close()
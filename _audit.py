@@ -0,0 +1,197 @@
+import hashlib
+import os
+import re
+from array import array
+from collections import Counter
+from typing import Callable, Iterable, Iterator
+
+import _breach
+
+
+# ---------------- vault audit --------------------
+# One pass over the entries, a chunk at a time, so the work grows linearly with the vault:
+#
+#   - every value is looked up in the breach corpus and rated (`_breach.estimate_strength`)
+#   - and held against the policy: its length, its kinds of characters, the entry's name in it
+#   - reuse and near-duplicates are found by grouping, never by comparing pairs. Every distinct
+#     value gets a number, and its normal forms join it to other values with the same form in a
+#     union-find: the skeleton (lower case, digits and symbols at the ends dropped, substitutions
+#     undone: P@ssw0rd2024! -> password) and the stem (the skeleton up to its last separator:
+#     acme-corp.gmail -> acmecorp). Values whose forms are too short to mean anything aren't joined.
+#
+# Values and forms are grouped by a keyed BLAKE2b digest under a key made for this audit and
+# dropped with it, so the grouping tables hold no secrets and nothing that could be matched against
+# a guessed password afterwards.
+CHUNK_SIZE = 2_000
+DIGEST_SIZE = 16
+MIN_FORM_LENGTH = 6
+
+DEFAULT_POLICY = {
+    'min_length': 12,
+    'min_score': 2,  # see `_breach.STRENGTH_LABELS`, 2 = fair
+    'min_classes': 1,  # of lower case, upper case, digits and symbols
+    'name': True,  # values containing a word of their entry's name
+}
+PROBLEM_LABELS = {
+    'breached': "seen in data breaches",
+    'reused': "used by other entries too",
+    'similar': "a variation of other entries' passwords",
+    'weak': "easy to guess",
+    'short': "too short",
+    'classes': "too few kinds of characters",
+    'name': "contains the entry's name",
+}
+
+EDGES = re.compile(r'^[\W\d_]+|[\W\d_]+$')
+SEPARATORS = re.compile(r'[\s\-_.,:;/|]+')
+NAME_WORDS = re.compile(r'[^\W\d_]{4,}')
+
+
+class PolicyError(ValueError):
+    pass
+
+
+def normalize_policy(policy: dict = None) -> dict:
+    policy = {**DEFAULT_POLICY, **(policy or {})}
+    unknown = set(policy) - set(DEFAULT_POLICY)
+    if unknown:
+        raise PolicyError(f"unknown policy settings {', '.join(sorted(unknown))}")
+    if not 0 <= policy['min_score'] < len(_breach.STRENGTH_LABELS):
+        raise PolicyError(f"min_score must be between 0 and {len(_breach.STRENGTH_LABELS) - 1}")
+    if not 1 <= policy['min_classes'] <= 4:
+        raise PolicyError("min_classes must be between 1 and 4")
+    return policy
+
+def chunked(entries: list[tuple[str, str]], size: int = CHUNK_SIZE) -> Iterator[list[tuple[str, str]]]:
+    for i in range(0, len(entries), size):
+        yield entries[i:i + size]
+
+def character_classes(value: str) -> int:
+    return (value != value.upper()) + (value != value.lower()) + bool(_breach.DIGIT.search(value)) + (not value.isalnum())
+
+def normal_forms(value: str) -> set[str]:
+    # the skeleton and the stem, when long enough to tie values together
+    lower = EDGES.sub('', value.lower())
+    forms = {lower.translate(_breach.LEET)}
+    separators = list(SEPARATORS.finditer(lower))
+    if separators:
+        stem = EDGES.sub('', lower[:separators[-1].start()])
+        forms.add(SEPARATORS.sub('', stem).translate(_breach.LEET))
+    return {form for form in forms if len(form) >= MIN_FORM_LENGTH}
+
+def policy_problems(name: str, value: str, strength: dict, policy: dict) -> list[str]:
+    problems = []
+    if strength['score'] < policy['min_score']:
+        problems.append('weak')
+    if len(value) < policy['min_length']:
+        problems.append('short')
+    if character_classes(value) < policy['min_classes']:
+        problems.append('classes')
+    if policy['name']:
+        lower = value.lower()
+        if any(word in lower for word in NAME_WORDS.findall(name.lower())):
+            problems.append('name')
+    return problems
+
+def audit(chunks: Iterable[list[tuple[str, str]]], corpus: _breach.HashCorpus = None, policy: dict = None,
+          progress: Callable = None) -> dict:
+    # `chunks` of (name, value) as `_backend.iter_vault_entries` or `chunked` hand them out
+    policy = normalize_policy(policy)
+    key = os.urandom(32)
+
+    def digest(kind: bytes, text: str) -> bytes:
+        return hashlib.blake2b(kind + text.encode('utf-8', 'surrogatepass'), key=key, digest_size=DIGEST_SIZE).digest()
+
+    names = []
+    bits = array('f')
+    scores = bytearray()
+    value_numbers = array('L')  # entry -> number of its value
+    values = {}  # value digest -> value number
+    forms = {}  # form digest -> the first value number with that form
+    parents = array('L')  # union-find over value numbers
+
+    def find(number: int) -> int:
+        while parents[number] != number:
+            parents[number] = parents[parents[number]]
+            number = parents[number]
+        return number
+
+    findings = {}  # entry -> finding, for entries with a problem of their own
+    for chunk in chunks:
+        counts = corpus.counts([value for _, value in chunk]) if corpus is not None else [None] * len(chunk)
+        for (name, value), breached in zip(chunk, counts):
+            entry = len(names)
+            names.append(name)
+
+            value_digest = digest(b'v', value)
+            number = values.get(value_digest)
+            if number is None:
+                number = values[value_digest] = len(parents)
+                parents.append(number)
+                for form in normal_forms(value):
+                    other = find(forms.setdefault(digest(b'f', form), number))
+                    parents[find(number)] = other
+            value_numbers.append(number)
+
+            strength = _breach.estimate_strength(value)
+            bits.append(strength['bits'])
+            scores.append(strength['score'])
+            problems = (['breached'] if breached else []) + policy_problems(name, value, strength, policy)
+            if problems:
+                findings[entry] = {'name': name, 'problems': problems, 'breached': breached, **strength,
+                                   'reused': 0, 'similar': 0}
+        if progress is not None:
+            progress({'checked': len(names), 'found': len(findings)})
+
+    # groups: entries sharing a value, and the families of values joined by a form
+    entries_per_value = Counter(value_numbers)
+    families = {}
+    for number in range(len(parents)):
+        families.setdefault(find(number), []).append(number)
+    reused, similar = {}, {}
+    for entry, number in enumerate(value_numbers):
+        if entries_per_value[number] > 1:
+            reused.setdefault(number, []).append(entry)
+        family = families[find(number)]
+        if len(family) > 1:
+            similar.setdefault(find(number), []).append(entry)
+
+    for groups, problem in ((reused, 'reused'), (similar, 'similar')):
+        for group in groups.values():
+            for entry in group:
+                finding = findings.get(entry)
+                if finding is None:
+                    score = scores[entry]
+                    finding = findings[entry] = {
+                        'name': names[entry], 'problems': [], 'breached': None, 'bits': round(bits[entry], 1),
+                        'score': score, 'label': _breach.STRENGTH_LABELS[score], 'warnings': [], 'reused': 0, 'similar': 0,
+                    }
+                # `similar` counts the other entries in the family, `reused` only those with the same value
+                finding['problems'].append(problem)
+                finding[problem] = len(group) - (1 if problem == 'reused' else entries_per_value[value_numbers[entry]])
+
+    return {
+        'checked': len(names),
+        'corpus': None if corpus is None else str(corpus.file_path),
+        'policy': policy,
+        'findings': sorted(findings.values(), key=lambda finding: (
+            -(finding['breached'] or 0), -finding['reused'], finding['bits'], finding['name'].lower())),
+        'reused': sort_groups([[names[entry] for entry in group] for group in reused.values()]),
+        'similar': sort_groups([[names[entry] for entry in group] for group in similar.values()]),
+    }
+
+def sort_groups(groups: list[list[str]]) -> list[list[str]]:
+    return sorted((sorted(group, key=str.lower) for group in groups), key=lambda group: (-len(group), group[0].lower()))
+
+def describe(finding: dict) -> str:
+    parts = []
+    if finding['breached']:
+        parts.append(f"seen {finding['breached']:,} times in breaches")
+    if finding['reused']:
+        parts.append(f"same password as {finding['reused']} other " + ('entry' if finding['reused'] == 1 else 'entries'))
+    if finding['similar']:
+        parts.append(f"similar to {finding['similar']} other " + ('entry' if finding['similar'] == 1 else 'entries'))
+    if 'weak' in finding['problems']:
+        parts.append(f"{finding['label']} ({finding['bits']:.0f} bits)" + ''.join(f", {warning}" for warning in finding['warnings']))
+    parts.extend(PROBLEM_LABELS[problem] for problem in finding['problems'] if problem in ('short', 'classes', 'name'))
+    return ', '.join(parts)
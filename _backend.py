@@ -1,30 +1,93 @@
 import os
 import platform
-import subprocess
 import tempfile
-import keyring
 import base64
 import secrets
 import string
 import hashlib
+import hmac
+import re
+import functools
+import importlib
+import threading
+import zlib
+import itertools
+import shutil
+import atexit
+from collections import OrderedDict
 from pathlib import Path
-from cryptography.fernet import Fernet
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
+from urllib.parse import urlsplit
 import json
+import time
+import _vaultfile as vf
+import _backup
+import _credentials
+import _metrics
+import _passgen
+import _breach
+import _audit
+
+if TYPE_CHECKING:
+    from cryptography.fernet import Fernet, MultiFernet
 
 
 # ---------------- setup --------------------
 KEY_FILE_NAME = '.key'
-VAULT_FILE_NAME = 'vault.json'
+VAULT_FILE_NAME = 'vault.pmv'
+LEGACY_VAULT_FILE_NAME = 'vault.json'  # vaults before the binary format, migrated on first start
+BACKUP_STORE_DIR_NAME = 'password-manager-backups'
+BACKUP_KEEP_GENERATIONS = 10
+# single copy backups written before the versioned backup store, still restored from
 BACKUP_KEY_FILE_NAME = 'key.bin'
-BACKUP_VAULT_FILE_NAME = 'vault-bu.json'
+BACKUP_VAULT_FILE_NAME = 'vault-bu.pmv'
+LEGACY_BACKUP_VAULT_FILE_NAME = 'vault-bu.json'
+JOURNAL_FILE_NAME = 'vault.journal'
+ROTATION_FILE_NAME = 'vault.rotation'  # old values of a bulk rotation until it is confirmed, see `_rotation`
+REKEY_FILE_NAME = 'vault.rekey'  # how far re-encrypting the vault under a new data key got, see `_rekey`
+BACKUP_JOURNAL_FILE_NAME = 'vault-bu.journal'
+JOURNAL_COMPACT_MIN_BYTES = 64 * 1024     # never compact a journal smaller than this ...
+JOURNAL_COMPACT_RATIO = 0.5               # ... unless it grew to this fraction of the snapshot
+JOURNAL_COMPACT_MAX_BYTES = 4 * 1024 * 1024  # always compact past this size
+# when edits reach the disk: 'always' writes and fsyncs each one, 'batched' coalesces the edits of
+# `WRITE_COALESCE_SECONDS` into one fsynced append, 'close' does the same without fsync until the
+# vault is closed (fastest, a power cut can cost the session's edits)
+DURABILITY_MODES = ('always', 'batched', 'close')
+DEFAULT_DURABILITY = 'batched'
+WRITE_COALESCE_SECONDS = 0.5
+# Compressing before encrypting makes ciphertext length depend on content, so it is off by default.
+# Only worth turning on for vaults that hold long values (notes, keys, certificates).
+VAULT_COMPRESSION = False
+VAULT_COMPRESSION_MIN_SIZE = 256
+REENCRYPT_CHUNK_SIZE = 2_000   # records re-encrypted per journal append by default, see `reencrypt_records`
+TRANSFER_CHUNK_SIZE = 10_000   # entries encrypted / decrypted at a time by bulk import and export
+ENTRY_FIELDS = ('username', 'url', 'notes', 'tags')  # besides the name and value, each one encrypted on its own
+FILTER_FIELDS = {'user': 'username', 'host': 'url', 'tag': 'tags'}  # entries are filtered on these, see `field_terms`
+TERM_SIZE = 16  # bytes of a blind index term
+SETTINGS_FILE_NAME = 'password-manager-settings.json'
 KEYRING_SERVICE_NAME = 'PasswordManagerPy'
-KEYRING_USERNAME = 'password-manager-py'
+KEYRING_USERNAME = 'password-manager-py'  # '<username>/<profile>' for every profile but the default
+DEFAULT_PROFILE = 'default'
+PROFILES_DIR_NAME = 'password-manager-profiles'
+PROFILE_NAME_PATTERN = re.compile(r'[A-Za-z0-9][A-Za-z0-9._-]{0,63}')
+MAX_UNLOCKED_VAULTS = 3  # the current profile and the most recently used others, see `use_profile`
 HASH_SALT_LENGTH = 20
+# used until `calibrate_kdf` picked parameters for this machine
+KDF_DEFAULT_PARAMS = {'algorithm': 'scrypt', 'n': 2 ** 14, 'r': 8, 'p': 1}
+KDF_LEGACY_PARAMS = {'algorithm': 'pbkdf2-sha256', 'iterations': 100_000}  # plain `salt + hex` records
+KDF_TARGET_SECONDS = 0.5
+KDF_SCRYPT_MAX_N = 2 ** 20  # 1 GiB with r=8, the calibration never goes past it
+MIN_APP_PASS_LENGTH = 8
+MIN_APP_PASS_SCORE = 2  # 'fair', see `_breach.STRENGTH_LABELS`
+BREACH_CORPUS_ENV = 'PM_BREACH_CORPUS'  # overrides the corpus picked in the settings
 KEK_FALLBACK = 'uT7.)Jkn826-2+jDd,.jYHV*(-=w2mm}'
 
 
 # ----------------- directory & file related functions -----------------
-def get_key_directory() -> Path:
+# Every profile has its own key file, vault, settings and backups in a folder of its own under
+# each of these directories. The default profile lives in the directories themselves, where the
+# single vault always was.
+def get_base_key_directory() -> Path:
     system = platform.system()
     home = Path.home()
 
@@ -35,7 +98,7 @@ def get_key_directory() -> Path:
     else:  # Linux & other Unix
         return Path(os.getenv("XDG_DATA_HOME", home / ".local" / "share")).resolve()
 
-def get_vault_directory() -> Path:
+def get_base_vault_directory() -> Path:
     system = platform.system()
     home = Path.home()
 
@@ -46,7 +109,7 @@ def get_vault_directory() -> Path:
     else:  # Linux & other Unix
         return Path(os.getenv("XDG_CONFIG_HOME", home / ".config")).resolve()
 
-def get_backup_directory() -> Path:
+def get_base_backup_directory() -> Path:
     system = platform.system()
 
     if system == "Windows":
@@ -55,7 +118,20 @@ def get_backup_directory() -> Path:
         return Path(tempfile.gettempdir()).resolve()
     else:  # Linux & other Unix
         return Path(os.getenv("TMPDIR", tempfile.gettempdir())).resolve()
-    
+
+def get_profile_directory(base: Path, profile: str = None) -> Path:
+    profile = _profile if profile is None else profile
+    return base if profile == DEFAULT_PROFILE else base / PROFILES_DIR_NAME / profile
+
+def get_key_directory() -> Path:
+    return get_profile_directory(get_base_key_directory())
+
+def get_vault_directory() -> Path:
+    return get_profile_directory(get_base_vault_directory())
+
+def get_backup_directory() -> Path:
+    return get_profile_directory(get_base_backup_directory())
+
 def generate_key_file() -> None:
     d = get_key_directory()
     file_path = d / KEY_FILE_NAME
@@ -65,16 +141,19 @@ def generate_key_file() -> None:
     
     backup_path = get_backup_directory() / BACKUP_KEY_FILE_NAME
 
-    if os.path.isfile(backup_path):
-        key = get_backup_key()
+    restored = get_backup_store().restore({KEY_FILE_NAME: file_path}) is not None
 
-    else:
-        key = generate_enc_key()
-        kek = get_KEK()
-        key = encrypt_text(key.decode(), kek)
+    if not restored:
+        if os.path.isfile(backup_path):
+            key = get_backup_key()
+
+        else:
+            key = generate_enc_key()
+            kek = get_KEK()
+            key = encrypt_text(key.decode(), kek)
 
-    with open(file_path, 'wb') as file:
-        file.write(key)
+        with open(file_path, 'wb') as file:
+            file.write(key)
 
     # Restrict permissions on Linux/macOS . owner read/write only
     if platform.system() != 'Windows':
@@ -89,53 +168,318 @@ def generate_vault_file() -> None:
 
     if os.path.isfile(file_path):
         return
-    
-    backup_file = get_backup_directory() / BACKUP_VAULT_FILE_NAME
 
-    data = get_backup_vault_data() if os.path.isfile(backup_file) else {}
-    with open(file_path, 'w') as f:
-        json.dump(data, f, indent=3)
+    legacy_file_path = d / LEGACY_VAULT_FILE_NAME
+    if os.path.isfile(legacy_file_path):
+        write_vault_snapshot(file_path, fill_fields_from_names(read_legacy_vault(legacy_file_path))[0])
+        os.remove(legacy_file_path)
+        return
+
+    # the newest backup generation whose vault and journal both verify, or failing that whatever
+    # records survived in the newest one (its journal can't be trusted on top of a partial vault)
+    store = get_backup_store()
+    targets = {VAULT_FILE_NAME: file_path, JOURNAL_FILE_NAME: d / JOURNAL_FILE_NAME}
+    if store.restore(targets, optional=(JOURNAL_FILE_NAME,)) is not None:
+        return
+    if store.salvage(VAULT_FILE_NAME, file_path) is not None:
+        if os.path.isfile(d / JOURNAL_FILE_NAME):
+            os.remove(d / JOURNAL_FILE_NAME)
+        return
+
+    backup_dir = get_backup_directory()
+    backup_file = backup_dir / BACKUP_VAULT_FILE_NAME
+    legacy_backup_file = backup_dir / LEGACY_BACKUP_VAULT_FILE_NAME
+
+    if os.path.isfile(backup_file):
+        with open(backup_file, 'rb') as f:
+            write_file_atomic(file_path, f.read())
+    elif os.path.isfile(legacy_backup_file):
+        write_vault_snapshot(file_path, fill_fields_from_names(read_legacy_vault(legacy_backup_file))[0])
+    else:
+        write_vault_snapshot(file_path, {})
+
+    # the journal only makes sense on top of the snapshot it was written against
+    backup_journal = backup_dir / BACKUP_JOURNAL_FILE_NAME
+    journal_path = d / JOURNAL_FILE_NAME
+    if os.path.isfile(backup_journal):
+        with open(backup_journal, 'rb') as f:
+            journal = f.read()
+        write_file_atomic(journal_path, journal)
+    elif os.path.isfile(journal_path):
+        os.remove(journal_path)
 
 def add_passwords_to_vault(data: dict[str: str], encrypt_data: bool = True) -> None:
-    d = get_vault_directory()
-    file_path = d / VAULT_FILE_NAME
-    data = encrypt_dict(data) if encrypt_data else data
-    with open(file_path, 'w') as f:
-        json.dump(data, f, indent=3)
+    records = records_from_dict(data) if encrypt_data else records_from_encrypted_dict(data)
+    write_vault_records(records)
 
 def get_passwords_from_vault(decrypt_data: bool = True) -> dict:
+    records = load_vault_records()
+    if not decrypt_data:
+        return {record.name: record.value for record in records.values()}
+    return decrypt_records(records)
+
+def vault_has_name(name: str) -> bool:
+    return find_vault_record(name_index(name)) is not None
+
+def get_password_from_vault(name: str, field: str = 'value') -> str | None:
+    # the value, or another of the entry's fields ('' when it isn't set)
+    idx = name_index(name)
+    with _vault_lock:
+        record = find_vault_record(idx)
+        if record is None:
+            return None
+        # while a data key rotation is under way, an entry that is read is also re-encrypted
+        keys = get_data_keys()
+        if len(keys) > 1 and not record_is_current(record, keys[0]):
+            queue_journal_record(reencrypted_entry(idx, record, get_cipher()))
+    return decrypt_field(record, field)
+
+# In memory a vault is a dict from the blind index of every name (hex) to its `Record`.
+# Parsed records are cached and reused until the snapshot or the journal change on disk. The cached
+# dict is handed out as it is, so once a caller may hold it edits go to a copy (`update_records_cache`).
+class Record:
+    # the Fernet tokens of an entry as stored: name, value and `ENTRY_FIELDS` ('' when not set,
+    # () when none are), the record flags and the blind index terms of its fields. There is one
+    # per entry in the cache, slots keep them smaller than the lists they replaced.
+    __slots__ = ('name', 'value', 'flags', 'fields', 'terms')
+
+    def __init__(self, name: str, value: str, flags: int = 0, fields: tuple[str, ...] = (), terms: bytes = b''):
+        self.name = name
+        self.value = value
+        self.flags = flags
+        self.fields = fields
+        self.terms = terms
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Record) and self.to_list() == other.to_list()
+
+    def tokens(self) -> list[str]:
+        return [self.name, self.value] + [token for token in self.fields if token]
+
+    def to_list(self) -> list:
+        # the JSON form, e.g. in `_rotation`'s file
+        record = [self.name, self.value, self.flags]
+        if self.fields or self.terms:
+            record += [list(self.fields), self.terms.hex()]
+        return record
+
+    @classmethod
+    def from_list(cls, record: list) -> 'Record':
+        # older files hold [name, value] or [name, value, flags]
+        if len(record) < 4:
+            return cls(record[0], record[1], record[2] if len(record) > 2 else 0)
+        return cls(record[0], record[1], record[2], tuple(record[3]), bytes.fromhex(record[4]))
+
+_records_cache: dict[str, Record] | None = None
+_records_signature: tuple | None = None
+_records_shared = False  # `_records_cache` was handed out, copy it before changing it
+
+def get_vault_signature() -> tuple:
     d = get_vault_directory()
-    file_path = d / VAULT_FILE_NAME
-
-    if not os.path.isfile(file_path):
-        generate_vault_file()
-        return {}
-    
-    with open(file_path, 'r') as f:
-        data = json.load(f)
+    signature = []
+    for name in (VAULT_FILE_NAME, JOURNAL_FILE_NAME):
+        try:
+            st = os.stat(d / name)
+            signature.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+def record_to_fields(idx: str, record: Record) -> tuple[bytes, int, list[bytes]]:
+    fields = [base64.urlsafe_b64decode(token) for token in (record.name, record.value) + record.fields]
+    if record.terms:
+        fields += [b''] * (2 + len(ENTRY_FIELDS) - len(fields)) + [record.terms]
+    return bytes.fromhex(idx), record.flags, fields
+
+def record_from_fields(flags: int, fields: list[bytes]) -> Record:
+    tokens = [base64.urlsafe_b64encode(field).decode() if field else '' for field in fields[:2 + len(ENTRY_FIELDS)]]
+    extra = tuple(tokens[2:])
+    if extra and not any(extra):
+        extra = ()
+    terms = bytes(fields[2 + len(ENTRY_FIELDS)]) if len(fields) > 2 + len(ENTRY_FIELDS) else b''
+    return Record(tokens[0], tokens[1], flags, extra, terms)
+
+def read_vault_snapshot() -> dict[str, Record]:
+    file_path = get_vault_directory() / VAULT_FILE_NAME
+    with _metrics.span('vault.read_snapshot'), vf.VaultReader(file_path) as reader:
+        _metrics.add('bytes.read', os.path.getsize(file_path))
+        return {idx.hex(): record_from_fields(flags, fields) for idx, flags, fields in reader}
+
+def write_vault_snapshot(file_path: Path, records: dict[str, Record]) -> None:
+    # records are written in index order, so unchanged records keep their bytes between saves
+    tmp_path = file_path.with_name(file_path.name + '.tmp')
+    with _metrics.span('vault.write_snapshot'), open(tmp_path, 'wb') as f:
+        vf.write_vault_file(f, (record_to_fields(idx, records[idx]) for idx in sorted(records)))
+        f.flush()
+        os.fsync(f.fileno())
+        _metrics.add('bytes.written', f.tell())
+    os.replace(tmp_path, file_path)
+
+def read_legacy_vault(file_path: Path) -> dict[str, Record]:
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    _metrics.add('bytes.read', len(raw))
+    with _metrics.span('json.parse'):
+        data = json.loads(raw)
+
+    # the oldest vaults map encrypted names straight to encrypted values
+    if data and isinstance(next(iter(data.values())), str):
+        return records_from_encrypted_dict(data)
+    return {idx: Record.from_list(record) for idx, record in data.items()}
+
+def load_vault_records() -> dict[str, Record]:
+    # the caller must not change the dict it gets
+    global _records_cache, _records_signature, _records_shared
+    file_path = get_vault_directory() / VAULT_FILE_NAME
+
+    with _vault_lock:
+        if not os.path.isfile(file_path):
+            generate_vault_file()
+
+        signature = get_vault_signature()
+        if _records_cache is not None and signature == _records_signature:
+            _metrics.add('vault.cache_hits')
+            _records_shared = True
+            return _records_cache
+
+        _metrics.add('vault.cache_misses')
+        with _metrics.span('vault.load'):
+            records = read_vault_snapshot()
+            journal, _ = read_journal()
+            records = fold_journal(records, journal)
+            records = fold_journal(records, list(_pending_writes.values()))
+
+        _records_cache, _records_signature, _records_shared = records, signature, True
+        return records
+
+def update_records_cache(journal: list[dict]) -> None:
+    # applies journal records to the cache without touching a dict `load_vault_records` handed out
+    global _records_cache, _records_shared
+    if _records_shared:
+        _records_cache, _records_shared = dict(_records_cache), False
+    fold_journal(_records_cache, journal)
+
+def find_vault_record(idx: str) -> Record | None:
+    # answers from the cache when it is fresh, otherwise from the journal tail and a single mmap lookup
+    file_path = get_vault_directory() / VAULT_FILE_NAME
+
+    with _vault_lock:
+        if _records_cache is not None and get_vault_signature() == _records_signature:
+            return _records_cache.get(idx)
+        if idx in _pending_writes:
+            return fold_journal({}, [_pending_writes[idx]]).get(idx)
+
+        if not os.path.isfile(file_path):
+            generate_vault_file()
+
+        journal, _ = read_journal()
+        if any('idx' not in record for record in journal):
+            return load_vault_records().get(idx)
+
+        for record in reversed(journal):
+            if record['idx'] == idx:
+                return fold_journal({}, [record]).get(idx)
+
+        with vf.VaultReader(file_path) as reader:
+            found = reader.get(bytes.fromhex(idx))
+        return None if found is None else record_from_fields(*found)
+
+def write_vault_records(records: dict[str, Record]) -> None:
+    global _records_cache, _records_signature, _records_shared
+    d = get_vault_directory()
+    with _vault_lock:
+        discard_pending_writes()  # superseded by the full snapshot
+        write_vault_snapshot(d / VAULT_FILE_NAME, records)
+        # a full snapshot supersedes everything in the journal
+        write_file_atomic(d / JOURNAL_FILE_NAME, b'')
+        # the caller still holds `records`
+        _records_cache, _records_signature, _records_shared = records, get_vault_signature(), True
+
+def update_vault_records(update: Callable[[dict[str, Record]], dict[str, Record]]) -> dict[str, Record]:
+    # read-modify-write of many records as one atomic snapshot write. `update` gets the current
+    # records (read only) and returns the ones to replace; it runs under the vault lock, so nothing
+    # changes in between. The journal is folded in first: stale journal lines replayed on top of the
+    # new snapshot after a crash would undo the changes.
+    with _vault_lock:
+        flush_journal()
+        records = load_vault_records()
+        changes = update(records)
+        if changes:
+            write_vault_records({**records, **changes})
+        return changes
+
+def value_timestamp(record: Record) -> int:
+    # when the value was last set: Fernet tokens carry the time they were made in the clear (bytes 1-8)
+    return int.from_bytes(base64.urlsafe_b64decode(record.value)[1:9], 'big')
+
+def records_from_dict(data: dict[str: str]) -> dict[str, Record]:
+    index_key = get_index_key()
+    names = list(data)
+    values = [compress_value(data[name]) for name in names]
+    tokens = encrypt_many(names + [value for value, _ in values])
+    enc_names, enc_values = tokens[:len(names)], tokens[len(names):]
+
+    records = {}
+    for name, enc_name, enc_value, (_, flags) in zip(names, enc_names, enc_values, values):
+        records[name_index(name, index_key)] = Record(enc_name, enc_value, flags)
+    return records
+
+def records_from_encrypted_dict(data: dict[str: str]) -> dict[str, Record]:
+    index_key = get_index_key()
+    enc_names = list(data)
+    names = decrypt_many(enc_names)
+    return {name_index(name.decode(), index_key): Record(enc_name, data[enc_name]) for name, enc_name in zip(names, enc_names)}
+
+def export_vault_json(file_path: Path) -> None:
+    # writes the pre-binary `vault.json` layout: encrypted names mapped to encrypted values
+    cipher = get_cipher()
+    data = {}
+    for record in load_vault_records().values():
+        if record.flags & vf.RECORD_COMPRESSED:
+            _, value = decrypt_record(record, cipher)
+            data[record.name] = cipher.encrypt(value.encode()).decode()
+        else:
+            data[record.name] = record.value
 
-    return decrypt_dict(data) if decrypt_data else data
+    with open(file_path, 'w') as f:
+        json.dump(data, f, indent=3)
 
-def update_backup_files() -> None:
+def get_backup_store() -> _backup.BackupStore:
+    return _backup.BackupStore(get_backup_directory() / BACKUP_STORE_DIR_NAME, BACKUP_KEEP_GENERATIONS)
+
+@_metrics.timed('backup.snapshot')
+def update_backup_files() -> int | None:
+    # adds a backup generation if anything changed since the last one, returns its number
+    flush_writes(sync=True)
+    files = {
+        KEY_FILE_NAME: (get_key_directory() / KEY_FILE_NAME, _backup.KIND_BLOCKS),
+        VAULT_FILE_NAME: (get_vault_directory() / VAULT_FILE_NAME, _backup.KIND_VAULT),
+        JOURNAL_FILE_NAME: (get_vault_directory() / JOURNAL_FILE_NAME, _backup.KIND_BLOCKS),
+    }
+    with _vault_lock:  # the vault and its journal have to be read as a pair
+        generation = get_backup_store().snapshot(files)
+
+    # the single copy backups are superseded once there is a generation to restore from
     backup_dir = get_backup_directory()
-    key_file_path = get_key_directory() / KEY_FILE_NAME
-    vault_file_path = get_vault_directory() / VAULT_FILE_NAME
-    backup_key_file_path = backup_dir / BACKUP_KEY_FILE_NAME
-    backup_vault_file_path = backup_dir / BACKUP_VAULT_FILE_NAME
+    for name in (BACKUP_KEY_FILE_NAME, BACKUP_VAULT_FILE_NAME, LEGACY_BACKUP_VAULT_FILE_NAME, BACKUP_JOURNAL_FILE_NAME):
+        if os.path.isfile(backup_dir / name):
+            os.remove(backup_dir / name)
 
-    if os.path.isfile(key_file_path):
-        with open(key_file_path, 'rb') as f:
-            key = f.read()
+    return generation
 
-        with open(backup_key_file_path, 'wb') as f:
-            f.write(key)
-    
-    if os.path.isfile(vault_file_path):
-        with open(vault_file_path, 'r') as f:
-            data = f.read()
+_backup_thread: threading.Thread | None = None
+
+def start_backup() -> threading.Thread:
+    # not a daemon thread: the interpreter waits for it, so the window can close before the backup is done
+    global _backup_thread
+    wait_for_backup()
+    _backup_thread = threading.Thread(target=update_backup_files, name='pm-backup')
+    _backup_thread.start()
+    return _backup_thread
 
-        with open(backup_vault_file_path, 'w') as f:
-            f.write(data)
+def wait_for_backup() -> None:
+    if _backup_thread is not None:
+        _backup_thread.join()
 
 def get_backup_key(decrypt_key: bool = False) -> bytes:
     file_path = get_backup_directory() / BACKUP_KEY_FILE_NAME
@@ -150,18 +494,467 @@ def get_backup_key(decrypt_key: bool = False) -> bytes:
     return data
 
 def get_backup_vault_data(decrypt_data: bool = False) -> dict[str: str]:
-    file_path = get_backup_directory() / BACKUP_VAULT_FILE_NAME
-    with open(file_path, 'r') as f:
-        data = json.load(f)
-    return decrypt_dict(data) if decrypt_data else data
+    backup_dir = get_backup_directory()
+    file_path = backup_dir / BACKUP_VAULT_FILE_NAME
+
+    if os.path.isfile(file_path):
+        with vf.VaultReader(file_path) as reader:
+            records = {idx.hex(): record_from_fields(flags, fields) for idx, flags, fields in reader}
+    else:
+        records = read_legacy_vault(backup_dir / LEGACY_BACKUP_VAULT_FILE_NAME)
+
+    if not decrypt_data:
+        return {record.name: record.value for record in records.values()}
+    return decrypt_records(records)
+
+def write_file_atomic(file_path: Path, data: bytes, mode: int = None) -> None:
+    # write next to the target and swap it in, so readers never see a half written file
+    tmp_path = file_path.with_name(file_path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        if mode is not None and platform.system() != 'Windows':
+            os.chmod(tmp_path, mode)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+    _metrics.add('bytes.written', len(data))
+
+
+# ----------------- settings related functions -----------------------
+def get_settings(directory: Path = None) -> dict:
+    # the current profile's settings, or those in `directory`
+    file_path = (get_vault_directory() if directory is None else directory) / SETTINGS_FILE_NAME
+    if not os.path.isfile(file_path):
+        return {}
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    _metrics.add('bytes.read', len(raw))
+    with _metrics.span('json.parse'):
+        return json.loads(raw)
+
+def get_setting(name: str, default=None, directory: Path = None):
+    return get_settings(directory).get(name, default)
+
+def set_setting(name: str, value, directory: Path = None) -> None:
+    directory = get_vault_directory() if directory is None else directory
+    settings = get_settings(directory)
+    settings[name] = value
+    write_file_atomic(directory / SETTINGS_FILE_NAME, json.dumps(settings, indent=3).encode())
+
+def set_metrics_enabled(enabled: bool) -> None:
+    # remembered across restarts, `PM_METRICS=1` turns it on for a single run instead
+    set_setting('metrics', enabled)
+    if enabled:
+        _metrics.enable()
+    else:
+        _metrics.disable()
+
+
+# ----------------- journal related functions -----------------------
+# Single-entry edits are appended to `JOURNAL_FILE_NAME` as one JSON line each instead of
+# rewriting the whole vault. `VAULT_FILE_NAME` is the snapshot; the journal is replayed on top of it
+# and folded back into it by `compact_vault` once it grows past the thresholds in the setup section.
+_vault_lock = threading.RLock()
+_compaction_thread: threading.Thread | None = None
+
+def read_journal(limit: int = None) -> tuple[list[dict], int]:
+    file_path = get_vault_directory() / JOURNAL_FILE_NAME
+
+    if not os.path.isfile(file_path):
+        return [], 0
+
+    with open(file_path, 'rb') as f:
+        raw = f.read() if limit is None else f.read(limit)
+    _metrics.add('bytes.read', len(raw))
+
+    # a crash mid-append can leave a torn last line, only complete lines are replayed
+    end = raw.rfind(b'\n') + 1
+    records = []
+    with _metrics.span('json.parse'):
+        for line in raw[:end].splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+
+    return records, end
+
+def append_to_journal(records: list[dict], sync: bool = True) -> None:
+    global _records_signature
+    file_path = get_vault_directory() / JOURNAL_FILE_NAME
+    lines = b''.join(json.dumps(record, separators=(',', ':')).encode() + b'\n' for record in records)
+
+    with _vault_lock:
+        cache_is_fresh = _records_cache is not None and get_vault_signature() == _records_signature
+
+        with open(file_path, 'ab+') as f:
+            size = f.tell()
+            if size:
+                # start on a fresh line if a previous append was torn
+                f.seek(size - 1)
+                if f.read(1) != b'\n':
+                    lines = b'\n' + lines
+            with _metrics.span('journal.append'):
+                f.write(lines)
+                f.flush()
+                if sync:
+                    os.fsync(f.fileno())
+        _metrics.add('bytes.written', len(lines))
+
+        # keep the cached records in step with what we just wrote instead of re-reading everything
+        if cache_is_fresh:
+            update_records_cache(records)
+            _records_signature = get_vault_signature()
+
+def fold_journal(records: dict[str, Record], journal: list[dict]) -> dict[str, Record]:
+    # applies journal records to the snapshot records in place; tokens are kept as they are
+    index_key = None
+
+    for record in journal:
+        idx = record.get('idx')
+        if idx is None:  # written before the blind index, recover it from the name
+            index_key = index_key or get_index_key()
+            idx = name_index(decrypt_text(record['name']).decode(), index_key)
+
+        if record['op'] == 'set':
+            records[idx] = Record(record['name'], record['value'], record.get('flags', 0),
+                                  tuple(record.get('fields', ())), bytes.fromhex(record.get('terms', '')))
+        elif record['op'] == 'del':
+            records.pop(idx, None)
+
+    return records
+
+def journal_entry(idx: str, record: Record) -> dict:
+    entry = {'op': 'set', 'idx': idx, 'name': record.name, 'value': record.value}
+    if record.flags:
+        entry['flags'] = record.flags
+    if record.fields:
+        entry['fields'] = list(record.fields)
+    if record.terms:
+        entry['terms'] = record.terms.hex()
+    return entry
+
+def set_password_in_vault(name: str, value: str) -> None:
+    set_entry_in_vault(name, value)
+
+def set_entry_in_vault(name: str, value: str = None, fields: dict[str, str] = None) -> None:
+    # sets the value and / or some of `ENTRY_FIELDS` ('' clears one). Whatever isn't given keeps its
+    # token, so editing the notes doesn't make the password look newer to `_rotation`.
+    idx = name_index(name)
+    cipher = get_cipher()
+    with _vault_lock:
+        old = find_vault_record(idx)
+        if old is None and value is None:
+            raise KeyError(name)
+        if value is None:
+            record = Record(old.name, old.value, old.flags)
+        else:
+            record = encrypt_record(name, value, cipher)
+        if old is not None:
+            record.fields, record.terms = old.fields, old.terms
+        if fields:
+            record.fields, record.terms = update_fields(record, fields, cipher)
+        queue_journal_record(journal_entry(idx, record))
+
+def delete_password_from_vault(name: str) -> None:
+    queue_journal_record({'op': 'del', 'idx': name_index(name)})
+
+# Outside of 'always' mode edits wait in `_pending_writes` for `WRITE_COALESCE_SECONDS` and go to
+# the journal as one append; repeated edits of one entry inside that window collapse into the
+# last one. Lookups see pending edits, `flush_writes` forces them out.
+_durability: str | None = None
+_pending_writes: dict[str, dict] = {}  # idx -> journal record not on disk yet
+_flush_timer: threading.Timer | None = None
+_unsynced_journal = False  # appended in 'close' mode and not fsynced since
+
+# the flush timer is a daemon thread, edits still waiting when the interpreter exits are written here
+atexit.register(lambda: flush_writes(sync=True))
+
+def get_durability() -> str:
+    global _durability
+    if _durability is None:
+        mode = get_setting('durability', DEFAULT_DURABILITY)
+        _durability = mode if mode in DURABILITY_MODES else DEFAULT_DURABILITY
+    return _durability
+
+def set_durability(mode: str) -> None:
+    global _durability
+    if mode not in DURABILITY_MODES:
+        raise ValueError(f"durability must be one of {', '.join(DURABILITY_MODES)}")
+    flush_writes(sync=True)
+    set_setting('durability', mode)
+    _durability = mode
+
+def queue_journal_record(entry: dict) -> None:
+    global _flush_timer
+    if get_durability() == 'always':
+        append_to_journal([entry])
+        maybe_compact_vault()
+        return
+
+    with _vault_lock:
+        _pending_writes[entry['idx']] = entry
+        if _records_cache is not None and get_vault_signature() == _records_signature:
+            update_records_cache([entry])
+
+        if _flush_timer is None:
+            _flush_timer = threading.Timer(WRITE_COALESCE_SECONDS, flush_writes)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+
+def flush_writes(sync: bool = None, background: bool = True) -> None:
+    # `sync` defaults to the durability mode; True also fsyncs what 'close' mode left unsynced.
+    # Without `background` a compaction the writes call for runs here, callers holding `_vault_lock` need that
+    global _flush_timer, _unsynced_journal
+    with _vault_lock:
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+        if sync is None:
+            sync = get_durability() != 'close'
+
+        if sync and _unsynced_journal and not _pending_writes:
+            with open(get_vault_directory() / JOURNAL_FILE_NAME, 'ab') as f:
+                os.fsync(f.fileno())
+            _unsynced_journal = False
+        if not _pending_writes:
+            return
+
+        append_to_journal(list(_pending_writes.values()), sync=sync)
+        _pending_writes.clear()
+        _unsynced_journal = not sync
+
+    maybe_compact_vault(background)
+
+def discard_pending_writes() -> None:
+    global _flush_timer
+    with _vault_lock:
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+        _pending_writes.clear()
+
+def journal_needs_compaction() -> bool:
+    d = get_vault_directory()
+    journal_path = d / JOURNAL_FILE_NAME
+    vault_path = d / VAULT_FILE_NAME
+
+    journal_size = os.path.getsize(journal_path) if os.path.isfile(journal_path) else 0
+    vault_size = os.path.getsize(vault_path) if os.path.isfile(vault_path) else 0
+
+    if journal_size >= JOURNAL_COMPACT_MAX_BYTES:
+        return True
+    return journal_size >= JOURNAL_COMPACT_MIN_BYTES and journal_size >= vault_size * JOURNAL_COMPACT_RATIO
+
+@_metrics.timed('vault.compact')
+def compact_vault(directory: Path = None) -> bool:
+    # folds the journal into the snapshot; returns whether it did. `directory` is the vault a
+    # background compaction was started for, nothing is done once another profile is current.
+    d = get_vault_directory()
+    vault_path = d / VAULT_FILE_NAME
+    journal_path = d / JOURNAL_FILE_NAME
+
+    # take a consistent view, then do the folding work without holding the lock
+    with _vault_lock:
+        if directory is not None and directory != get_vault_directory():
+            return False
+        signature = get_vault_signature()
+        records = read_vault_snapshot()
+        journal, end = read_journal()
+
+    if not journal:
+        return False
+
+    records = fold_journal(records, journal)
+
+    with _vault_lock:
+        # only appends to the journal may have happened meanwhile. A new snapshot (a bulk write, an
+        # import, another compaction) or a rewritten journal would be undone by writing ours, so the
+        # work is dropped and left to the next compaction.
+        vault_signature, journal_signature = get_vault_signature()
+        if (d != get_vault_directory() or vault_signature != signature[0] or journal_signature is None
+                or journal_signature[0] != signature[1][0] or journal_signature[2] < end):
+            _metrics.add('vault.compactions_dropped')
+            return False
+
+        # records appended while we were folding stay in the journal
+        with open(journal_path, 'rb') as f:
+            f.seek(end)
+            tail = f.read()
+        _metrics.add('bytes.read', len(tail))
+        # crash safe: if we die between the two writes the old journal is replayed again, which is idempotent
+        write_vault_snapshot(vault_path, records)
+        write_file_atomic(journal_path, tail)
+        return True
+
+def maybe_compact_vault(background: bool = True) -> None:
+    global _compaction_thread
+
+    if not journal_needs_compaction():
+        return
+    if not background:
+        compact_vault()
+        return
+    if _compaction_thread is not None and _compaction_thread.is_alive():
+        return
+
+    _compaction_thread = threading.Thread(target=compact_vault, args=(get_vault_directory(),), daemon=True)
+    _compaction_thread.start()
+
+def wait_for_compaction() -> None:
+    if _compaction_thread is not None:
+        _compaction_thread.join()
+
+
+# ----------------- data key re-encryption related functions -----------------------
+# Moving records under the newest data key a chunk at a time, for `_rekey`. Re-encrypted records go
+# to the journal like edits, so a pass can stop between any two chunks.
+def reencrypted_record(record: Record, cipher: 'MultiFernet') -> Record:
+    # `record` under the newest key; tokens keep the time they were made
+    def rotate(token: str) -> str:
+        return cipher.rotate(token.encode()).decode() if token else ''
+    return Record(rotate(record.name), rotate(record.value), record.flags,
+                  tuple(rotate(token) for token in record.fields), record.terms)
+
+def reencrypted_entry(idx: str, record: Record, cipher: 'MultiFernet') -> dict:
+    return journal_entry(idx, reencrypted_record(record, cipher))
+
+@_metrics.timed('rekey.chunk')
+def reencrypt_records(after: str = '', limit: int = REENCRYPT_CHUNK_SIZE) -> tuple[str | None, int]:
+    # re-encrypts the records still under an older data key among the next `limit` in index order
+    # after `after`, appended to the journal like edits. Returns the last index looked at (None once
+    # the end is reached) and how many were re-encrypted.
+    with _vault_lock:
+        records = load_vault_records()
+        indexes = sorted(idx for idx in records if idx > after)[:limit]
+        keys = get_data_keys()
+        stale = {idx: records[idx] for idx in indexes if not record_is_current(records[idx], keys[0])}
+
+    cipher = make_cipher(keys)
+    entries = [reencrypted_entry(idx, record, cipher) for idx, record in stale.items()]
+
+    with _vault_lock:
+        # entries edited in the meantime already got the newest key
+        records = load_vault_records()
+        entries = [entry for entry in entries if records.get(entry['idx']) == stale[entry['idx']]]
+        if entries:
+            append_to_journal(entries)
+    maybe_compact_vault()
+    return (indexes[-1] if len(indexes) == limit else None), len(entries)
+
+def flush_journal() -> None:
+    # folds the journal into the snapshot so the snapshot alone is the whole vault
+    with _vault_lock:
+        flush_writes()
+        if os.path.isfile(get_vault_directory() / JOURNAL_FILE_NAME) and read_journal()[0]:
+            compact_vault()
+
+
+# ----------------- bulk import & export related functions -----------------------
+# Both directions stream: entries are encrypted / decrypted `TRANSFER_CHUNK_SIZE` at a time and the
+# snapshot is read through the mmap'd `VaultReader`, so only a chunk of plaintext is alive at once
+# (plus the writer's idx -> offset table) however large the dump is.
+def iter_chunks(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+def iter_vault_entries(chunk_size: int = TRANSFER_CHUNK_SIZE, fields: bool = False) -> Iterator[list[tuple]]:
+    # decrypted (name, value) pairs a chunk at a time, (name, value, fields) with `fields`; the vault
+    # lock is held until the iteration ends
+    with _vault_lock:
+        if not os.path.isfile(get_vault_directory() / VAULT_FILE_NAME):
+            generate_vault_file()
+        flush_journal()
+
+        with vf.VaultReader(get_vault_directory() / VAULT_FILE_NAME) as reader:
+            for chunk in iter_chunks(reader, chunk_size):
+                records = {idx.hex(): record_from_fields(flags, fields) for idx, flags, fields in chunk}
+                entries = list(decrypt_records(records).items())
+                if fields:
+                    entries = [entry + (entry_fields,) for entry, entry_fields
+                               in zip(entries, decrypt_fields_many(list(records.values())))]
+                yield entries
+
+def import_entries(entries: Iterable[tuple], overwrite: bool = False,
+                   chunk_size: int = TRANSFER_CHUNK_SIZE, progress: Callable = None) -> dict[str, int]:
+    # merges `entries`, (name, value) or (name, value, fields), into the vault with a single snapshot
+    # rewrite. Names already in the vault are skipped unless `overwrite` is set; a name repeated
+    # within `entries` keeps its first value. `progress(stats)` is called after every chunk.
+    global _records_cache, _records_signature
+    d = get_vault_directory()
+    vault_path = d / VAULT_FILE_NAME
+    tmp_path = vault_path.with_name(vault_path.name + '.tmp')
+    stats = {'read': 0, 'imported': 0, 'overwritten': 0, 'skipped': 0}
+    index_key = get_index_key()
+
+    with _vault_lock:
+        if not os.path.isfile(vault_path):
+            generate_vault_file()
+        flush_journal()
+
+        with vf.VaultReader(vault_path) as reader:
+            imported = set()  # blind indexes written so far
+
+            def merged_records():
+                # imported records first, then whatever they didn't replace from the old snapshot
+                for chunk in iter_chunks(entries, chunk_size):
+                    fresh = {}
+                    for name, value, *fields in chunk:
+                        stats['read'] += 1
+                        idx = bytes.fromhex(name_index(name, index_key))
+                        if idx in imported or idx in fresh:
+                            stats['skipped'] += 1
+                            continue
+                        if reader.get(idx) is not None:
+                            if not overwrite:
+                                stats['skipped'] += 1
+                                continue
+                            stats['overwritten'] += 1
+                        else:
+                            stats['imported'] += 1
+                        fresh[idx] = (name, value, fields[0] if fields else None)
+
+                    imported.update(fresh)
+                    records = records_from_dict({name: value for name, value, _ in fresh.values()})
+                    set_fields_many([(records[idx.hex()], fields) for idx, (_, _, fields) in fresh.items() if fields],
+                                    index_key)
+                    for idx, record in records.items():
+                        yield record_to_fields(idx, record)
+                    if progress is not None:
+                        progress(dict(stats))
+
+                for idx, flags, fields in reader:
+                    if idx not in imported:
+                        yield idx, flags, fields
+
+            try:
+                with open(tmp_path, 'wb') as f:
+                    vf.write_vault_file(f, merged_records())
+                    f.flush()
+                    os.fsync(f.fileno())
+                    _metrics.add('bytes.written', f.tell())
+            except BaseException:
+                # a bad row halfway through leaves the vault as it was
+                os.remove(tmp_path)
+                raise
+
+        os.replace(tmp_path, vault_path)
+        _records_cache, _records_signature = None, None
+
+    return stats
 
 
 # ----------------- cryptography related functions -----------------------
+@functools.cache  # the serial can't change while the app is running, so probe (and maybe spawn a subprocess) only once
+@_metrics.timed('hardware_id.probe')
 def get_motherboard_serial() -> str:
+    import subprocess  # only needed here, and not on every path
     system = platform.system()
 
     if system == "Windows":
         try:
+            _metrics.add('subprocess.spawns')
             output = subprocess.check_output(
                 ["wmic", "baseboard", "get", "serialnumber"],
                 stderr=subprocess.DEVNULL,
@@ -182,6 +975,7 @@ def get_motherboard_serial() -> str:
         except Exception:
             pass
         try:
+            _metrics.add('subprocess.spawns')
             output = subprocess.check_output(
                 ["dmidecode", "-s", "baseboard-serial-number"],
                 stderr=subprocess.DEVNULL
@@ -192,6 +986,7 @@ def get_motherboard_serial() -> str:
 
     elif system == "Darwin":  # macOS
         try:
+            _metrics.add('subprocess.spawns')
             output = subprocess.check_output(
                 ["system_profiler", "SPHardwareDataType"],
                 stderr=subprocess.DEVNULL
@@ -213,57 +1008,656 @@ def get_KEK() -> bytes:  # KEK := Key Encryption Key
     kek = turn_text_to_enc_key(data)
     return kek
 
+def make_cipher(key: bytes | tuple[bytes, ...]) -> 'Fernet | MultiFernet':
+    # cryptography takes a good part of startup to import, the login screen doesn't need it
+    from cryptography.fernet import Fernet, MultiFernet
+    if isinstance(key, bytes):
+        return Fernet(key)
+    if len(key) == 1:
+        return Fernet(key[0])
+    # encrypts with the first key, decrypts with whichever one made the token
+    return MultiFernet([Fernet(k) for k in key])
+
 def generate_enc_key() -> bytes:
+    from cryptography.fernet import Fernet
     return Fernet.generate_key()
 
-def get_enc_key() -> bytes:
+# The key file holds one line, wrapped with the KEK: the bare data key, or once the key has been
+# rotated a JSON key ring {"keys": [newest, ..., oldest], "index": blind index key}. Everything is
+# encrypted with the newest key, the older ones stay until nothing in the vault needs them (see
+# `_rekey`). The blind index key is derived from the very first data key and carried along, so
+# the record indexes never change with the data key.
+def read_key_ring() -> tuple[list[bytes], bytes]:
+    # (data keys, newest first; blind index key)
     file_path = get_key_directory() / KEY_FILE_NAME
-    with open(file_path, 'rb') as f:
-        key = f.readline()
+    with _metrics.span('key_file.read'), open(file_path, 'rb') as f:
+        data = f.readline()
+    _metrics.add('key_file.reads')
+    _metrics.add('bytes.read', len(data))
     kek = get_KEK()
-    key = decrypt_text(key.decode(), kek)
-    return key
+    data = decrypt_text(data.decode(), kek)
+    if not data.startswith(b'{'):
+        return [data], derive_index_key(data)
+    ring = json.loads(data)
+    return [key.encode() for key in ring['keys']], base64.urlsafe_b64decode(ring['index'])
+
+def write_key_ring(keys: list[bytes], index_key: bytes) -> None:
+    ring = {'keys': [key.decode() for key in keys], 'index': base64.urlsafe_b64encode(index_key).decode()}
+    data = encrypt_text(json.dumps(ring), get_KEK())
+    write_file_atomic(get_key_directory() / KEY_FILE_NAME, data, mode=0o600)
+
+def get_key_file_signature() -> tuple | None:
+    try:
+        st = os.stat(get_key_directory() / KEY_FILE_NAME)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
 
+def get_enc_key() -> bytes:
+    # the data key new tokens are made with
+    return read_key_ring()[0][0]
+
+def derive_index_key(key: bytes) -> bytes:
+    # a separate key for the blind index, so name digests can't be turned against the Fernet keys
+    return hmac.new(base64.urlsafe_b64decode(key), b'password-manager-py blind index', hashlib.sha256).digest()
+
+def get_index_key() -> bytes:
+    with _session_lock:
+        if _session_index_key is not None:
+            return bytes(_session_index_key)
+    return read_key_ring()[1]
+
+def name_index(name: str, index_key: bytes = None) -> str:
+    # deterministic keyed digest of a name, lets us find a record without decrypting any of them
+    index_key = get_index_key() if index_key is None else index_key
+    return hmac.new(index_key, name.encode(), hashlib.sha256).hexdigest()
+
+def get_data_keys() -> tuple[bytes, ...]:
+    if refresh_session():
+        with _session_lock:
+            if _session_keys is not None:
+                return tuple(bytes(key) for key in _session_keys)
+    return tuple(read_key_ring()[0])
+
+def get_cipher() -> 'Fernet | MultiFernet':
+    # uses the unlocked session if there is one, otherwise falls back to reading the key file
+    cipher = _session_cipher if refresh_session() else None
+    if cipher is not None:
+        return cipher
+    return make_cipher(tuple(read_key_ring()[0]))
+
+def signed_with(token: str, key: bytes) -> bool:
+    # whether `key` made a Fernet token, told by its HMAC alone (signed with the first half of the key)
+    data = base64.urlsafe_b64decode(token)
+    digest = hmac.new(base64.urlsafe_b64decode(key)[:16], data[:-32], hashlib.sha256).digest()
+    return hmac.compare_digest(digest, data[-32:])
+
+def record_is_current(record: Record, key: bytes) -> bool:
+    return all(signed_with(token, key) for token in record.tokens())
+
+def rotate_data_key() -> None:
+    # puts a new data key in front of the ring; nothing is re-encrypted here, see `_rekey`
+    with _vault_lock:
+        flush_writes(sync=True)  # pending edits were made with the old key, they stay readable
+        keys, index_key = read_key_ring()
+        write_key_ring([generate_enc_key()] + keys, index_key)
+        refresh_session()
+
+def retire_data_keys() -> int:
+    # drops every key but the newest, once no token needs them any more; returns how many went
+    with _vault_lock:
+        keys, index_key = read_key_ring()
+        if len(keys) > 1:
+            write_key_ring(keys[:1], index_key)
+            refresh_session()
+        return len(keys) - 1
+
+@_metrics.timed('fernet.encrypt_text')
 def encrypt_text(text: str, key: bytes = None) -> bytes:
-    key = get_enc_key() if key is None else key
-    cipher = Fernet(key)
+    _metrics.add('fernet.encrypted')
+    cipher = get_cipher() if key is None else make_cipher(key)
     enc_text = cipher.encrypt(text.encode())
     return enc_text
 
+@_metrics.timed('fernet.decrypt_text')
 def decrypt_text(text: str, key: bytes = None) -> bytes:
-    key = get_enc_key() if key is None else key
-    cipher = Fernet(key)
+    _metrics.add('fernet.decrypted')
+    cipher = get_cipher() if key is None else make_cipher(key)
     dec_text = cipher.decrypt(text.encode())
     return dec_text
 
 def encrypt_dict(data: dict[str: str]) -> dict[str: str]:
-    enc_data = {}
-    key = get_enc_key()
-    cipher = Fernet(key)
-
-    for key, value in data.items():
-        enc_key = cipher.encrypt(key.encode()).decode()
-        enc_value = cipher.encrypt(value.encode()).decode()
-        enc_data[enc_key] = enc_value
-
-    return enc_data
+    names = list(data)
+    tokens = encrypt_many(names + [data[name] for name in names])
+    return dict(zip(tokens[:len(names)], tokens[len(names):]))
 
 def decrypt_dict(data: dict[str: str]) -> dict[str: str]:
+    enc_names = list(data)
+    texts = decrypt_many(enc_names + [data[enc_name] for enc_name in enc_names])
+    return {name.decode(): value.decode() for name, value in zip(texts[:len(enc_names)], texts[len(enc_names):])}
+
+def compress_value(value: str) -> tuple[bytes, int]:
+    data = value.encode()
+
+    if VAULT_COMPRESSION and len(data) >= VAULT_COMPRESSION_MIN_SIZE:
+        compressed = zlib.compress(data)
+        if len(compressed) < len(data):
+            return compressed, vf.RECORD_COMPRESSED
+
+    return data, 0
+
+@_metrics.timed('fernet.encrypt_record')
+def encrypt_record(name: str, value: str, cipher: 'Fernet' = None) -> Record:
+    _metrics.add('fernet.encrypted', 2)
+    cipher = get_cipher() if cipher is None else cipher
+    data, flags = compress_value(value)
+    return Record(cipher.encrypt(name.encode()).decode(), cipher.encrypt(data).decode(), flags)
+
+@_metrics.timed('fernet.decrypt_record')
+def decrypt_record(record: Record, cipher: 'Fernet' = None) -> tuple[str, str]:
+    _metrics.add('fernet.decrypted', 2)
+    cipher = get_cipher() if cipher is None else cipher
+    name = cipher.decrypt(record.name.encode()).decode()
+    value = cipher.decrypt(record.value.encode())
+    if record.flags & vf.RECORD_COMPRESSED:
+        value = zlib.decompress(value)
+    return name, value.decode()
+
+def decrypt_records(records: dict[str, Record]) -> dict[str, str]:
+    values = list(records.values())
+    texts = decrypt_many([record.name for record in values] + [record.value for record in values])
+    names, dec_values = texts[:len(values)], texts[len(values):]
+
     dec_data = {}
-    key = get_enc_key()
-    cipher = Fernet(key)
+    for record, name, value in zip(values, names, dec_values):
+        if record.flags & vf.RECORD_COMPRESSED:
+            value = zlib.decompress(value)
+        dec_data[name.decode()] = value.decode()
+    return dec_data
 
-    for key, value in data.items():
-        dec_key = cipher.decrypt(key.encode()).decode()
-        dec_value = cipher.decrypt(value.encode()).decode()
-        dec_data[dec_key] = dec_value
 
-    return dec_data
+# ----------------- entry field related functions -----------------------
+# Besides its name and value an entry can have the `ENTRY_FIELDS`, each one its own Fernet token, so
+# showing an entry's username decrypts the username and nothing else (`Entry`, `decrypt_field`).
+#
+# Filtering by username, URL host or tag works without decrypting anything: every record carries
+# blind index terms, keyed digests of the values it can be found by (`filter_values`) made like the
+# name index. They do give away which entries share a username, host or tag, never what it is.
+# A query is turned into the same digests (`query_terms`) and answered by the search index.
+PACKED_NAME = re.compile(r'(?P<site>.+?)\s*\((?P<username>[^()]+)\)')
+URL_LIKE = re.compile(r'(?:[a-z][a-z0-9+.-]*://)?(?:[a-z0-9-]+\.)+[a-z]{2,}(?::\d+)?(?:/\S*)?', re.I)
+EMAIL = re.compile(r'[^@\s]+@(?:[a-z0-9-]+\.)+[a-z]{2,}', re.I)
+
+
+class Entry:
+    # an entry as the app lists it: the name in the clear, anything else decrypted when it is shown
+    # and not kept. `plain` holds what was set here and hasn't been read back from the vault yet.
+    __slots__ = ('name', 'record', 'plain')
+
+    def __init__(self, name: str, record: Record = None, plain: dict[str, str] = None):
+        self.name = name
+        self.record = record
+        self.plain = plain
+
+    def get(self, field: str = 'value') -> str:
+        if self.plain is not None and field in self.plain:
+            return self.plain[field]
+        return '' if self.record is None else decrypt_field(self.record, field)
+
+    def edited(self, values: dict[str, str]) -> 'Entry':
+        return Entry(self.name, self.record, {**(self.plain or {}), **values})
+
+    @property
+    def terms(self) -> list[bytes]:
+        return [] if self.record is None else split_terms(self.record.terms)
+
+
+def get_entries_from_vault() -> dict[str, Entry]:
+    # every entry by name, only the names are decrypted
+    records = list(load_vault_records().values())
+    names = decrypt_many([record.name for record in records])
+    return {name.decode(): Entry(name.decode(), record) for name, record in zip(names, records)}
+
+def get_entry_from_vault(name: str) -> Entry | None:
+    record = find_vault_record(name_index(name))
+    return None if record is None else Entry(name, record)
+
+def entry_values(entries: list[Entry]) -> list[str]:
+    # the values of many entries, decrypted in one batch
+    stored = [entry.record for entry in entries if entry.plain is None or 'value' not in entry.plain]
+    texts = iter(decrypt_many([record.value for record in stored]))
+    values = []
+    for entry in entries:
+        if entry.plain is not None and 'value' in entry.plain:
+            values.append(entry.plain['value'])
+            continue
+        data = next(texts)
+        if entry.record.flags & vf.RECORD_COMPRESSED:
+            data = zlib.decompress(data)
+        values.append(data.decode())
+    return values
+
+def decrypt_field(record: Record, field: str, cipher: 'Fernet' = None) -> str:
+    # 'value' or one of `ENTRY_FIELDS`, '' when it isn't set
+    if field == 'value':
+        token = record.value
+    elif field in ENTRY_FIELDS:
+        token = record.fields[ENTRY_FIELDS.index(field)] if record.fields else ''
+    else:
+        raise ValueError(f"unknown field {field!r}")
+    if not token:
+        return ''
+    _metrics.add('fernet.decrypted')
+    cipher = get_cipher() if cipher is None else cipher
+    data = cipher.decrypt(token.encode())
+    if field == 'value' and record.flags & vf.RECORD_COMPRESSED:
+        data = zlib.decompress(data)
+    return data.decode()
+
+def decrypt_fields_many(records: list[Record]) -> list[dict[str, str]]:
+    # the `ENTRY_FIELDS` set on each of `records`, decrypted in one batch
+    tokens = [(i, field, token) for i, record in enumerate(records)
+              for field, token in zip(ENTRY_FIELDS, record.fields) if token]
+    texts = decrypt_many([token for _, _, token in tokens])
+    found = [{} for _ in records]
+    for (i, field, _), text in zip(tokens, texts):
+        found[i][field] = text.decode()
+    return found
+
+def normalize_fields(fields: dict[str, str]) -> dict[str, str]:
+    unknown = set(fields) - set(ENTRY_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown fields {', '.join(sorted(unknown))}, expected {', '.join(ENTRY_FIELDS)}")
+    fields = {field: text or '' for field, text in fields.items()}
+    for field in ('username', 'url'):
+        if field in fields:
+            fields[field] = fields[field].strip()
+    if 'tags' in fields:
+        fields['tags'] = ', '.join(split_tags(fields['tags']))
+    return fields
+
+def update_fields(record: Record, changes: dict[str, str], cipher: 'Fernet' = None) -> tuple[tuple[str, ...], bytes]:
+    # the field tokens and terms of `record` with `changes` applied, only the changed fields are encrypted
+    changes = normalize_fields(changes)
+    cipher = get_cipher() if cipher is None else cipher
+    tokens = list(record.fields or ('',) * len(ENTRY_FIELDS))
+    for field, text in changes.items():
+        _metrics.add('fernet.encrypted')
+        tokens[ENTRY_FIELDS.index(field)] = cipher.encrypt(text.encode()).decode() if text else ''
+
+    terms = record.terms
+    if set(changes) & set(FILTER_FIELDS.values()):
+        # the terms come from all the filtered fields together, the unchanged ones are decrypted for it
+        terms = field_terms({field: changes[field] if field in changes else decrypt_field(record, field, cipher)
+                             for field in FILTER_FIELDS.values()})
+    return (tuple(tokens) if any(tokens) else ()), terms
+
+def set_fields_many(items: list[tuple[Record, dict[str, str]]], index_key: bytes = None) -> None:
+    # gives each record its fields (replacing any it had), encrypted in one batch
+    index_key = get_index_key() if index_key is None else index_key
+    items = [(record, normalize_fields(fields)) for record, fields in items]
+    texts = [text for _, fields in items for field in ENTRY_FIELDS if (text := fields.get(field))]
+    tokens = iter(encrypt_many(texts))
+    for record, fields in items:
+        record.fields = tuple(next(tokens) if fields.get(field) else '' for field in ENTRY_FIELDS)
+        if not any(record.fields):
+            record.fields = ()
+        record.terms = field_terms(fields, index_key)
+
+def split_tags(text: str) -> list[str]:
+    # comma separated, the first spelling of a tag wins
+    tags = {}
+    for tag in text.split(','):
+        tag = tag.strip()
+        if tag and tag.lower() not in tags:
+            tags[tag.lower()] = tag
+    return list(tags.values())
+
+def url_host(url: str) -> str:
+    url = url.strip().lower()
+    if not url:
+        return ''
+    try:
+        host = urlsplit(url if '://' in url else '//' + url).hostname or ''
+    except ValueError:
+        return ''
+    return host[4:] if host.startswith('www.') else host
+
+def host_domains(host: str) -> list[str]:
+    # the host and every domain above it but the top level one: gist.github.com, github.com
+    if not host or ':' in host or host.replace('.', '').isdigit():
+        return [host] if host else []
+    labels = host.split('.')
+    return ['.'.join(labels[i:]) for i in range(max(1, len(labels) - 1))]
+
+def filter_values(fields: dict[str, str]) -> Iterator[tuple[str, str]]:
+    # the (filter, text) pairs an entry is found by, all lower case
+    username = fields.get('username', '').strip().lower()
+    if username:
+        yield 'user', username
+    for domain in host_domains(url_host(fields.get('url', ''))):
+        yield 'host', domain
+    for tag in split_tags(fields.get('tags', '')):
+        yield 'tag', tag.lower()
+
+def term_digest(filter_name: str, text: str, index_key: bytes) -> bytes:
+    return hmac.new(index_key, f'{filter_name}\x00{text}'.encode(), hashlib.sha256).digest()[:TERM_SIZE]
+
+def field_terms(fields: dict[str, str], index_key: bytes = None) -> bytes:
+    index_key = get_index_key() if index_key is None else index_key
+    return b''.join(sorted({term_digest(filter_name, text, index_key) for filter_name, text in filter_values(fields)}))
+
+def split_terms(terms: bytes) -> list[bytes]:
+    return [terms[i:i + TERM_SIZE] for i in range(0, len(terms), TERM_SIZE)]
+
+def query_terms(filters: Iterable[tuple[str, str]]) -> list[bytes]:
+    # the terms an entry needs to match every (filter, text) of `filters`, e.g. ('tag', 'work')
+    index_key = get_index_key()
+    terms = []
+    for filter_name, text in filters:
+        if filter_name not in FILTER_FIELDS:
+            raise ValueError(f"unknown filter {filter_name!r}, expected one of {', '.join(FILTER_FIELDS)}")
+        text = url_host(text) if filter_name == 'host' else text.strip().lower()
+        terms.append(term_digest(filter_name, text, index_key))
+    return terms
+
+def fields_from_name(name: str) -> dict[str, str]:
+    # the username and URL a flat vault packed into a name: 'github.com (alice)' as the importer
+    # named logins, 'https://github.com/login', or an email address
+    fields = {}
+    site = name.strip()
+    match = PACKED_NAME.fullmatch(site)
+    if match and URL_LIKE.fullmatch(match['site']):
+        site, fields['username'] = match['site'], match['username'].strip()
+    if URL_LIKE.fullmatch(site):
+        fields['url'] = site
+    elif not fields and EMAIL.fullmatch(site):
+        fields['username'] = site
+    return fields
+
+def fill_fields_from_names(records: dict[str, Record]) -> tuple[dict[str, Record], int]:
+    # `records` with the fields filled in of entries whose name packs them (names stay as they are),
+    # and how many got fields; the records passed in aren't changed
+    indexes = [idx for idx, record in records.items() if not record.fields]
+    names = decrypt_many([records[idx].name for idx in indexes])
+    changes = {}
+    for idx, name in zip(indexes, names):
+        fields = fields_from_name(name.decode())
+        if fields:
+            changes[idx] = (Record(records[idx].name, records[idx].value, records[idx].flags), fields)
+    set_fields_many(list(changes.values()))
+    return {**records, **{idx: record for idx, (record, _) in changes.items()}}, len(changes)
+
+def migrate_vault_file() -> int:
+    # rewrites a binary vault from before structured entries in the current format, filling in the
+    # fields of entries whose name packs them; returns how many got fields. JSON vaults get theirs
+    # while they are converted, see `generate_vault_file`
+    file_path = get_vault_directory() / VAULT_FILE_NAME
+    with _vault_lock:
+        with vf.VaultReader(file_path) as reader:
+            if reader.version == vf.VERSION:
+                return 0
+
+        flush_journal()
+        records, migrated = fill_fields_from_names(load_vault_records())
+        write_vault_records(records)
+        return migrated
+
+
+# ----------------- batched encryption related functions -----------------------
+# `encrypt_many` / `decrypt_many` run a whole batch through one cipher, results come back in input
+# order. There is no worker pool: one showed no speed-up over a single cipher when measured, forking
+# a threaded Tk process is unsafe and every chunk would have carried the plaintext keys to the workers.
+def _encrypt_chunk(key: bytes | tuple[bytes, ...], chunk: list) -> list[str]:
+    cipher = make_cipher(key)
+    return [cipher.encrypt(text if isinstance(text, bytes) else text.encode()).decode() for text in chunk]
+
+def _decrypt_chunk(key: bytes | tuple[bytes, ...], chunk: list[str]) -> list[bytes]:
+    cipher = make_cipher(key)
+    return [cipher.decrypt(token.encode()) for token in chunk]
+
+@_metrics.timed('fernet.encrypt_many')
+def encrypt_many(texts: list, key: bytes | tuple[bytes, ...] = None) -> list[str]:
+    _metrics.add('fernet.encrypted', len(texts))
+    key = get_data_keys() if key is None else key
+    return _encrypt_chunk(key, texts)
+
+@_metrics.timed('fernet.decrypt_many')
+def decrypt_many(tokens: list[str], key: bytes | tuple[bytes, ...] = None) -> list[bytes]:
+    _metrics.add('fernet.decrypted', len(tokens))
+    key = get_data_keys() if key is None else key
+    return _decrypt_chunk(key, tokens)
+
+
+# ----------------- session related functions -----------------------
+# The key ring is read from disk and unwrapped with the KEK once per login, then kept here
+# until `lock_session` is called (logout, timeout or app close). It is read again when the key file
+# changes, so a key rotated by another process is used for the next token made here.
+#
+# Locking overwrites the bytearrays below and drops the cipher, nothing more: the `bytes` copies
+# handed out by `get_data_keys` / `get_index_key`, the ones inside the Fernet objects and anything
+# the garbage collector hasn't reclaimed yet stay in memory until python reuses it. Without a
+# session, `get_cipher` and the key getters read the key file again, as they did before sessions.
+# The buffers are only copied or zeroed under `_session_lock`, so a reader on another thread gets
+# the keys or falls back to the file, never a half zeroed key.
+_session_lock = threading.Lock()
+_session_keys: list[bytearray] | None = None
+_session_index_key: bytearray | None = None
+_session_cipher: 'Fernet | MultiFernet | None' = None
+_session_key_signature: tuple | None = None
+
+def unlock_session(wanted: Callable[[], bool] = None) -> bool:
+    # returns whether the session is unlocked. `wanted` is asked under the vault lock, which
+    # `lock_session` holds too: a caller that gave up on the session (the app after a logout)
+    # can't have it unlocked again behind its back.
+    with _vault_lock:
+        if wanted is not None and not wanted():
+            return False
+        if _session_cipher is None:
+            load_session_keys()
+        return True
+
+def load_session_keys() -> None:
+    global _session_keys, _session_index_key, _session_cipher, _session_key_signature
+    signature = get_key_file_signature()
+    keys, index_key = read_key_ring()
+    cipher = make_cipher(tuple(keys))
+    with _session_lock:
+        wipe_session_keys()
+        _session_keys = [bytearray(key) for key in keys]
+        _session_index_key = bytearray(index_key)
+        _session_cipher = cipher
+        _session_key_signature = signature
+
+def refresh_session() -> bool:
+    # whether a session is unlocked, after picking up a key file changed since it was read
+    if _session_cipher is None:
+        return False
+    if get_key_file_signature() != _session_key_signature:
+        # checked again under the lock, so a session locked meanwhile isn't unlocked behind `lock_session`
+        with _vault_lock:
+            if _session_cipher is None:
+                return False
+            if get_key_file_signature() != _session_key_signature:
+                load_session_keys()
+    return True
+
+def wipe_session_keys() -> None:
+    wipe_buffers((_session_keys or []) + [_session_index_key])
+
+def wipe_buffers(buffers: list[bytearray | None]) -> None:
+    # zeroes our own buffers only, copies of the keys made from them are not reached
+    for buffer in buffers:
+        if buffer is not None:
+            for i in range(len(buffer)):
+                buffer[i] = 0
+
+def lock_session() -> None:
+    # waits for the vault lock and fsyncs, the app calls it on its writer thread
+    global _session_keys, _session_index_key, _session_cipher, _session_key_signature
+    with _vault_lock:
+        # pending edits are already encrypted, but they have to reach the disk before we let go
+        flush_writes(sync=True)
+        with _session_lock:
+            wipe_session_keys()
+            _session_keys = None
+            _session_index_key = None
+            _session_cipher = None
+            _session_key_signature = None
+        # the next login asks the keyring again, in case the record was changed from outside
+        if _app_pass_store is not None:
+            _app_pass_store.invalidate()
+        # logging out locks the other profiles' vaults as well
+        while _unlocked_vaults:
+            evict_unlocked_vault()
+
+def session_is_unlocked() -> bool:
+    return _session_cipher is not None
+
+
+# --------------- profile related functions -------------
+# One profile is current at a time, and every function in this module works on its vault. Switching
+# away from an unlocked profile parks its session (keys, cipher, cached records, keyring record) in
+# `_unlocked_vaults` instead of locking it, so switching back needs neither the master password nor
+# the key file. At most `MAX_UNLOCKED_VAULTS` are unlocked, counting the current one; past that the
+# least recently used is locked and its session's key buffers are zeroed. Vaults of other profiles are
+# never read until their profile is used.
+_profile = DEFAULT_PROFILE
+_unlocked_vaults: 'OrderedDict[str, dict]' = OrderedDict()  # profile -> parked session, oldest first
+
+def get_profile() -> str:
+    return _profile
+
+def list_profiles() -> list[str]:
+    profiles_dir = get_base_vault_directory() / PROFILES_DIR_NAME
+    names = sorted(entry.name for entry in os.scandir(profiles_dir) if entry.is_dir()) if profiles_dir.is_dir() else []
+    return [DEFAULT_PROFILE] + [name for name in names if name != DEFAULT_PROFILE]
+
+def profile_exists(name: str) -> bool:
+    return name == DEFAULT_PROFILE or get_profile_directory(get_base_vault_directory(), name).is_dir()
+
+def check_profile_name(name: str) -> None:
+    if not PROFILE_NAME_PATTERN.fullmatch(name):
+        raise ValueError("a profile name is 1 to 64 letters, digits, '.', '_' or '-', starting with a letter or digit")
+
+def create_profile(name: str) -> None:
+    # the profile's folders; its key file and vault are made when it is first used. It starts with the
+    # key derivation calibrated for this machine, if the current profile has one
+    check_profile_name(name)
+    if profile_exists(name):
+        raise ValueError(f"profile {name!r} already exists")
+    for base in (get_base_key_directory(), get_base_vault_directory(), get_base_backup_directory()):
+        get_profile_directory(base, name).mkdir(parents=True, mode=0o700, exist_ok=True)  # the bases can coincide
+    kdf = get_setting('kdf')
+    if kdf is not None:
+        set_setting('kdf', kdf, directory=get_profile_directory(get_base_vault_directory(), name))
+
+def delete_profile(name: str) -> None:
+    # everything of the profile goes: key, vault, settings, backups and its keyring record
+    if name == DEFAULT_PROFILE:
+        raise ValueError("the default profile can't be deleted")
+    if name == _profile:
+        raise ValueError("switch to another profile before deleting this one")
+    if not profile_exists(name):
+        raise ValueError(f"no profile named {name!r}")
+    with _vault_lock:
+        if name in _unlocked_vaults:
+            _unlocked_vaults.move_to_end(name, last=False)
+            evict_unlocked_vault()
+        make_app_pass_store(name).delete()
+        for base in (get_base_key_directory(), get_base_vault_directory(), get_base_backup_directory()):
+            shutil.rmtree(get_profile_directory(base, name), ignore_errors=True)
+
+def use_profile(name: str) -> bool:
+    # makes `name` the current profile; returns whether its vault is unlocked already. Edits of the
+    # profile left behind are written out and backed up first, nothing of it stays behind in
+    # module state but its parked session.
+    global _profile, _durability
+    if not profile_exists(name):
+        raise ValueError(f"no profile named {name!r}")
+    # joined before taking the lock, both threads need it to finish. One started after this is
+    # harmless: a compaction of a profile no longer current drops its work (see `compact_vault`).
+    wait_for_backup()
+    wait_for_compaction()
+    with _vault_lock:
+        if name == _profile:
+            return session_is_unlocked()
+        flush_writes(sync=True, background=False)
+        if session_is_unlocked():
+            update_backup_files()
+            _unlocked_vaults[_profile] = park_session()
+
+        _profile = name
+        _durability = None
+        restore_session(_unlocked_vaults.pop(name, None))
+        while len(_unlocked_vaults) >= MAX_UNLOCKED_VAULTS:
+            evict_unlocked_vault()
+        return session_is_unlocked()
+
+def park_session() -> dict:
+    return {
+        'keys': _session_keys,
+        'index_key': _session_index_key,
+        'cipher': _session_cipher,
+        'key_signature': _session_key_signature,
+        'records': _records_cache,
+        'records_signature': _records_signature,
+        'app_pass_store': _app_pass_store,
+    }
+
+def restore_session(session: dict | None) -> None:
+    # None for a profile that isn't unlocked: a clean slate that reads everything from its files
+    global _session_keys, _session_index_key, _session_cipher, _session_key_signature
+    global _records_cache, _records_signature, _records_shared, _app_pass_store
+    session = session or {}
+    with _session_lock:
+        _session_keys = session.get('keys')
+        _session_index_key = session.get('index_key')
+        _session_cipher = session.get('cipher')
+        _session_key_signature = session.get('key_signature')
+    _records_cache = session.get('records')
+    _records_signature = session.get('records_signature')
+    _records_shared = True
+    _app_pass_store = session.get('app_pass_store')
+
+def evict_unlocked_vault() -> None:
+    # locks the least recently used parked vault
+    _, session = _unlocked_vaults.popitem(last=False)
+    with _session_lock:
+        wipe_buffers((session['keys'] or []) + [session['index_key']])
+    if session['app_pass_store'] is not None:
+        session['app_pass_store'].invalidate()
+    session.clear()
+
+def get_last_profile() -> str:
+    # the profile the app opens with, kept next to the default profile's settings
+    name = get_setting('profile', DEFAULT_PROFILE, directory=get_base_vault_directory())
+    return name if profile_exists(name) else DEFAULT_PROFILE
+
+def remember_profile() -> None:
+    set_setting('profile', _profile, directory=get_base_vault_directory())
 
 
 # --------------- system credential manager related functions -------------
+_app_pass_store: _credentials.CredentialStore | None = None
+
+def get_app_pass_store() -> _credentials.CredentialStore:
+    # one keyring fetch per session, see `_credentials`
+    global _app_pass_store
+    if _app_pass_store is None:
+        _app_pass_store = make_app_pass_store(_profile)
+    return _app_pass_store
+
+def make_app_pass_store(profile: str) -> _credentials.CredentialStore:
+    username = KEYRING_USERNAME if profile == DEFAULT_PROFILE else f'{KEYRING_USERNAME}/{profile}'
+    backend = _credentials.get_backend(get_base_vault_directory())
+    return _credentials.CredentialStore(KEYRING_SERVICE_NAME, username, backend)
+
+def get_app_pass_record() -> str | None:
+    return get_app_pass_store().get()
+
 def app_pass_exists() -> bool:
-    data = keyring.get_password(KEYRING_SERVICE_NAME, KEYRING_USERNAME)
+    data = get_app_pass_record()
     return bool(data)
 
 def generate_salt() -> str:
@@ -271,93 +1665,219 @@ def generate_salt() -> str:
     return salt
 
 def get_salt_from_keyring() -> str:
-    salt = keyring.get_password(KEYRING_SERVICE_NAME, KEYRING_USERNAME)[:HASH_SALT_LENGTH]
+    _, salt, _ = parse_hash_record(get_app_pass_record())
     return salt
 
 def get_hashed_pass_from_keyring() -> str:
-    hashed_pass = keyring.get_password(KEYRING_SERVICE_NAME, KEYRING_USERNAME)[HASH_SALT_LENGTH:]
+    _, _, hashed_pass = parse_hash_record(get_app_pass_record())
     return hashed_pass
 
-def hash_password(password: str, gen_salt: bool = False) -> tuple[str, str]:
-    salt = generate_salt() if gen_salt else get_salt_from_keyring()
+# The keyring holds a self describing record: `$<algorithm>$<k=v,...>$<salt>$<hex digest>`,
+# e.g. `$scrypt$n=16384,r=8,p=1$<salt>$<hex>`. Records from before are a bare `salt + hex`.
+def format_hash_record(params: dict, salt: str, hashed_pass: str) -> str:
+    options = ','.join(f'{k}={v}' for k, v in params.items() if k != 'algorithm')
+    return f"${params['algorithm']}${options}${salt}${hashed_pass}"
 
-    hashed_pass = hashlib.pbkdf2_hmac(
-        'sha256', 
-        password.encode(), 
-        salt.encode(), 
-        100_000
-    )
+def parse_hash_record(record: str) -> tuple[dict, str, str]:
+    # ValueError for a record of neither shape, rather than checking the password against garbage
+    if not record.startswith('$'):
+        params, salt, hashed_pass = dict(KDF_LEGACY_PARAMS), record[:HASH_SALT_LENGTH], record[HASH_SALT_LENGTH:]
+    else:
+        try:
+            _, algorithm, options, salt, hashed_pass = record.split('$')
+            params = {'algorithm': algorithm}
+            for option in filter(None, options.split(',')):
+                k, v = option.split('=')
+                params[k] = int(v)
+        except ValueError:
+            raise ValueError("malformed master password record") from None
+    if not params['algorithm'] or not salt or len(hashed_pass) != 64 or set(hashed_pass) - set(string.hexdigits):
+        raise ValueError("malformed master password record")
+    return params, salt, hashed_pass
+
+def get_kdf_params() -> dict:
+    return get_setting('kdf', KDF_DEFAULT_PARAMS)
+
+@_metrics.timed('kdf')
+def run_kdf(password: str, salt: str, params: dict) -> bytes:
+    if params['algorithm'] == 'scrypt':
+        n, r, p = params['n'], params['r'], params['p']
+        return hashlib.scrypt(password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+                              maxmem=129 * r * n * p + 1024 * 1024, dklen=32)
+    if params['algorithm'] == 'pbkdf2-sha256':
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), params['iterations'])
+    raise ValueError(f"unknown kdf algorithm {params['algorithm']!r}")
+
+def calibrate_kdf(algorithm: str = 'scrypt', target_seconds: float = KDF_TARGET_SECONDS) -> dict:
+    # finds the most expensive parameters that still unlock within `target_seconds` on this machine
+    salt = generate_salt()
+
+    def measure(params: dict) -> float:
+        start = time.perf_counter()
+        run_kdf('calibration', salt, params)
+        return time.perf_counter() - start
+
+    if algorithm == 'scrypt':
+        params = {'algorithm': 'scrypt', 'n': 2 ** 14, 'r': 8, 'p': 1}
+        # cost doubles with n, so keep doubling while the next step stays under the target
+        while params['n'] < KDF_SCRYPT_MAX_N and measure(params) * 2 <= target_seconds:
+            params['n'] *= 2
+    elif algorithm == 'pbkdf2-sha256':
+        sample = 50_000
+        elapsed = measure({'algorithm': 'pbkdf2-sha256', 'iterations': sample})
+        iterations = int(sample * target_seconds / max(elapsed, 1e-6))
+        params = {'algorithm': 'pbkdf2-sha256', 'iterations': max(iterations, KDF_LEGACY_PARAMS['iterations'])}
+    else:
+        raise ValueError(f"unknown kdf algorithm {algorithm!r}")
+
+    set_setting('kdf', params)
+    return params
 
+def hash_password(password: str, gen_salt: bool = False, params: dict = None) -> tuple[str, str]:
+    if gen_salt:
+        salt = generate_salt()
+        params = get_kdf_params() if params is None else params
+    else:
+        stored_params, salt, _ = parse_hash_record(get_app_pass_record())
+        params = stored_params if params is None else params
+
+    hashed_pass = run_kdf(password, salt, params)
     return (salt, hashed_pass.hex())
 
+def store_app_pass(password: str) -> None:
+    params = get_kdf_params()
+    salt, hashed_pass = hash_password(password, gen_salt=True, params=params)
+
+    store = get_app_pass_store()
+    if app_pass_exists():
+        store.delete()
+
+    store.set(format_hash_record(params, salt, hashed_pass))
+
 def set_new_app_pass(password: str) -> bool:
     password = str(password)
     if app_pass_is_valid(password):
-        salt, hashed_pass = hash_password(password, gen_salt=True)
-
-        if app_pass_exists():
-            keyring.delete_password(KEYRING_SERVICE_NAME, KEYRING_USERNAME)
-
-        data = salt + hashed_pass
-        keyring.set_password(KEYRING_SERVICE_NAME, KEYRING_USERNAME, data)
-        
+        store_app_pass(password)
         return True
     return False
 
+def app_pass_problem(password: str) -> str | None:
+    # why a master password can't be used, None if it can
+    if len(password) < MIN_APP_PASS_LENGTH:
+        return f"The password needs at least {MIN_APP_PASS_LENGTH} characters"
+    check = check_password(password)
+    if check['breached']:
+        return f"This password appeared {check['breached']:,} times in data breaches"
+    if check['score'] < MIN_APP_PASS_SCORE:
+        return f"Too easy to guess ({check['label']})" + ''.join(f", {warning}" for warning in check['warnings'])
+    return None
+
 def app_pass_is_valid(password: str) -> bool:
-    # todo: add better password validation logic
-    return len(password) >= 8
+    return app_pass_problem(password) is None
 
 def app_pass_is_correct(password: str) -> bool:
-    app_pass = get_hashed_pass_from_keyring()
-    _, hashed_pass = hash_password(password)
-    return hashed_pass == app_pass
+    record = get_app_pass_record()
+    if not record:  # no master password set (yet), nothing can match it
+        return False
+    params, salt, app_pass = parse_hash_record(record)
+    hashed_pass = run_kdf(password, salt, params).hex()
+
+    if not hmac.compare_digest(hashed_pass, app_pass):
+        return False
+
+    # the only moment we hold the plain password: move it to the current parameters if they changed
+    if params != get_kdf_params():
+        store_app_pass(password)
+    return True
+
+
+# --------------- breached & weak password related functions -------------
+# The breach corpus is a sorted hash list on disk (see `_breach`), opened once and read through mmap.
+# It is opened again when the file or its bloom filter change. Readers may still hold the old one,
+# so it is never closed explicitly.
+_breach_corpus: tuple | None = None  # (file signature, HashCorpus)
+_breach_lock = threading.Lock()
+
+def get_breach_corpus_path() -> Path | None:
+    path = os.getenv(BREACH_CORPUS_ENV) or get_setting('breach_corpus')
+    return Path(path) if path else None
+
+def get_breach_corpus() -> _breach.HashCorpus | None:
+    # None when no corpus is set up, or its file has gone
+    global _breach_corpus
+    path = get_breach_corpus_path()
+    if path is None or not os.path.isfile(path):
+        return None
+    bloom_path = path.with_name(path.name + _breach.BLOOM_SUFFIX)
+    signature = (str(path), os.path.getmtime(path), os.path.getmtime(bloom_path) if os.path.isfile(bloom_path) else None)
+
+    with _breach_lock:
+        if _breach_corpus is None or _breach_corpus[0] != signature:
+            _breach_corpus = (signature, _breach.HashCorpus(path))
+        return _breach_corpus[1]
+
+def set_breach_corpus(path: str | None) -> None:
+    # the file is opened first, so a file that isn't a corpus is never remembered
+    if path:
+        path = Path(path).resolve()
+        _breach.HashCorpus(path).close()
+    set_setting('breach_corpus', str(path) if path else None)
+
+def check_password(password: str) -> dict:
+    # the strength estimate plus 'breached': how often the corpus has seen it, None without a corpus
+    corpus = get_breach_corpus()
+    return {**_breach.estimate_strength(password), 'breached': None if corpus is None else corpus.count(password)}
+
+def get_audit_policy() -> dict:
+    return _audit.normalize_policy(get_setting('audit_policy'))
+
+def set_audit_policy(policy: dict) -> None:
+    set_setting('audit_policy', _audit.normalize_policy(policy))
+
+def audit_vault(policy: dict = None, progress: Callable = None) -> dict:
+    # breached, weak, reused and similar entries and policy violations, see `_audit.audit`;
+    # the policy from the settings unless one is given
+    policy = get_audit_policy() if policy is None else policy
+    return _audit.audit(iter_vault_entries(), get_breach_corpus(), policy, progress)
 
 
 # -------------------- utility functions -------------------
+def warm_up() -> None:
+    # the slow parts of unlocking that don't need the master password, run while it is typed
+    get_motherboard_serial()
+    importlib.import_module('cryptography.fernet')
+
 def initiate_files() -> None:
-    generate_vault_file()
+    if get_setting('metrics', False):
+        _metrics.enable()
+    # the key comes first, migrating a pre-binary vault needs it to build the blind index
     generate_key_file()
+    generate_vault_file()
+    migrate_vault_file()
 
 def reset_all() -> None:
+    discard_pending_writes()
     files = [
         get_key_directory() / KEY_FILE_NAME,
         get_vault_directory() / VAULT_FILE_NAME,
+        get_vault_directory() / LEGACY_VAULT_FILE_NAME,
+        get_vault_directory() / JOURNAL_FILE_NAME,
+        get_vault_directory() / ROTATION_FILE_NAME,
+        get_vault_directory() / REKEY_FILE_NAME,
         get_backup_directory() / BACKUP_KEY_FILE_NAME,
         get_backup_directory() / BACKUP_VAULT_FILE_NAME,
+        get_backup_directory() / LEGACY_BACKUP_VAULT_FILE_NAME,
+        get_backup_directory() / BACKUP_JOURNAL_FILE_NAME,
     ]
 
     for file in files:
         if os.path.exists(file):
             os.remove(file)
+    shutil.rmtree(get_backup_store().directory, ignore_errors=True)
 
+    lock_session()
     initiate_files()
 
 def generate_strong_password(length=12):
-    if length < 4:
-        raise ValueError("Password length must be at least 4 to include all character types.")
-
-    # Character pools
-    upper = string.ascii_uppercase
-    lower = string.ascii_lowercase
-    digits = string.digits
-    special = r"/\()-_+@#$%*&<>?:{}.,"
-
-    # Ensure at least one of each required character
-    password_chars = [
-        secrets.choice(upper),
-        secrets.choice(lower),
-        secrets.choice(digits),
-        secrets.choice(special)
-    ]
-
-    # Combine all pools for remaining characters
-    all_chars = upper + lower + digits + special
-
-    # Fill remaining characters with high-entropy random choices
-    password_chars += [secrets.choice(all_chars) for _ in range(length - 4)]
-
-    # Shuffle securely to randomize order
-    secrets.SystemRandom().shuffle(password_chars)
-
-    return ''.join(password_chars)
+    # one character of every class, the same policy the generator always had; see `_passgen` for batches
+    return _passgen.generate_passwords(1, {'length': length})[0]
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import time
+from struct import error as struct_error
+from pathlib import Path
+from typing import Iterator
+
+import _vaultfile as vf
+
+
+# ---------------- versioned backups --------------------
+# A content addressed store: files are cut into chunks, every chunk is saved once under its
+# sha256 in `objects/`, and each backup generation is a manifest in `generations/` listing the
+# chunks of every file plus a hash of the whole file. A new generation only adds the chunks that
+# changed since the previous one, and nothing is written at all when no file changed.
+#
+# Vault files are chunked at record boundaries, cut after records whose blind index ends in
+# `RECORD_CHUNK_BITS` zero bits, so a chunk only depends on the records in it and an edit leaves
+# every other chunk alone. The offset table is not stored, it is rebuilt on restore. Other files
+# (key, journal) are cut into fixed `BLOCK_SIZE` blocks, which suits the append-only journal.
+#
+# Everything stored is already encrypted (vault records, the wrapped key, journal tokens).
+OBJECTS_DIR_NAME = 'objects'
+GENERATIONS_DIR_NAME = 'generations'
+BLOCK_SIZE = 64 * 1024
+RECORD_CHUNK_BITS = 6  # a chunk holds 64 records on average
+KEEP_GENERATIONS = 10
+
+KIND_VAULT = 'vault'
+KIND_BLOCKS = 'blocks'
+
+
+class BackupError(Exception):
+    pass
+
+
+def file_digest(file_path: Path) -> str:
+    digest = hashlib.sha256()
+    for block in block_chunks(file_path):
+        digest.update(block)
+    return digest.hexdigest()
+
+def vault_chunks(file_path: Path) -> Iterator[bytes]:
+    mask = (1 << RECORD_CHUNK_BITS) - 1
+    with vf.VaultReader(file_path) as reader:
+        chunk = []
+        for idx, raw in reader.iter_raw():
+            chunk.append(raw)
+            if idx[-1] & mask == 0:
+                yield b''.join(chunk)
+                chunk = []
+        if chunk:
+            yield b''.join(chunk)
+
+def block_chunks(file_path: Path) -> Iterator[bytes]:
+    with open(file_path, 'rb') as f:
+        while block := f.read(BLOCK_SIZE):
+            yield block
+
+
+class BackupStore:
+    def __init__(self, directory: Path, keep: int = KEEP_GENERATIONS):
+        self.directory = Path(directory)
+        self.objects_dir = self.directory / OBJECTS_DIR_NAME
+        self.generations_dir = self.directory / GENERATIONS_DIR_NAME
+        self.keep = keep
+
+    # ---- objects ----
+    def object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+
+    def put_object(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if not path.is_file():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            write_atomic(path, data)
+        return digest
+
+    def get_object(self, digest: str) -> bytes:
+        try:
+            with open(self.object_path(digest), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            raise BackupError(f"missing backup object {digest}")
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise BackupError(f"corrupted backup object {digest}")
+        return data
+
+    # ---- generations ----
+    def generations(self) -> list[int]:
+        if not self.generations_dir.is_dir():
+            return []
+        return sorted(int(path.stem) for path in self.generations_dir.glob('*.json') if path.stem.isdigit())
+
+    def read_manifest(self, generation: int) -> dict:
+        with open(self.generations_dir / f'{generation}.json', 'r') as f:
+            return json.load(f)
+
+    def latest(self) -> dict | None:
+        generations = self.generations()
+        return self.read_manifest(generations[-1]) if generations else None
+
+    def store_file(self, file_path: Path, kind: str) -> dict:
+        if kind == KIND_VAULT and not vf.is_vault_file(file_path):
+            kind = KIND_BLOCKS  # keep whatever is there, even if it doesn't parse
+        chunks = vault_chunks(file_path) if kind == KIND_VAULT else block_chunks(file_path)
+        st = os.stat(file_path)
+        return {
+            'kind': kind,
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'sha256': file_digest(file_path),
+            'chunks': [self.put_object(chunk) for chunk in chunks],
+        }
+
+    def snapshot(self, files: dict[str, tuple[Path, str]]) -> int | None:
+        # `files` maps names to (path, kind); returns the new generation, None if nothing changed
+        latest = self.latest()
+        previous = latest['files'] if latest else {}
+        entries = {}
+
+        # backups live in the shared temp directory, keep them to ourselves
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+        for name, (file_path, kind) in files.items():
+            if not os.path.isfile(file_path):
+                continue
+            st = os.stat(file_path)
+            old = previous.get(name)
+            if old is not None and (old['size'], old['mtime_ns']) == (st.st_size, st.st_mtime_ns):
+                entries[name] = old
+                continue
+            entry = self.store_file(file_path, kind)
+            if old is not None and old['sha256'] == entry['sha256']:
+                entry['chunks'] = old['chunks']
+            entries[name] = entry
+
+        digests = {name: entry['sha256'] for name, entry in entries.items()}
+        if latest and digests == {name: entry['sha256'] for name, entry in previous.items()}:
+            return None
+
+        generation = latest['generation'] + 1 if latest else 1
+        self.generations_dir.mkdir(parents=True, exist_ok=True)
+        manifest = {'generation': generation, 'created': time.time(), 'files': entries}
+        write_atomic(self.generations_dir / f'{generation}.json', json.dumps(manifest, indent=1).encode())
+        self.prune()
+        return generation
+
+    def prune(self) -> None:
+        # drops generations past `keep`, then every object none of the remaining ones use
+        generations = self.generations()
+        for generation in generations[:-self.keep]:
+            os.remove(self.generations_dir / f'{generation}.json')
+
+        referenced = set()
+        for generation in self.generations():
+            for entry in self.read_manifest(generation)['files'].values():
+                referenced.update(entry['chunks'])
+
+        if self.objects_dir.is_dir():
+            for path in self.objects_dir.glob('*/*'):
+                if path.name not in referenced:
+                    os.remove(path)
+
+    # ---- restore ----
+    def salvaged_records(self, entry: dict) -> Iterator[tuple[bytes, int, list[bytes]]]:
+        # the records of every intact chunk, damaged chunks are left out
+        for digest in entry['chunks']:
+            try:
+                yield from list(vf.decode_records(self.get_object(digest)))
+            except (BackupError, vf.VaultFormatError, struct_error):
+                continue
+
+    def rebuild(self, entry: dict, target: Path, salvage: bool = False) -> None:
+        # writes the file back next to `target` and only moves it in place once its hash matches.
+        # `salvage` restores what is left of a damaged vault instead of giving up on it.
+        tmp_path = target.with_name(target.name + '.restore')
+        try:
+            with open(tmp_path, 'wb') as f:
+                if entry['kind'] == KIND_VAULT and salvage:
+                    vf.write_vault_file(f, self.salvaged_records(entry))
+                elif entry['kind'] == KIND_VAULT:
+                    records = (record for digest in entry['chunks'] for record in vf.decode_records(self.get_object(digest)))
+                    vf.write_vault_file(f, records)
+                else:
+                    for digest in entry['chunks']:
+                        f.write(self.get_object(digest))
+                f.flush()
+                os.fsync(f.fileno())
+            if not salvage and file_digest(tmp_path) != entry['sha256']:
+                raise BackupError(f"restored {target.name} does not match its backup")
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, target)
+
+    def restore(self, targets: dict[str, Path], optional: tuple = ()) -> int | None:
+        # restores all `targets` from the newest generation they verify in, so files that belong
+        # together come from the same backup. `optional` files that generation didn't have are
+        # removed. Returns the generation used, None if no generation could be restored.
+        for generation in reversed(self.generations()):
+            files = self.read_manifest(generation)['files']
+            if any(name not in files for name in targets if name not in optional):
+                continue
+            try:
+                for name, target in targets.items():
+                    if name in files:
+                        self.rebuild(files[name], target)
+                    elif os.path.isfile(target):
+                        os.remove(target)
+            except (BackupError, vf.VaultFormatError, OSError):
+                continue
+            return generation
+        return None
+
+    def salvage(self, name: str, target: Path) -> int | None:
+        # last resort when no generation verifies: the intact records of the newest backed up vault
+        for generation in reversed(self.generations()):
+            entry = self.read_manifest(generation)['files'].get(name)
+            if entry is not None and entry['kind'] == KIND_VAULT:
+                self.rebuild(entry, target, salvage=True)
+                return generation
+        return None
+
+    def verify(self, generation: int = None) -> list[str]:
+        # every problem found in a generation (the newest by default), an empty list when it is intact
+        generations = self.generations()
+        if not generations:
+            return ["no backups yet"]
+        manifest = self.read_manifest(generations[-1] if generation is None else generation)
+
+        problems = []
+        for name, entry in manifest['files'].items():
+            for digest in entry['chunks']:
+                try:
+                    self.get_object(digest)
+                except BackupError as exc:
+                    problems.append(f"{name}: {exc}")
+        return problems
+
+
+def write_atomic(file_path: Path, data: bytes) -> None:
+    tmp_path = file_path.with_name(file_path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
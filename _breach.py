@@ -0,0 +1,420 @@
+import bisect
+import functools
+import hashlib
+import math
+import mmap
+import os
+import re
+import struct
+from pathlib import Path
+from typing import Callable, Iterable
+
+import _passgen
+
+
+# ---------------- breached passwords & strength --------------------
+# A breach corpus is a hash list like the Have I Been Pwned downloads: one `HASH:COUNT` line per
+# password, sorted by hash, SHA-1 or NTLM (told apart by the hash length, `:COUNT` is optional).
+# It is read through `mmap` and never loaded. Hashes are spread evenly, so a lookup interpolates
+# where the hash should be, lands within a few lines of it after a handful of probes and scans the
+# rest. Sorted batches (`HashCorpus.counts`) walk the file front to back.
+#
+# `build_bloom` writes an optional Bloom filter next to the corpus (`BLOOM_SUFFIX`). While it is
+# there, almost every password that isn't in the corpus is answered by it without touching the corpus.
+#
+# `estimate_strength` finds the cheapest way to spell a password out of common passwords, passphrase
+# words, keyboard runs, sequences, repeats, years and single characters, and reports the log2 of the
+# guesses that takes. Nothing here goes over the network.
+CORPUS_KINDS = {40: 'sha1', 32: 'ntlm'}  # hash length in hex digits -> hash
+SCAN_BYTES = 4096  # below this the rest of the window is scanned line by line
+INTERPOLATION_PROBES = 4  # then bisection, so a skewed corpus can't make lookups slow
+
+BLOOM_SUFFIX = '.bloom'
+BLOOM_MAGIC = b'PMBLOOM\x00'
+BLOOM_VERSION = 1
+BLOOM_HEADER = struct.Struct('<8sHHQQ')  # magic | version | hashes | bits | items
+BLOOM_BITS_PER_ITEM = 10
+BLOOM_HASHES = 7  # about 1% false positives at 10 bits per item
+
+STRENGTH_LABELS = ('very weak', 'weak', 'fair', 'strong', 'very strong')
+STRENGTH_THRESHOLDS = (28, 36, 60, 80)  # bits for a score of 1, 2, 3 and 4
+MAX_ANALYZED_LENGTH = 128
+MIN_PATTERN_LENGTH = 3
+
+# the most common passwords and their building blocks, most common first
+COMMON_PASSWORDS = (
+    'password', '123456', 'qwerty', 'admin', 'welcome', 'letmein', 'iloveyou', 'monkey', 'dragon',
+    'football', 'baseball', 'master', 'login', 'abc123', 'sunshine', 'princess', 'shadow', 'superman',
+    'trustno1', 'starwars', 'hello', 'freedom', 'whatever', 'secret', 'passw0rd', 'michael', 'charlie',
+    'jordan', 'hunter', 'soccer', 'batman', 'access', 'ninja', 'mustang', 'summer', 'winter', 'love',
+    'pass', 'test', 'user', 'root', 'changeme', 'default', 'guest', 'computer', 'internet',
+)
+KEYBOARD_ROWS = ('`1234567890-=', 'qwertyuiop[]\\', "asdfghjkl;'", 'zxcvbnm,./', 'qwertzuiop', 'azertyuiop')
+KEYBOARD_PAIRS = frozenset(line[i:i + 2] for row in KEYBOARD_ROWS for line in (row, row[::-1]) for i in range(len(row) - 1))
+YEAR = re.compile(r'(?=(?:19|20)\d\d)')
+DIGIT = re.compile(r'\d')
+LEET = str.maketrans('4@8(3610$57+2', 'aabceigossttz')
+WARNINGS = {
+    'common': "one of the most common passwords",
+    'word': "made of dictionary words",
+    'keyboard': "a keyboard pattern",
+    'sequence': "a sequence like abc or 123",
+    'repeat': "repeated characters",
+    'year': "contains a year",
+}
+
+
+class CorpusError(ValueError):
+    pass
+
+
+# ---------------- hashes --------------------
+def _md4(data: bytes) -> bytes:
+    # RFC 1320, for NTLM corpora: OpenSSL 3 no longer ships MD4
+    mask = 0xffffffff
+
+    def rotl(x: int, n: int) -> int:
+        return ((x << n) | (x >> (32 - n))) & mask
+
+    bit_length = len(data) * 8
+    data += b'\x80' + b'\x00' * ((55 - len(data)) % 64) + struct.pack('<Q', bit_length)
+    h = [0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476]
+    for offset in range(0, len(data), 64):
+        x = struct.unpack('<16I', data[offset:offset + 64])
+        a, b, c, d = h
+        for i in range(16):
+            a = rotl((a + ((b & c) | (~b & d)) + x[i]) & mask, (3, 7, 11, 19)[i % 4])
+            a, b, c, d = d, a, b, c
+        for i in range(16):
+            k = i % 4 * 4 + i // 4
+            a = rotl((a + ((b & c) | (b & d) | (c & d)) + x[k] + 0x5a827999) & mask, (3, 5, 9, 13)[i % 4])
+            a, b, c, d = d, a, b, c
+        for i in range(16):
+            k = (0, 8, 4, 12, 2, 10, 6, 14, 1, 9, 5, 13, 3, 11, 7, 15)[i]
+            a = rotl((a + (b ^ c ^ d) + x[k] + 0x6ed9eba1) & mask, (3, 9, 11, 15)[i % 4])
+            a, b, c, d = d, a, b, c
+        h = [(v + w) & mask for v, w in zip(h, (a, b, c, d))]
+    return struct.pack('<4I', *h)
+
+def md4(data: bytes) -> bytes:
+    try:
+        return hashlib.new('md4', data).digest()
+    except ValueError:
+        return _md4(data)
+
+def password_hash(password: str, kind: str) -> bytes:
+    # the hash of `password` as it is spelled in a corpus of that kind (upper case hex)
+    if kind == 'sha1':
+        digest = hashlib.sha1(password.encode('utf-8')).digest()
+    elif kind == 'ntlm':
+        digest = md4(password.encode('utf-16-le'))
+    else:
+        raise CorpusError(f"unknown hash kind {kind!r}")
+    return digest.hex().upper().encode()
+
+
+# ---------------- bloom filter --------------------
+def bloom_positions(digest: bytes, bits: int, hashes: int) -> Iterable[int]:
+    # the digest is already uniform, two slices of it drive the double hashing
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:16], 'little') | 1
+    return ((h1 + i * h2) % bits for i in range(hashes))
+
+
+class BloomFilter:
+    def __init__(self, file_path: Path):
+        self.file_path = Path(file_path)
+        self._file = open(self.file_path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.hashes, self.bits, self.items = BLOOM_HEADER.unpack_from(self._map)
+        if magic != BLOOM_MAGIC or version != BLOOM_VERSION or len(self._map) < BLOOM_HEADER.size + self.bits // 8:
+            self.close()
+            raise CorpusError(f"{self.file_path} is not a bloom filter this version can read")
+
+    def might_contain(self, digest: bytes) -> bool:
+        offset = BLOOM_HEADER.size
+        return all(self._map[offset + (pos >> 3)] & (1 << (pos & 7))
+                   for pos in bloom_positions(digest, self.bits, self.hashes))
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+
+def build_bloom(corpus_path: Path, progress: Callable = None) -> Path:
+    # writes the bloom filter for a corpus next to it, one pass over the corpus
+    corpus_path = Path(corpus_path)
+    bloom_path = corpus_path.with_name(corpus_path.name + BLOOM_SUFFIX)
+    with HashCorpus(corpus_path, use_bloom=False) as corpus:
+        data = corpus._map
+        bits = max(64, count_lines(data) * BLOOM_BITS_PER_ITEM + 7 & ~7)
+        array = bytearray(bits // 8)
+        length = corpus.hash_length
+
+        start, done = 0, 0
+        while start < len(data):
+            end = data.find(b'\n', min(start + (1 << 24), len(data)) - 1)
+            end = len(data) if end < 0 else end + 1
+            for line in data[start:end].split(b'\n'):
+                if len(line) >= length:
+                    for pos in bloom_positions(bytes.fromhex(line[:length].decode()), bits, BLOOM_HASHES):
+                        array[pos >> 3] |= 1 << (pos & 7)
+                    done += 1
+            start = end
+            if progress is not None:
+                progress({'hashes': done})
+
+    tmp_path = bloom_path.with_name(bloom_path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(BLOOM_HEADER.pack(BLOOM_MAGIC, BLOOM_VERSION, BLOOM_HASHES, bits, done))
+        f.write(array)
+    os.replace(tmp_path, bloom_path)
+    return bloom_path
+
+def count_lines(data) -> int:
+    count, step = 0, 1 << 24
+    for start in range(0, len(data), step):
+        count += data[start:start + step].count(b'\n')
+    return count + (len(data) > 0 and data[len(data) - 1:] != b'\n')
+
+
+# ---------------- corpus --------------------
+class HashCorpus:
+    def __init__(self, file_path: Path, use_bloom: bool = True):
+        self.file_path = Path(file_path)
+        self.bloom = None
+        self._file = open(self.file_path, 'rb')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.close()
+            raise CorpusError(f"{self.file_path} is empty")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self._map)
+
+        end = self._map.find(b'\n')
+        first = self._map[:end if end >= 0 else self.size].split(b':', 1)[0].strip()
+        self.kind = CORPUS_KINDS.get(len(first))
+        try:
+            bytes.fromhex(first.decode('ascii'))
+        except ValueError:
+            self.kind = None
+        if self.kind is None:
+            self.close()
+            raise CorpusError(f"{self.file_path} doesn't start with a SHA-1 or NTLM hash")
+        self.hash_length = len(first)
+        self.lowercase = first != first.upper()
+
+        bloom_path = self.file_path.with_name(self.file_path.name + BLOOM_SUFFIX)
+        if use_bloom and os.path.isfile(bloom_path) and os.path.getmtime(bloom_path) >= os.path.getmtime(self.file_path):
+            self.bloom = BloomFilter(bloom_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        if self.bloom is not None:
+            self.bloom.close()
+        if hasattr(self, '_map'):
+            self._map.close()
+        self._file.close()
+
+    def hash(self, password: str) -> bytes:
+        digest = password_hash(password, self.kind)
+        return digest.lower() if self.lowercase else digest
+
+    def count(self, password: str) -> int:
+        # how often the password was seen in breaches, 0 if never
+        return self.lookup(self.hash(password))[0]
+
+    def counts(self, passwords: list[str]) -> list[int]:
+        # many lookups in hash order, each one starts where the one before ended
+        hashes = [self.hash(password) for password in passwords]
+        result = [0] * len(hashes)
+        position = 0
+        for i in sorted(range(len(hashes)), key=hashes.__getitem__):
+            result[i], position = self.lookup(hashes[i], position)
+        return result
+
+    def lookup(self, digest: bytes, lo: int = 0) -> tuple[int, int]:
+        # (count, a line start no hash >= `digest` comes before); `lo` has to be a line start too
+        if self.bloom is not None and not self.bloom.might_contain(bytes.fromhex(digest.decode())):
+            return 0, lo
+        data, length = self._map, self.hash_length
+        hi = self.size
+        target = int(digest[:12], 16)
+        lo_value = int(data[lo:lo + 12], 16) if lo else 0
+        hi_value = 16 ** 12
+
+        probes = 0
+        while hi - lo > SCAN_BYTES:
+            if probes < INTERPOLATION_PROBES:
+                mid = lo + (target - lo_value) * (hi - lo) // max(hi_value - lo_value, 1)
+                mid = min(max(mid, lo + 1), hi - 1)
+            else:
+                mid = (lo + hi) // 2
+            probes += 1
+
+            start = data.find(b'\n', mid - 1, hi)
+            if start < 0:
+                hi = mid  # no line starts in [mid, hi)
+                continue
+            start += 1
+            if start >= hi:
+                hi = mid
+                continue
+            key = data[start:start + length]
+            if key < digest:
+                lo, lo_value = start, int(key[:12], 16)
+            elif key > digest:
+                hi, hi_value = start, int(key[:12], 16)
+            else:
+                return self._count_at(start), start
+
+        end = data.find(b'\n', hi)
+        for line in data[lo:self.size if end < 0 else end].split(b'\n'):
+            key = line[:length]
+            if key == digest:
+                return parse_count(line), lo
+            if key > digest:
+                break
+        return 0, lo
+
+    def _count_at(self, start: int) -> int:
+        end = self._map.find(b'\n', start)
+        return parse_count(self._map[start:self.size if end < 0 else end])
+
+
+def parse_count(line: bytes) -> int:
+    _, _, count = line.partition(b':')
+    count = count.strip()
+    return int(count) if count.isdigit() else 1
+
+
+# ---------------- strength --------------------
+@functools.lru_cache(maxsize=1)
+def get_ranked_words() -> tuple[dict[str, float], frozenset[str]]:
+    # word -> bits to guess it (common passwords by rank, then the passphrase word list), and every
+    # prefix of those words, so a scan can stop as soon as no word starts with what it has so far
+    words = _passgen.load_word_list()
+    ranked = dict.fromkeys(words, math.log2(len(words)))
+    for rank, word in enumerate(COMMON_PASSWORDS, 1):
+        ranked[word] = math.log2(rank + 1)
+    prefixes = frozenset(word[:end] for word in ranked for end in range(MIN_PATTERN_LENGTH, len(word) + 1))
+    return ranked, prefixes
+
+@functools.lru_cache(maxsize=1)
+def get_keyboard_lines() -> list[tuple[frozenset[str], float]]:
+    # the neighbouring pairs along every row in both directions, and the bits per run length
+    lines = []
+    for row in KEYBOARD_ROWS:
+        for line in (row, row[::-1]):
+            lines.append((frozenset(line[i:i + 2] for i in range(len(line) - 1)), math.log2(len(line) * 2)))
+    return lines
+
+def character_pool(password: str) -> int:
+    pool = 0
+    if password != password.upper():
+        pool += 26
+    if password != password.lower():
+        pool += 26
+    if DIGIT.search(password):
+        pool += 10
+    if not password.isalnum():
+        pool += 33
+    return max(pool, 10)
+
+def find_patterns(password: str) -> list[tuple[int, int, float, str]]:
+    # every (start, end, bits, kind) that could spell password[start:end] cheaper than its characters
+    n = len(password)
+    lower = password.lower()
+    plain = lower.translate(LEET)
+    ranked, prefixes = get_ranked_words()
+    found = []
+
+    # words, also spelled with digits and symbols for letters (p@ssw0rd); an extra bit for any
+    # upper case letter and another for the substitutions
+    sources = [(lower, 0)] if plain == lower else [(lower, 0), (plain, 1)]
+    for start in range(n - MIN_PATTERN_LENGTH + 1):
+        for source, leet in sources:
+            if source[start:start + MIN_PATTERN_LENGTH] not in prefixes:
+                continue
+            for end in range(start + MIN_PATTERN_LENGTH, n + 1):
+                text = source[start:end]
+                if text not in prefixes:
+                    break
+                bits = ranked.get(text)
+                if bits is not None and not (leet and text == lower[start:end]):
+                    kind = 'common' if bits < 8 else 'word'
+                    found.append((start, end, bits + (not password[start:end].islower()) + leet, kind))
+
+    # keyboard runs, forwards or backwards along a row
+    pairs = [lower[i:i + 2] for i in range(n - 1)]
+    if pair_runs([pair in KEYBOARD_PAIRS for pair in pairs]):
+        for neighbours, bits_per_key in get_keyboard_lines():
+            for start, end in pair_runs([pair in neighbours for pair in pairs]):
+                found.append((start, end, bits_per_key + math.log2(end - start), 'keyboard'))
+
+    # runs of one character, and steps of +1 / -1 (abc, 987)
+    for start, end in pair_runs([a == b for a, b in zip(password, password[1:])]):
+        found.append((start, end, math.log2(character_pool(password[start]) * (end - start)), 'repeat'))
+    codes = memoryview(password.encode('utf-32-le')).cast('I')
+    steps = [b - a for a, b in zip(codes, codes[1:])]
+    for step in (1, -1):
+        for start, end in pair_runs([diff == step for diff in steps]):
+            base = 4 if password[start] in 'aA1zZ9' else (10 if password[start].isdigit() else 26)
+            found.append((start, end, math.log2(base * (end - start) * (2 if step < 0 else 1)), 'sequence'))
+
+    for match in YEAR.finditer(password):
+        found.append((match.start(), match.start() + 4, math.log2(200), 'year'))
+    return found
+
+def pair_runs(joined: list[bool]) -> list[tuple[int, int]]:
+    # (start, end) of every stretch of at least `MIN_PATTERN_LENGTH` characters whose neighbouring
+    # pairs are all joined; joined[i] is about characters i and i + 1
+    runs = []
+    if joined.count(True) < MIN_PATTERN_LENGTH - 1:
+        return runs
+    start = None
+    for i, flag in enumerate(joined + [False]):
+        if flag:
+            if start is None:
+                start = i
+        elif start is not None:
+            if i + 1 - start >= MIN_PATTERN_LENGTH:
+                runs.append((start, i + 1))
+            start = None
+    return runs
+
+def estimate_strength(password: str) -> dict:
+    # {'bits': log2 of the guesses needed, 'score': 0-4, 'label': ..., 'warnings': [...]}
+    password = password[:MAX_ANALYZED_LENGTH]
+    n = len(password)
+    char_bits = math.log2(character_pool(password))
+    ending = [[] for _ in range(n + 1)]
+    for start, end, bits, kind in find_patterns(password):
+        ending[end].append((start, bits, kind))
+
+    # cheapest spelling of every prefix: a character at a time or a pattern ending there
+    best = [0.0] * (n + 1)
+    used = [None] * (n + 1)
+    for end in range(1, n + 1):
+        best[end], used[end] = best[end - 1] + char_bits, (end - 1, None)
+        for start, bits, kind in ending[end]:
+            if best[start] + bits < best[end]:
+                best[end], used[end] = best[start] + bits, (start, kind)
+
+    kinds = []
+    end = n
+    while end > 0:
+        end, kind = used[end]
+        if kind is not None and kind not in kinds:
+            kinds.append(kind)
+    warnings = [WARNINGS[kind] for kind in reversed(kinds)]
+    if n < 8:
+        warnings.append("shorter than 8 characters")
+
+    bits = round(best[n], 1)
+    score = bisect.bisect_right(STRENGTH_THRESHOLDS, bits)
+    return {'bits': bits, 'score': score, 'label': STRENGTH_LABELS[score], 'warnings': warnings}
@@ -0,0 +1,115 @@
+import json
+import os
+import platform
+import threading
+from pathlib import Path
+
+import _metrics
+
+
+# ---------------- credential store --------------------
+# Every keyring call is a round trip to the OS credential manager (D-Bus to Secret Service on
+# Linux), so the record is fetched once and served from memory until `invalidate` is called.
+#
+# Setting `PM_KEYRING_BACKEND=file` swaps the OS keyring for `FileKeyring`, a JSON file at
+# `PM_KEYRING_FILE` (or `keyring.json` next to the vault). Meant for tests, benchmarks and
+# headless machines without a secret service.
+BACKEND_ENV = 'PM_KEYRING_BACKEND'
+FILE_ENV = 'PM_KEYRING_FILE'
+FILE_KEYRING_NAME = 'keyring.json'
+
+
+class FileKeyring:
+    # same get/set/delete_password interface as the `keyring` module
+    def __init__(self, file_path: Path):
+        self.file_path = Path(file_path)
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        if not self.file_path.is_file():
+            return {}
+        with open(self.file_path, 'r') as f:
+            return json.load(f)
+
+    def _write(self, data: dict) -> None:
+        tmp_path = self.file_path.with_name(self.file_path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=3)
+        if platform.system() != 'Windows':
+            os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, self.file_path)
+
+    def get_password(self, service: str, username: str) -> str | None:
+        with self._lock:
+            return self._read().get(service, {}).get(username)
+
+    def set_password(self, service: str, username: str, password: str) -> None:
+        with self._lock:
+            data = self._read()
+            data.setdefault(service, {})[username] = password
+            self._write(data)
+
+    def delete_password(self, service: str, username: str) -> None:
+        with self._lock:
+            data = self._read()
+            data.get(service, {}).pop(username, None)
+            self._write(data)
+
+
+_backend = None
+
+def get_backend(default_directory: Path):
+    global _backend
+    if _backend is None:
+        if os.getenv(BACKEND_ENV) == 'file':
+            _backend = FileKeyring(os.getenv(FILE_ENV, default_directory / FILE_KEYRING_NAME))
+        else:
+            import keyring  # backend discovery is slow, only pay for it when the keyring is really used
+            _backend = keyring
+    return _backend
+
+def set_backend(backend) -> None:
+    global _backend
+    _backend = backend
+
+
+class CredentialStore:
+    def __init__(self, service: str, username: str, backend):
+        self.service = service
+        self.username = username
+        self.backend = backend
+        self._value: str | None = None
+        self._fetched = False
+        self._lock = threading.Lock()
+
+    def _timed(self, op: str, func, *args):
+        # the round trips show up as `keyring.get` etc. in the metrics report, see `_metrics`
+        with _metrics.span(f'keyring.{op}'):
+            return func(*args)
+
+    def get(self) -> str | None:
+        with self._lock:
+            if not self._fetched:
+                self._value = self._timed('get', self.backend.get_password, self.service, self.username)
+                self._fetched = True
+            return self._value
+
+    def set(self, value: str) -> None:
+        with self._lock:
+            self._timed('set', self.backend.set_password, self.service, self.username, value)
+            self._value, self._fetched = value, True
+
+    def delete(self) -> None:
+        with self._lock:
+            if self._fetched and self._value is None:
+                return
+            try:
+                self._timed('delete', self.backend.delete_password, self.service, self.username)
+            except Exception:
+                # the keyring raises when there is nothing to delete
+                pass
+            self._value, self._fetched = None, True
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._value, self._fetched = None, False
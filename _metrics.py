@@ -0,0 +1,125 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+
+# ---------------- hot path instrumentation --------------------
+# Opt in with `PM_METRICS=1`, the *Diagnostics* window in the Settings tab or `cli.py --metrics`.
+# While enabled, `_backend` records timing spans (calls, total and slowest seconds per name) and
+# counters (operations, bytes) here; `report` returns them as one JSON-ready dict.
+#
+# Disabled, every hook costs a check of the module level `enabled` flag: `span` hands back a
+# shared no-op context manager, `timed` calls straight through and `add` / `record` return at once.
+METRICS_ENV = 'PM_METRICS'
+
+enabled = os.getenv(METRICS_ENV) == '1'
+_lock = threading.Lock()
+_spans: dict[str, list] = {}  # name -> [calls, total seconds, slowest seconds]
+_counters: dict[str, int] = {}
+_since = time.time()
+_NO_SPAN = nullcontext()
+
+
+def enable() -> None:
+    global enabled
+    enabled = True
+
+def disable() -> None:
+    global enabled
+    enabled = False
+
+def reset() -> None:
+    global _since
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _since = time.time()
+
+def record(name: str, seconds: float) -> None:
+    if not enabled:
+        return
+    with _lock:
+        span = _spans.get(name)
+        if span is None:
+            _spans[name] = [1, seconds, seconds]
+        else:
+            span[0] += 1
+            span[1] += seconds
+            span[2] = max(span[2], seconds)
+
+def add(name: str, amount: int = 1) -> None:
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+class Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+
+
+def span(name: str):
+    # `with _metrics.span('vault.load'): ...`
+    return Span(name) if enabled else _NO_SPAN
+
+def timed(name: str):
+    # decorator version of `span`
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+# ---------------- reports --------------------
+def report() -> dict:
+    with _lock:
+        spans = {
+            name: {'calls': calls, 'seconds': round(total, 6), 'max': round(slowest, 6)}
+            for name, (calls, total, slowest) in sorted(_spans.items())
+        }
+        counters = dict(sorted(_counters.items()))
+    return {
+        'enabled': enabled,
+        'since': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(_since)),
+        'seconds': round(time.time() - _since, 3),
+        'pid': os.getpid(),
+        'spans': spans,
+        'counters': counters,
+    }
+
+def format_report(data: dict) -> str:
+    # plain text for the diagnostics window, slowest spans first
+    lines = [f"{'span':<28}{'calls':>8}{'total ms':>12}{'max ms':>10}"]
+    for name, span in sorted(data['spans'].items(), key=lambda item: -item[1]['seconds']):
+        lines.append(f"{name:<28}{span['calls']:>8}{span['seconds'] * 1000:>12.1f}{span['max'] * 1000:>10.1f}")
+    lines.append('')
+    lines.append(f"{'counter':<28}{'value':>12}")
+    for name, value in data['counters'].items():
+        lines.append(f"{name:<28}{value:>12,}")
+    return '\n'.join(lines)
+
+def write_report(file_path: Path) -> None:
+    with open(file_path, 'w') as f:
+        json.dump(report(), f, indent=1)
@@ -0,0 +1,283 @@
+import functools
+import json
+import math
+import os
+import string
+import threading
+from pathlib import Path
+
+
+# ---------------- password generation --------------------
+# Passwords are generated in batches from a policy:
+#
+#   {'mode': 'characters', 'length': 16, 'exclude': 'Il1O0',
+#    'classes': {'upper': 1, 'lower': 1, 'digits': 2, 'special': 0}}
+#   {'mode': 'passphrase', 'words': 6, 'separator': '-', 'capitalize': False, 'word_list': None}
+#
+# `classes` maps every character class to use to the minimum number of its characters (0 = allowed
+# but not required). Missing keys are taken from the defaults below.
+#
+# Random bytes come from `os.urandom` in `RANDOM_BUFFER_SIZE` reads. A byte (or a 16 bit word for
+# word lists) is only used when it falls below the largest multiple of the alphabet size, so every
+# character is exactly uniform. Passwords that miss a minimum are thrown away as a whole, which
+# keeps the result uniform over every password the policy allows; `entropy` is log2 of that count.
+# Policies that would throw away most candidates draw the class counts from their exact
+# distribution instead, see `PasswordGenerator._generate_exact`.
+UPPER = string.ascii_uppercase
+LOWER = string.ascii_lowercase
+DIGITS = string.digits
+SPECIAL = r"/\()-_+@#$%*&<>?:{}.,"
+CHARACTER_CLASSES = {'upper': UPPER, 'lower': LOWER, 'digits': DIGITS, 'special': SPECIAL}
+CLASS_LABELS = {'upper': 'uppercase letters', 'lower': 'lowercase letters', 'digits': 'digits', 'special': 'special characters'}
+AMBIGUOUS_CHARACTERS = 'Il1O0o'
+
+MODES = ('characters', 'passphrase')
+MAX_LENGTH = 256
+MAX_WORDS = 64
+RANDOM_BUFFER_SIZE = 64 * 1024
+MIN_ACCEPTANCE = 1 / 16  # below this share of valid candidates, stop retrying whole passwords
+WORD_LIST_FILE_NAME = 'wordlist.txt'  # 2048 short English words, 11 bits each
+
+DEFAULT_POLICY = {
+    'mode': 'characters',
+    'length': 12,
+    'classes': {'upper': 1, 'lower': 1, 'digits': 1, 'special': 1},
+    'exclude': '',
+}
+DEFAULT_PASSPHRASE_POLICY = {
+    'mode': 'passphrase',
+    'words': 6,
+    'separator': '-',
+    'capitalize': False,
+    'word_list': None,
+}
+
+
+class PolicyError(ValueError):
+    pass
+
+
+def normalize_policy(policy: dict = None) -> dict:
+    # the policy with its defaults filled in, raises `PolicyError` when it can't produce a password
+    policy = dict(policy or {})
+    mode = policy.get('mode', 'characters')
+    if mode not in MODES:
+        raise PolicyError(f"unknown mode {mode!r}, expected one of {', '.join(MODES)}")
+
+    if mode == 'passphrase':
+        policy = {**DEFAULT_PASSPHRASE_POLICY, **policy}
+        if not 1 <= policy['words'] <= MAX_WORDS:
+            raise PolicyError(f"a passphrase needs 1 to {MAX_WORDS} words")
+        return policy
+
+    policy = {**DEFAULT_POLICY, **policy}
+    unknown = set(policy['classes']) - set(CHARACTER_CLASSES)
+    if unknown:
+        raise PolicyError(f"unknown character classes {', '.join(sorted(unknown))}")
+    if not policy['classes']:
+        raise PolicyError("a policy needs at least one character class")
+    if not 1 <= policy['length'] <= MAX_LENGTH:
+        raise PolicyError(f"length must be between 1 and {MAX_LENGTH}")
+    if any(minimum < 0 for minimum in policy['classes'].values()):
+        raise PolicyError("minimum counts can't be negative")
+    required = sum(policy['classes'].values())
+    if required > policy['length']:
+        raise PolicyError(f"length {policy['length']} is shorter than the {required} required characters")
+    return policy
+
+def load_word_list(file_path: Path = None) -> list[str]:
+    file_path = Path(__file__).with_name(WORD_LIST_FILE_NAME) if file_path is None else Path(file_path)
+    return list(_load_word_list(str(file_path.resolve())))
+
+@functools.lru_cache(maxsize=8)
+def _load_word_list(file_path: str) -> tuple[str, ...]:
+    with open(file_path, 'r', encoding='utf-8') as f:
+        words = tuple(dict.fromkeys(word for word in f.read().split()))
+    if not 2 <= len(words) <= 65536:
+        raise PolicyError(f"a word list needs 2 to 65536 distinct words, {file_path} has {len(words)}")
+    return words
+
+@functools.lru_cache(maxsize=None)
+def byte_table(alphabet: str) -> tuple[bytes, bytes, float]:
+    # a `bytes.translate` table from random bytes to characters, the bytes to drop so no character
+    # comes up more often than the others, and the share of bytes that are kept
+    size = len(alphabet)
+    limit = 256 - 256 % size
+    encoded = alphabet.encode('ascii')
+    table = bytes(encoded[byte % size] if byte < limit else 0 for byte in range(256))
+    return table, bytes(range(limit, 256)), limit / 256
+
+def count_valid(classes: list[tuple[str, int]], length: int) -> list[list[int]]:
+    # fill[i][t]: the number of strings of length t over classes[i:] meeting each of their minimums
+    fill = [[0] * (length + 1) for _ in range(len(classes) + 1)]
+    fill[-1][0] = 1
+    for i in range(len(classes) - 1, -1, -1):
+        size, minimum = len(classes[i][0]), classes[i][1]
+        for t in range(length + 1):
+            fill[i][t] = sum(math.comb(t, c) * size ** c * fill[i + 1][t - c] for c in range(minimum, t + 1))
+    return fill
+
+
+class RandomSource:
+    def __init__(self, buffer_size: int = RANDOM_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self._buffer = b''
+        self._pos = 0
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def read(self, n: int) -> bytes:
+        with self._lock:
+            if self._pid != os.getpid():
+                # a forked child must not hand out the bytes its parent is handing out too
+                self._buffer, self._pos, self._pid = b'', 0, os.getpid()
+            if self._pos + n > len(self._buffer):
+                self._buffer, self._pos = os.urandom(max(self.buffer_size, n)), 0
+            data = self._buffer[self._pos:self._pos + n]
+            self._pos += n
+            return data
+
+    def below(self, n: int) -> int:
+        # uniform in range(n), n can be as large as needed
+        bits = (n - 1).bit_length()
+        if bits == 0:
+            return 0
+        size, mask = (bits + 7) // 8, (1 << bits) - 1
+        while True:
+            value = int.from_bytes(self.read(size), 'little') & mask
+            if value < n:
+                return value
+
+    def characters(self, alphabet: str, count: int) -> str:
+        # `count` characters drawn uniformly from an ASCII alphabet of at most 256 characters
+        table, drop, kept = byte_table(alphabet)
+        chunks, found = [], 0
+        while found < count:
+            chunk = self.read(int((count - found) / kept) + 16).translate(table, drop)
+            chunks.append(chunk)
+            found += len(chunk)
+        return b''.join(chunks)[:count].decode('ascii')
+
+    def indexes(self, n: int, count: int) -> list[int]:
+        # `count` draws uniform in range(n), n up to 65536
+        limit = 65536 - 65536 % n
+        result = []
+        while len(result) < count:
+            draws = int((count - len(result)) * 65536 / limit) + 16
+            result.extend(value % n for value in memoryview(self.read(2 * draws)).cast('H') if value < limit)
+        del result[count:]
+        return result
+
+    def shuffle(self, items: list) -> None:
+        for i in range(len(items) - 1, 0, -1):
+            j = self.below(i + 1)
+            items[i], items[j] = items[j], items[i]
+
+
+class PasswordGenerator:
+    def __init__(self, policy: dict = None, source: RandomSource = None):
+        self.policy = normalize_policy(policy)
+        self.source = _default_source if source is None else source
+
+        if self.policy['mode'] == 'passphrase':
+            self.words = load_word_list(self.policy['word_list'])
+            self.entropy = self.policy['words'] * math.log2(len(self.words))
+            return
+
+        excluded = set(self.policy['exclude'])
+        self.classes = []  # (alphabet, minimum), classes left empty by the exclusions are dropped
+        for name, minimum in self.policy['classes'].items():
+            alphabet = ''.join(char for char in CHARACTER_CLASSES[name] if char not in excluded)
+            if alphabet:
+                self.classes.append((alphabet, minimum))
+            elif minimum:
+                raise PolicyError(f"every {name} character is excluded")
+        if not self.classes:
+            raise PolicyError("every character is excluded")
+        self.alphabet = ''.join(alphabet for alphabet, _ in self.classes)
+
+        # translation tables that delete everything but one class, to count its characters
+        self._minimums = []
+        for alphabet, minimum in self.classes:
+            if minimum:
+                others = ''.join(other for other, _ in self.classes if other != alphabet)
+                self._minimums.append((str.maketrans('', '', others), minimum))
+
+        length = self.policy['length']
+        self._fill = count_valid(self.classes, length)
+        self.valid_count = self._fill[0][length]
+        self.acceptance = self.valid_count / len(self.alphabet) ** length
+        self.entropy = math.log2(self.valid_count)
+
+    def generate(self, count: int = 1) -> list[str]:
+        if self.policy['mode'] == 'passphrase':
+            return self._generate_passphrases(count)
+        if self.acceptance >= MIN_ACCEPTANCE:
+            return self._generate_by_rejection(count)
+        return [self._generate_exact() for _ in range(count)]
+
+    def meets_minimums(self, password: str) -> bool:
+        return all(len(password.translate(keep)) >= minimum for keep, minimum in self._minimums)
+
+    def _generate_by_rejection(self, count: int) -> list[str]:
+        length = self.policy['length']
+        passwords = []
+        while len(passwords) < count:
+            batch = int((count - len(passwords)) / self.acceptance) + 1
+            text = self.source.characters(self.alphabet, batch * length)
+            candidates = (text[i:i + length] for i in range(0, len(text), length))
+            passwords.extend(filter(self.meets_minimums, candidates))
+        del passwords[count:]
+        return passwords
+
+    def _generate_exact(self) -> str:
+        # how many characters each class gets is drawn weighted by the number of valid passwords with
+        # that many, then the characters and their order: as uniform as the rejection path
+        remaining = self.policy['length']
+        chars = []
+        for i, (alphabet, minimum) in enumerate(self.classes):
+            weights = [math.comb(remaining, c) * len(alphabet) ** c * self._fill[i + 1][remaining - c]
+                       for c in range(minimum, remaining + 1)]
+            draw = self.source.below(sum(weights))
+            for taken, weight in enumerate(weights, minimum):
+                if draw < weight:
+                    break
+                draw -= weight
+            chars.extend(self.source.characters(alphabet, taken))
+            remaining -= taken
+        self.source.shuffle(chars)
+        return ''.join(chars)
+
+    def _generate_passphrases(self, count: int) -> list[str]:
+        size = self.policy['words']
+        indexes = self.source.indexes(len(self.words), count * size)
+        phrases = []
+        for i in range(0, len(indexes), size):
+            words = [self.words[j] for j in indexes[i:i + size]]
+            if self.policy['capitalize']:
+                words = [word.capitalize() for word in words]
+            phrases.append(self.policy['separator'].join(words))
+        return phrases
+
+
+_default_source = RandomSource()
+_generators: dict[str, PasswordGenerator] = {}
+_generators_lock = threading.Lock()
+
+def get_generator(policy: dict = None) -> PasswordGenerator:
+    # generators are cached per policy, setting one up counts every valid password once
+    key = json.dumps(policy or {}, sort_keys=True)
+    with _generators_lock:
+        generator = _generators.get(key)
+        if generator is None:
+            if len(_generators) >= 32:
+                _generators.clear()
+            generator = _generators[key] = PasswordGenerator(policy)
+        return generator
+
+def generate_passwords(count: int = 1, policy: dict = None) -> list[str]:
+    return get_generator(policy).generate(count)
+
+def policy_entropy(policy: dict = None) -> float:
+    # bits of entropy of one password, log2 of the number of passwords the policy can produce
+    return get_generator(policy).entropy
@@ -0,0 +1,88 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable
+
+import _backend as b
+import _rotation
+
+
+# ---------------- data key rotation --------------------
+# `start` puts a new Fernet data key in front of the key ring (`_backend.rotate_data_key`). From then
+# on every token is made with it while the older keys keep decrypting what they made (MultiFernet),
+# so nothing has to be re-encrypted up front. Records move to the new key lazily: a lookup
+# re-encrypts the entry it read, and `step` re-encrypts the next `CHUNK_SIZE` records in index order,
+# saving its position in `REKEY_FILE_NAME` after every chunk so an interrupted pass picks up where
+# it stopped. Re-encrypted tokens keep the time they were made, which `_rotation` reads as the age.
+#
+# At the end of a pass the journal is folded in and every record, and those kept by a pending bulk
+# rotation, is checked. Only then are the old keys dropped, so a crash at any point leaves a ring
+# that still decrypts every token on disk. The blind index key is never rotated.
+CHUNK_SIZE = 2_000
+
+
+def get_state_path() -> Path:
+    return b.get_vault_directory() / b.REKEY_FILE_NAME
+
+def read_state() -> dict:
+    file_path = get_state_path()
+    if not os.path.isfile(file_path):
+        return {'started': None, 'position': '', 'reencrypted': 0}
+    with open(file_path, 'r') as f:
+        return json.load(f)
+
+def write_state(state: dict) -> None:
+    b.write_file_atomic(get_state_path(), json.dumps(state).encode())
+
+def status() -> dict:
+    # 'pending' stays True until the old keys are gone, 'position' is None once the pass is through
+    keys = len(b.get_data_keys())
+    return {'keys': keys, 'pending': keys > 1, **read_state()}
+
+def start() -> dict:
+    # a new data key; a pass still running for an earlier one starts over
+    b.rotate_data_key()
+    write_state({'started': time.time(), 'position': '', 'reencrypted': 0})
+    b.update_backup_files()  # a key file restored from the backups has to know the new key
+    return status()
+
+def step(chunk_size: int = CHUNK_SIZE) -> dict:
+    # re-encrypts one chunk, or finishes the rotation when the pass is through
+    if len(b.get_data_keys()) == 1:
+        if os.path.isfile(get_state_path()):
+            os.remove(get_state_path())
+        return status()
+
+    state = read_state()
+    if state['position'] is not None:
+        state['position'], count = b.reencrypt_records(state['position'], chunk_size)
+        state['reencrypted'] += count
+        write_state(state)
+        if state['position'] is not None:
+            return status()
+    return finish(state)
+
+def finish(state: dict) -> dict:
+    b.flush_journal()  # superseded journal lines still hold old tokens
+    _rotation.reencrypt_pending()
+    current = b.get_data_keys()[0]
+    if not all(b.record_is_current(record, current) for record in b.load_vault_records().values()):
+        # written by a process that hadn't seen the new key yet, go round once more
+        state['position'] = ''
+        write_state(state)
+        return status()
+
+    b.retire_data_keys()
+    os.remove(get_state_path())
+    b.update_backup_files()
+    return status()
+
+def run(progress: Callable = None) -> dict:
+    # the rest of the pass in one go
+    result = status()
+    while result['pending']:
+        result = step()
+        if progress is not None:
+            progress(result)
+    return result
@@ -0,0 +1,185 @@
+import fnmatch
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable
+
+import _backend as b
+import _passgen
+
+
+# ---------------- bulk password rotation --------------------
+# Picks entries by name pattern and/or age, gives each one a freshly generated value and writes
+# all of them in a single atomic vault rewrite (`_backend.update_vault_records`), however many
+# there are. Only the value tokens are replaced: names are decrypted to match the pattern, old
+# values are never decrypted.
+#
+# Until the batch is confirmed, the records it replaced are kept in `ROTATION_FILE_NAME` next to
+# the vault, encrypted as they were. That file is written before the vault, so the old values are
+# recoverable even after a crash in between. `rollback` puts them back for entries that still
+# hold their rotated value. Entries edited since keep the edit. Only one rotation can be pending.
+#
+# An entry's age is the time its value was last set, see `_backend.value_timestamp`.
+DEFAULT_POLICY = {'length': 20}
+
+
+class RotationError(Exception):
+    pass
+
+
+def get_rotation_path() -> Path:
+    return b.get_vault_directory() / b.ROTATION_FILE_NAME
+
+def read_pending() -> dict | None:
+    file_path = get_rotation_path()
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, 'r') as f:
+        return json.load(f)
+
+def write_pending(pending: dict) -> None:
+    b.write_file_atomic(get_rotation_path(), json.dumps(pending).encode())
+
+def pending_rotation() -> dict | None:
+    # a summary of the rotation waiting to be confirmed, None if there is none
+    pending = read_pending()
+    if pending is None:
+        return None
+    return {'created': pending['created'], 'count': len(pending['entries'])}
+
+def select(records: dict[str, b.Record], pattern: str = None, older_than: float = None) -> list[tuple[str, str]]:
+    # (idx, name) of the records whose name matches the glob `pattern` (case-insensitive) and whose
+    # value is at least `older_than` seconds old
+    if older_than is not None:
+        cutoff = time.time() - older_than
+        records = {idx: record for idx, record in records.items() if b.value_timestamp(record) <= cutoff}
+    if not records:
+        return []
+
+    indexes = list(records)
+    names = [name.decode() for name in b.decrypt_many([records[idx].name for idx in indexes])]
+    selected = zip(indexes, names)
+    if pattern is not None:
+        pattern = pattern.lower()
+        selected = ((idx, name) for idx, name in selected if fnmatch.fnmatchcase(name.lower(), pattern))
+    return sorted(selected, key=lambda item: item[1].lower())
+
+def preview(pattern: str = None, older_than: float = None) -> list[str]:
+    return [name for _, name in select(b.load_vault_records(), pattern, older_than)]
+
+def rotate(pattern: str = None, older_than: float = None, policy: dict = None,
+           progress: Callable = None) -> dict[str, str]:
+    # new values for every selected entry, committed at once; returns them by name
+    if read_pending() is not None:
+        raise RotationError("a rotation is waiting to be confirmed or rolled back")
+    policy = DEFAULT_POLICY if policy is None else policy
+    generator = _passgen.get_generator(policy)  # an invalid policy fails before anything is touched
+    rotated = {}
+
+    def update(records: dict[str, b.Record]) -> dict[str, b.Record]:
+        selected = select(records, pattern, older_than)
+        if not selected:
+            return {}
+        if progress is not None:
+            progress({'selected': len(selected)})
+
+        values = generator.generate(len(selected))
+        tokens = b.encrypt_many(values)
+        # only the value changes, the name and the other fields keep their tokens
+        changes = {idx: b.Record(records[idx].name, token, 0, records[idx].fields, records[idx].terms)
+                   for (idx, _), token in zip(selected, tokens)}
+
+        write_pending({
+            'created': time.time(),
+            'policy': policy,
+            'entries': {idx: {'old': records[idx].to_list(), 'new': record.to_list()} for idx, record in changes.items()},
+        })
+        rotated.update((name, value) for (_, name), value in zip(selected, values))
+        return changes
+
+    b.update_vault_records(update)
+    return rotated
+
+def confirm() -> int:
+    # forgets the old values, returns how many entries the rotation changed
+    pending = read_pending()
+    if pending is None:
+        raise RotationError("no rotation to confirm")
+    os.remove(get_rotation_path())
+    return len(pending['entries'])
+
+def rollback(names: list[str] = None) -> dict[str, int]:
+    # restores the old values (of `names` only, if given) for entries still holding their rotated value
+    pending = read_pending()
+    if pending is None:
+        raise RotationError("no rotation to roll back")
+    wanted = None if names is None else {b.name_index(name) for name in names}
+    stats = {'restored': 0, 'kept': 0}
+
+    def update(records: dict[str, b.Record]) -> dict[str, b.Record]:
+        changes = {}
+        for idx, entry in pending['entries'].items():
+            if wanted is not None and idx not in wanted:
+                continue
+            current = records.get(idx)
+            if still_rotated(current, b.Record.from_list(entry['new'])):
+                # the old value, with the fields as they are now
+                old = b.Record.from_list(entry['old'])
+                changes[idx] = b.Record(old.name, old.value, old.flags, current.fields, current.terms)
+                stats['restored'] += 1
+            else:
+                stats['kept'] += 1  # edited or deleted since the rotation, that wins
+        return changes
+
+    b.update_vault_records(update)
+
+    # rolled back entries leave the pending batch, the rest still wait for confirm / rollback
+    if wanted is None:
+        os.remove(get_rotation_path())
+    else:
+        pending['entries'] = {idx: entry for idx, entry in pending['entries'].items() if idx not in wanted}
+        if pending['entries']:
+            write_pending(pending)
+        else:
+            os.remove(get_rotation_path())
+    return stats
+
+def still_rotated(record: b.Record | None, rotated: b.Record) -> bool:
+    # the record still holds the value the rotation gave it, possibly re-encrypted under a newer data
+    # key since (which keeps the token's timestamp)
+    if record is None:
+        return False
+    if record == rotated:
+        return True
+    return (b.value_timestamp(record) == b.value_timestamp(rotated)
+            and b.decrypt_field(record, 'value') == b.decrypt_field(rotated, 'value'))
+
+def reencrypt_pending() -> int:
+    # puts the kept records under the newest data key, before `_rekey` retires the old ones;
+    # returns how many records were re-encrypted
+    pending = read_pending()
+    if pending is None:
+        return 0
+    keys = b.get_data_keys()
+    if len(keys) == 1:
+        return 0
+    cipher = b.make_cipher(keys)
+    count = 0
+    for entry in pending['entries'].values():
+        for field in ('old', 'new'):
+            record = b.Record.from_list(entry[field])
+            if not b.record_is_current(record, keys[0]):
+                entry[field] = b.reencrypted_record(record, cipher).to_list()
+                count += 1
+    if count:
+        write_pending(pending)
+    return count
+
+def previous_password(name: str) -> str | None:
+    # the value `name` had before the pending rotation
+    pending = read_pending()
+    entry = None if pending is None else pending['entries'].get(b.name_index(name))
+    if entry is None:
+        return None
+    return b.decrypt_field(b.Record.from_list(entry['old']), 'value')
@@ -0,0 +1,344 @@
+import bisect
+import heapq
+import re
+from array import array
+from collections import Counter
+from typing import Iterable
+
+
+# ---------------- search index over entry names --------------------
+# Names are indexed by their lowercase trigrams (for substring queries) plus the first and last
+# two letters of every word behind a start/end marker, so typo'd queries still share grams with
+# what they meant.
+# A sorted list of lowercase names answers prefix queries with bisect, a second one sorted by what
+# follows every word start answers word prefix queries the same way, and a third one holds the names
+# in the order hits are ranked by within a tier (shortest first).
+# With a `limit`, `search` ranks tier by tier and stops as soon as it has enough, so a query that
+# hits most of the vault ('a') costs about as much as one that hits a handful.
+# Entries can also carry opaque terms (the blind index digests of their username, URL host and tags,
+# see `_backend.field_terms`) with postings of their own, for `tag:work host:github.com` filters.
+# All of it is updated incrementally as entries are added and removed.
+WORD_START = '\x02'
+WORD_END = '\x03'
+FUZZY_CANDIDATES = 200  # names compared by edit distance per fuzzy query
+FUZZY_BELOW = 20        # typo tolerant matches are only looked for when there are fewer hits than this
+WORD_SPLIT = re.compile(r'[\W_]+')
+FILTER_WORD = re.compile(r'(?<!\S)(user|host|tag):(\S+)')
+LAST_CHAR = '\U0010ffff'  # sorts after anything a name can continue with, for prefix ranges
+
+RANK_EXACT = 0
+RANK_PREFIX = 1
+RANK_WORD_PREFIX = 2
+RANK_SUBSTRING = 3
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def word_grams(text: str) -> set[str]:
+    grams = set()
+    for word in filter(None, WORD_SPLIT.split(text)):
+        grams |= trigrams(WORD_START + word + WORD_END)
+    return grams
+
+def edge_grams(text: str) -> set[str]:
+    # the marker grams of `word_grams`, the inner ones are already among the name's trigrams
+    grams = set()
+    for word in filter(None, WORD_SPLIT.split(text)):
+        grams.add(WORD_START + word[:2])
+        grams.add(word[-2:] + WORD_END)
+    return grams
+
+def parse_query(query: str) -> tuple[str, list[tuple[str, str]]]:
+    # splits 'git tag:work user:alice' into the text to search for and the (filter, text) pairs
+    filters = [(match[1], match[2]) for match in FILTER_WORD.finditer(query)]
+    return ' '.join(FILTER_WORD.sub('', query).split()), filters
+
+def word_starts(lower: str) -> list[int]:
+    # where the words after the first begin, as `SearchIndex.rank` sees them
+    return [i for i in range(1, len(lower)) if not lower[i - 1].isalnum()]
+
+def smallest(items: Iterable[str], count: int, key) -> list[str]:
+    items = list(items)
+    return sorted(items, key=key) if count >= len(items) else heapq.nsmallest(count, items, key=key)
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    # optimal string alignment distance (counts a transposition as one edit), gives up past `limit`.
+    # Only cells within `limit` of the diagonal can stay within it, the rest are never filled in.
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    over = limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [over] * (len(b) + 1)
+        current[0] = i
+        ca, ca_before = a[i - 1], a[i - 2] if i > 1 else None
+        lo, hi = max(1, i - limit), min(len(b), i + limit)
+        for j in range(lo, hi + 1):
+            cb = b[j - 1]
+            d = previous[j - 1] + (ca != cb)
+            if previous[j] + 1 < d:
+                d = previous[j] + 1
+            if current[j - 1] + 1 < d:
+                d = current[j - 1] + 1
+            if j > 1 and ca == b[j - 2] and ca_before == cb and previous2[j - 2] + 1 < d:
+                d = previous2[j - 2] + 1
+            current[j] = d
+        if min(current[lo - 1:hi + 1]) > limit:
+            return over
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SearchIndex:
+    def __init__(self, names: Iterable[str] = (), terms: dict[str, list[bytes]] = None):
+        self.rebuild(names, terms)
+
+    def clear(self) -> None:
+        self._lower: dict[str, str] = {}
+        self._sorted: list[tuple[str, str]] = []
+        self._by_length: list[str] = []  # sorted by `_length_key`
+        self._word_names: list[str] = []  # with `_word_offsets`: every word start, sorted by `_word_key`
+        self._word_offsets = array('I')
+        self._grams: dict[str, set[str]] = {}
+        self._terms_of: dict[str, list[bytes]] = {}
+        self._terms: dict[bytes, set[str]] = {}
+
+    def rebuild(self, names: Iterable[str], terms: dict[str, list[bytes]] = None) -> None:
+        # bulk version of `add`, sorts once instead of inserting one by one
+        self.clear()
+        for name in names:
+            if name in self._lower:
+                continue
+            lower = name.lower()
+            self._lower[name] = lower
+            for gram in self._grams_of(lower):
+                self._grams.setdefault(gram, set()).add(name)
+        self._sorted = sorted((lower, name) for name, lower in self._lower.items())
+        self._by_length = sorted(self._lower, key=self._length_key)
+        starts = sorted(((name, i) for name, lower in self._lower.items() for i in word_starts(lower)),
+                        key=lambda start: self._lower[start[0]][start[1]:])
+        self._word_names = [name for name, _ in starts]
+        self._word_offsets = array('I', (i for _, i in starts))
+        for name, name_terms in (terms or {}).items():
+            self.set_terms(name, name_terms)
+
+    def __len__(self) -> int:
+        return len(self._lower)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._lower
+
+    def _grams_of(self, lower: str) -> set[str]:
+        return trigrams(lower) | edge_grams(lower)
+
+    def _length_key(self, name: str) -> tuple[int, str, str]:
+        return len(name), self._lower[name], name
+
+    def _word_key(self, i: int) -> str:
+        # what follows the i-th word start
+        return self._lower[self._word_names[i]][self._word_offsets[i]:]
+
+    def _find_word_start(self, text: str) -> int:
+        return bisect.bisect_left(range(len(self._word_names)), text, key=self._word_key)
+
+    def add(self, name: str, terms: list[bytes] = ()) -> None:
+        if terms:
+            self.set_terms(name, terms)
+        if name in self._lower:
+            return
+        lower = name.lower()
+        self._lower[name] = lower
+        bisect.insort(self._sorted, (lower, name))
+        bisect.insort(self._by_length, name, key=self._length_key)
+        for offset in word_starts(lower):
+            i = self._find_word_start(lower[offset:])
+            self._word_names.insert(i, name)
+            self._word_offsets.insert(i, offset)
+        for gram in self._grams_of(lower):
+            self._grams.setdefault(gram, set()).add(name)
+
+    def remove(self, name: str) -> None:
+        self.set_terms(name, ())
+        lower = self._lower.pop(name, None)
+        if lower is None:
+            return
+        i = bisect.bisect_left(self._sorted, (lower, name))
+        del self._sorted[i]
+        self._lower[name] = lower  # the keys below still need it
+        del self._by_length[bisect.bisect_left(self._by_length, self._length_key(name), key=self._length_key)]
+        for offset in word_starts(lower):
+            i = self._find_word_start(lower[offset:])
+            while self._word_names[i] != name or self._word_offsets[i] != offset:
+                i += 1
+            del self._word_names[i]
+            del self._word_offsets[i]
+        del self._lower[name]
+        for gram in self._grams_of(lower):
+            names = self._grams[gram]
+            names.discard(name)
+            if not names:
+                del self._grams[gram]
+
+    def set_terms(self, name: str, terms: list[bytes]) -> None:
+        for term in self._terms_of.pop(name, ()):
+            names = self._terms[term]
+            names.discard(name)
+            if not names:
+                del self._terms[term]
+        if terms:
+            self._terms_of[name] = list(terms)
+            for term in terms:
+                self._terms.setdefault(term, set()).add(name)
+
+    def filter(self, terms: list[bytes]) -> set[str]:
+        # the names carrying every one of `terms`
+        postings = sorted((self._terms.get(term, set()) for term in terms), key=len)
+        return set(postings[0]).intersection(*postings[1:]) if postings else set(self._lower)
+
+    def all(self) -> list[str]:
+        return [name for _, name in self._sorted]
+
+    def prefix(self, query: str) -> list[str]:
+        query = query.lower()
+        i = bisect.bisect_left(self._sorted, (query, ''))
+        matches = []
+        while i < len(self._sorted) and self._sorted[i][0].startswith(query):
+            matches.append(self._sorted[i][1])
+            i += 1
+        return matches
+
+    def word_prefix(self, query: str) -> set[str]:
+        # the names with a word after the first starting with `query`
+        query = query.lower()
+        i = self._find_word_start(query)
+        names = set()
+        while i < len(self._word_names) and self._word_key(i).startswith(query):
+            names.add(self._word_names[i])
+            i += 1
+        return names
+
+    def substring(self, query: str) -> list[str]:
+        query = query.lower()
+        if len(query) < 3:
+            # too short to have a trigram, a plain scan over the lowercase names is fast enough
+            return [name for name, lower in self._lower.items() if query in lower]
+
+        postings = sorted((self._grams.get(gram, set()) for gram in trigrams(query)), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return [name for name in candidates if query in self._lower[name]]
+
+    def fuzzy(self, query: str, max_distance: int = None) -> list[tuple[int, str]]:
+        query = query.lower()
+        if len(query) < 3:
+            return []
+        max_distance = max(1, len(query) // 4) if max_distance is None else max_distance
+
+        shared = Counter()
+        for gram in word_grams(query):
+            shared.update(self._grams.get(gram, ()))
+
+        matches = []
+        for name, _ in shared.most_common(FUZZY_CANDIDATES):
+            lower = self._lower[name]
+            words = [lower] + [word for word in WORD_SPLIT.split(lower) if word]
+            distance = min(edit_distance(query, word, max_distance) for word in words)
+            if distance <= max_distance:
+                matches.append((distance, name))
+        return matches
+
+    def rank(self, query: str, name: str) -> int:
+        lower, query = self._lower[name], query.lower()
+        if lower == query:
+            return RANK_EXACT
+        i = lower.find(query)
+        if i == 0:
+            return RANK_PREFIX
+        while i > 0:
+            if not lower[i - 1].isalnum():
+                return RANK_WORD_PREFIX
+            i = lower.find(query, i + 1)
+        return RANK_SUBSTRING
+
+    def search(self, query: str, fuzzy: bool = True, limit: int = None, terms: list[bytes] = None) -> list[str]:
+        # case-insensitive; exact, prefix, word prefix and substring hits first, then typo tolerant ones.
+        # Within a tier shorter names come first. With `terms` only names carrying all of them are
+        # looked at. Each tier is only ranked as far as `limit` needs, later tiers not at all.
+        allowed = None if terms is None else self.filter(terms)
+        query = query.strip()
+        if not query:
+            if allowed is None:
+                return [name for _, name in self._sorted[:limit]]
+            return smallest(allowed, len(allowed) if limit is None else limit, lambda name: (self._lower[name], name))
+
+        lower = query.lower()
+        wanted = len(self._lower) if limit is None else limit
+
+        def keep(names: Iterable[str]) -> set[str]:
+            return set(names) if allowed is None else {name for name in names if name in allowed}
+
+        # exact hits are the shortest prefix hits, one ordering serves both
+        if allowed is None and self._walk_is_cheaper(self._count_prefix(lower), wanted):
+            results = self._walk(wanted, lambda name, name_lower: name_lower.startswith(lower))
+            prefix = set(results)
+        else:
+            prefix = keep(self.prefix(lower))
+            results = smallest(prefix, wanted, lambda name: (self._lower[name] != lower,) + self._length_key(name))
+
+        if len(results) < wanted:
+            count = wanted - len(results)
+            if allowed is None and self._walk_is_cheaper(self._count_word_prefix(lower), count):
+                found = self._walk(count, lambda name, name_lower: (
+                    lower in name_lower and name not in prefix and self.rank(lower, name) == RANK_WORD_PREFIX))
+                words = set(found)
+            else:
+                words = keep(self.word_prefix(lower)) - prefix
+                found = smallest(words, count, self._length_key)
+            results += found
+            if len(results) < wanted:
+                results += self._substring_hits(lower, wanted - len(results), prefix | words, allowed)
+
+        if fuzzy and len(results) < (FUZZY_BELOW if limit is None else min(limit, FUZZY_BELOW)):
+            hits = set(results)
+            extra = sorted((distance, len(name), name) for distance, name in self.fuzzy(query)
+                           if name not in hits and (allowed is None or name in allowed))
+            results += [name for *_, name in extra]
+
+        return results[:limit]
+
+    def _count_prefix(self, lower: str) -> int:
+        return bisect.bisect_left(self._sorted, (lower + LAST_CHAR, '')) - bisect.bisect_left(self._sorted, (lower, ''))
+
+    def _count_word_prefix(self, lower: str) -> int:
+        # word starts, a name with two words starting alike counts twice
+        return self._find_word_start(lower + LAST_CHAR) - self._find_word_start(lower)
+
+    def _walk_is_cheaper(self, hits: int, count: int) -> bool:
+        # collecting and ranking all `hits` costs about `hits`, walking the names shortest first until
+        # `count` of them turned up about `count * len(self) / hits`
+        return hits * hits > count * len(self._lower)
+
+    def _walk(self, count: int, test) -> list[str]:
+        # the first `count` names, shortest first, that pass `test(name, lower)`
+        hits = []
+        for name in self._by_length:
+            if test(name, self._lower[name]):
+                hits.append(name)
+                if len(hits) == count:
+                    break
+        return hits
+
+    def _substring_hits(self, lower: str, count: int, ranked: set[str], allowed: set[str] | None) -> list[str]:
+        # the first `count` substring hits that aren't in `ranked` (and are `allowed`), shortest first
+        def wanted(name: str) -> bool:
+            return name not in ranked and (allowed is None or name in allowed)
+
+        if len(lower) >= 3:
+            return smallest(filter(wanted, self.substring(lower)), count, self._length_key)
+        if allowed is not None:
+            return smallest((name for name in allowed if lower in self._lower[name] and name not in ranked),
+                            count, self._length_key)
+        # too short for a trigram: walk the names shortest first, stopping once there are enough
+        return self._walk(count, lambda name, name_lower: lower in name_lower and name not in ranked)
@@ -0,0 +1,151 @@
+import csv
+import json
+import os
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+from urllib.parse import urlsplit
+
+import _backend as b
+
+
+# ---------------- bulk import & export --------------------
+# Plaintext dumps in and out of the vault, as CSV or JSON Lines. Files are read and written a row
+# at a time and handed to `_backend.import_entries` / `iter_vault_entries`, which encrypt and
+# decrypt them in chunks, so memory stays flat for dumps of any size.
+#
+# Imports take the column names used by our own export (name, password / value) and by the usual
+# browser and password manager CSV exports (Chrome, Firefox, Bitwarden, 1Password, KeePass).
+# Entries without a name are named after the host of their URL plus the username, so several
+# accounts on one site stay separate entries; explicit names are kept as they are, so an export
+# imports back under the same names. The username, URL, notes and tags are kept in the entry's
+# own fields, and exported with it.
+FORMATS = ('csv', 'jsonl')
+FORMAT_SUFFIXES = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+NAME_COLUMNS = ('name', 'title', 'account')
+URL_COLUMNS = ('url', 'login_uri', 'website', 'origin')
+USERNAME_COLUMNS = ('username', 'login_username', 'user name', 'login', 'email')
+PASSWORD_COLUMNS = ('password', 'login_password', 'value')
+NOTES_COLUMNS = ('notes', 'note', 'extra', 'comments')
+TAGS_COLUMNS = ('tags', 'folder', 'group', 'grouping')
+
+
+class TransferError(ValueError):
+    pass
+
+
+def detect_format(file_path: Path, file_format: str = None) -> str:
+    if file_format is not None:
+        if file_format not in FORMATS:
+            raise TransferError(f"unknown format {file_format!r}, expected one of {', '.join(FORMATS)}")
+        return file_format
+    try:
+        return FORMAT_SUFFIXES[Path(file_path).suffix.lower()]
+    except KeyError:
+        raise TransferError(f"can't tell the format of {file_path}, pass it explicitly")
+
+def pick(row: dict, columns: tuple) -> str:
+    for column in columns:
+        if row.get(column):
+            return row[column]
+    return ''
+
+def entry_from_row(row: dict) -> tuple[str, str, dict[str, str]] | None:
+    row = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+    password = pick(row, PASSWORD_COLUMNS)
+    name = pick(row, NAME_COLUMNS).strip()
+    url = pick(row, URL_COLUMNS).strip()
+    username = pick(row, USERNAME_COLUMNS).strip()
+    fields = {'username': username, 'url': url, 'notes': pick(row, NOTES_COLUMNS), 'tags': pick(row, TAGS_COLUMNS)}
+
+    if not name and url:
+        name = urlsplit(url).hostname or url
+        if username:
+            name = f'{name} ({username})'
+    if not name or not password or not isinstance(password, str):
+        return None
+    if not all(isinstance(text, str) for text in fields.values()):
+        return None
+    return name, password, {field: text for field, text in fields.items() if text}
+
+
+# ---------------- readers & writers --------------------
+def read_csv_rows(file_path: Path) -> Iterator[dict]:
+    # utf-8-sig: spreadsheet exports often start with a byte order mark
+    with open(file_path, 'r', newline='', encoding='utf-8-sig') as f:
+        yield from csv.DictReader(f)
+
+def read_jsonl_rows(file_path: Path) -> Iterator[dict]:
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                raise TransferError(f"{file_path}:{line_number}: not valid JSON")
+            if not isinstance(row, dict):
+                raise TransferError(f"{file_path}:{line_number}: expected a JSON object")
+            yield row
+
+def write_csv(f, chunks: Iterable[list[tuple[str, str, dict]]]) -> None:
+    writer = csv.writer(f)
+    writer.writerow(['name', 'password'] + list(b.ENTRY_FIELDS))
+    for chunk in chunks:
+        writer.writerows([name, value] + [fields.get(field, '') for field in b.ENTRY_FIELDS]
+                         for name, value, fields in chunk)
+
+def write_jsonl(f, chunks: Iterable[list[tuple[str, str, dict]]]) -> None:
+    for chunk in chunks:
+        f.writelines(json.dumps({'name': name, 'value': value, **fields}) + '\n' for name, value, fields in chunk)
+
+READERS = {'csv': read_csv_rows, 'jsonl': read_jsonl_rows}
+WRITERS = {'csv': write_csv, 'jsonl': write_jsonl}
+
+
+# ---------------- import & export --------------------
+def import_file(file_path: Path, file_format: str = None, overwrite: bool = False,
+                progress: Callable = None) -> dict[str, int]:
+    file_format = detect_format(file_path, file_format)
+    invalid = 0
+
+    def entries():
+        nonlocal invalid
+        for row in READERS[file_format](file_path):
+            entry = entry_from_row(row)
+            if entry is None:
+                invalid += 1
+            else:
+                yield entry
+
+    stats = b.import_entries(entries(), overwrite=overwrite, progress=progress)
+    stats['invalid'] = invalid
+    return stats
+
+def export_file(file_path: Path, file_format: str = None, progress: Callable = None) -> int:
+    # the export is plaintext: it is created readable by its owner only, and only shows up complete
+    file_format = detect_format(file_path, file_format)
+    file_path = Path(file_path)
+    tmp_path = file_path.with_name(file_path.name + '.tmp')
+    exported = 0
+
+    def chunks():
+        nonlocal exported
+        for chunk in b.iter_vault_entries(fields=True):
+            yield chunk
+            exported += len(chunk)
+            if progress is not None:
+                progress({'exported': exported})
+
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        with open(fd, 'w', newline='', encoding='utf-8') as f:
+            WRITERS[file_format](f, chunks())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return exported
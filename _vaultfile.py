@@ -0,0 +1,160 @@
+import mmap
+import struct
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
+
+
+# ---------------- binary vault container (format v3) --------------------
+#   header   magic | version u16 | flags u16 | record count u32 | table offset u64 | reserved u64
+#   records  idx (32 bytes) | flags u8 | field count u8 | field count x (length u32 | field bytes)
+#   table    record count x (idx (32 bytes) | record offset u64), sorted by idx
+#
+# Fields hold raw (base64-decoded) Fernet tokens, field 0 is the name and field 1 the value.
+# Structured entries add fields 2-5, the username, URL, notes and tags (empty when not set), and
+# field 6, the blind index terms of those fields (see `_backend.field_terms`). Entries with none of
+# them stop after the value, which is all a v2 record ever had: v2 files are read as they are and
+# written as v3 the next time the vault is saved.
+# The table lets a reader binary search a single record straight out of an mmap.
+MAGIC = b'PMVAULT\x00'
+VERSION = 3
+READABLE_VERSIONS = (2, 3)
+HEADER = struct.Struct('<8sHHIQQ')
+RECORD_HEAD = struct.Struct('<32sBB')
+FIELD_LENGTH = struct.Struct('<I')
+TABLE_ENTRY = struct.Struct('<32sQ')
+
+RECORD_COMPRESSED = 0x01  # value plaintext was zlib compressed before it was encrypted
+
+
+class VaultFormatError(ValueError):
+    pass
+
+
+def is_vault_file(file_path: Path) -> bool:
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+def encode_record(idx: bytes, flags: int, fields: list[bytes]) -> bytes:
+    parts = [RECORD_HEAD.pack(idx, flags, len(fields))]
+    for field in fields:
+        parts.append(FIELD_LENGTH.pack(len(field)))
+        parts.append(field)
+    return b''.join(parts)
+
+def write_vault_file(f: BinaryIO, records: Iterable[tuple[bytes, int, list[bytes]]]) -> int:
+    # streams records into `f`, only the (idx, offset) table is kept in memory
+    start = f.tell()
+    f.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0, 0))
+
+    table = []
+    offset = HEADER.size
+    for idx, flags, fields in records:
+        data = encode_record(idx, flags, fields)
+        table.append((idx, offset))
+        f.write(data)
+        offset += len(data)
+
+    table.sort()
+    f.write(b''.join(TABLE_ENTRY.pack(idx, record_offset) for idx, record_offset in table))
+
+    end = f.tell()
+    f.seek(start)
+    f.write(HEADER.pack(MAGIC, VERSION, 0, len(table), offset, 0))
+    f.seek(end)
+    return len(table)
+
+
+def decode_records(data: bytes) -> Iterator[tuple[bytes, int, list[bytes]]]:
+    # parses back-to-back encoded records, e.g. a slice of a vault's record area
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        idx, flags, field_count = RECORD_HEAD.unpack_from(view, offset)
+        offset += RECORD_HEAD.size
+        fields = []
+        for _ in range(field_count):
+            (length,) = FIELD_LENGTH.unpack_from(view, offset)
+            offset += FIELD_LENGTH.size
+            if offset + length > len(view):
+                raise VaultFormatError("truncated record")
+            fields.append(bytes(view[offset:offset + length]))
+            offset += length
+        yield idx, flags, fields
+
+
+class VaultReader:
+    def __init__(self, file_path: Path):
+        self._file = open(file_path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self._file.close()
+            raise VaultFormatError(f"{file_path} is empty")
+
+        magic, version, _, self.count, self.table_offset, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise VaultFormatError(f"{file_path} is not a vault file")
+        if version not in READABLE_VERSIONS:
+            self.close()
+            raise VaultFormatError(f"unsupported vault version {version}")
+        self.version = version
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        # the map has to go before the file, and both before anyone os.replace()s the vault on Windows
+        self._mm.close()
+        self._file.close()
+
+    def read_record(self, offset: int) -> tuple[bytes, int, list[bytes], int]:
+        mm = self._mm
+        idx, flags, field_count = RECORD_HEAD.unpack_from(mm, offset)
+        offset += RECORD_HEAD.size
+        fields = []
+        for _ in range(field_count):
+            (length,) = FIELD_LENGTH.unpack_from(mm, offset)
+            offset += FIELD_LENGTH.size
+            fields.append(mm[offset:offset + length])
+            offset += length
+        return idx, flags, fields, offset
+
+    def get(self, idx: bytes) -> tuple[int, list[bytes]] | None:
+        # binary search over the sorted offset table, touches O(log n) table entries and one record
+        mm = self._mm
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry_idx, offset = TABLE_ENTRY.unpack_from(mm, self.table_offset + mid * TABLE_ENTRY.size)
+            if entry_idx < idx:
+                lo = mid + 1
+            elif entry_idx > idx:
+                hi = mid
+            else:
+                _, flags, fields, _ = self.read_record(offset)
+                return flags, fields
+        return None
+
+    def iter_raw(self) -> Iterator[tuple[bytes, bytes]]:
+        # (idx, encoded record) in file order, the bytes are exactly what `encode_record` wrote
+        offset = HEADER.size
+        while offset < self.table_offset:
+            idx, _, _, end = self.read_record(offset)
+            yield idx, self._mm[offset:end]
+            offset = end
+
+    def __iter__(self) -> Iterator[tuple[bytes, int, list[bytes]]]:
+        offset = HEADER.size
+        while offset < self.table_offset:
+            idx, flags, fields, offset = self.read_record(offset)
+            yield idx, flags, fields
@@ -0,0 +1,148 @@
+import tkinter as tk
+from typing import Callable
+
+
+# ---------------- virtualized listbox --------------------
+# Holds the full list of items in python and only ever puts the visible rows into the Tk listbox,
+# so filling, filtering or mutating a list of 100k names costs a screenful of Tk calls.
+# Mirrors the bits of the `tk.Listbox` API the app uses: curselection(), get(), size() and
+# the <<ListboxSelect>> event (generated on this frame), with indexes into the full list.
+# Long search results come a window at a time: `set_items(..., more=...)` fetches the rest on scrolling.
+WHEEL_STEP = 3
+
+
+class VirtualListbox(tk.Frame):
+    def __init__(self, master, height: int, **listbox_options):
+        super().__init__(master)
+        self.rows = height
+        self.items: list[str] = []
+        self.more: Callable[[int], list[str]] | None = None  # fetches the first `count` items of a longer list
+        self.top = 0
+        self.selected: int | None = None
+        self._rendered: list[str] = []
+
+        self.scrollbar = tk.Scrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox = tk.Listbox(self, height=height, exportselection=False, **listbox_options)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH)
+
+        self.listbox.bind("<<ListboxSelect>>", self._on_listbox_select)
+        self.listbox.bind("<MouseWheel>", self._on_mouse_wheel)
+        self.listbox.bind("<Button-4>", lambda e: self.scroll(-WHEEL_STEP))
+        self.listbox.bind("<Button-5>", lambda e: self.scroll(WHEEL_STEP))
+        self.listbox.bind("<Up>", lambda e: self._on_arrow(-1))
+        self.listbox.bind("<Down>", lambda e: self._on_arrow(1))
+        self.listbox.bind("<Prior>", lambda e: self._on_arrow(-self.rows))
+        self.listbox.bind("<Next>", lambda e: self._on_arrow(self.rows))
+
+    # ---- tk.Listbox like API ----
+    def curselection(self) -> tuple:
+        return () if self.selected is None else (self.selected,)
+
+    def get(self, index: int) -> str:
+        return self.items[index]
+
+    def size(self) -> int:
+        return len(self.items)
+
+    # ---- model ----
+    def set_items(self, items: list[str], keep_position: bool = False,
+                  more: Callable[[int], list[str]] = None) -> None:
+        # the selection follows its item if it is still there, everything else is a re-render of the window.
+        # `items` may be the start of a longer list, `more(count)` is asked for more once scrolled near its end
+        selected_item = self.items[self.selected] if self.selected is not None else None
+        self.items = items
+        self.more = more
+        self.selected = None
+
+        if selected_item is not None:
+            try:
+                self.selected = items.index(selected_item)
+            except ValueError:
+                pass
+
+        if not keep_position:
+            self.top = 0
+        self._clamp_top()
+        self._render()
+
+    def select(self, index: int) -> None:
+        self.selected = index
+        self.see(index)
+        self._render()
+        self.event_generate("<<ListboxSelect>>")
+
+    def see(self, index: int) -> None:
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.rows:
+            self.top = index - self.rows + 1
+        self._clamp_top()
+
+    def scroll(self, rows: int) -> str:
+        self.top += rows
+        self._clamp_top()
+        self._render()
+        return "break"
+
+    # ---- rendering ----
+    def _clamp_top(self) -> None:
+        self.top = max(0, min(self.top, len(self.items) - self.rows))
+
+    def _fetch_more(self) -> None:
+        # twice as many once the window is within a page of the end, until `more` runs out
+        if self.more is not None and self.top + 2 * self.rows >= len(self.items):
+            count = max(2 * len(self.items), 2 * self.rows)
+            self.items = self.more(count)
+            if len(self.items) < count:
+                self.more = None
+
+    def _render(self) -> None:
+        self._fetch_more()
+        window = self.items[self.top:self.top + self.rows]
+        lb = self.listbox
+
+        # only rows whose text changed are touched
+        for row, item in enumerate(window):
+            if row >= len(self._rendered):
+                lb.insert(tk.END, item)
+            elif self._rendered[row] != item:
+                lb.delete(row)
+                lb.insert(row, item)
+        if len(self._rendered) > len(window):
+            lb.delete(len(window), tk.END)
+        self._rendered = window
+
+        lb.selection_clear(0, tk.END)
+        if self.selected is not None and self.top <= self.selected < self.top + len(window):
+            lb.selection_set(self.selected - self.top)
+
+        if self.items:
+            self.scrollbar.set(self.top / len(self.items), (self.top + len(window)) / len(self.items))
+        else:
+            self.scrollbar.set(0, 1)
+
+    # ---- event handlers ----
+    def _on_listbox_select(self, event) -> None:
+        selection = self.listbox.curselection()
+        self.selected = self.top + selection[0] if selection else None
+        self.event_generate("<<ListboxSelect>>")
+
+    def _on_scrollbar(self, action: str, amount: str, unit: str = None) -> None:
+        if action == tk.MOVETO:
+            self.top = int(float(amount) * len(self.items))
+            self._clamp_top()
+            self._render()
+        elif unit == tk.PAGES:
+            self.scroll(int(amount) * self.rows)
+        else:
+            self.scroll(int(amount))
+
+    def _on_mouse_wheel(self, event) -> str:
+        return self.scroll(-WHEEL_STEP if event.delta > 0 else WHEEL_STEP)
+
+    def _on_arrow(self, step: int) -> str:
+        if self.items:
+            index = 0 if self.selected is None else self.selected + step
+            self.select(max(0, min(index, len(self.items) - 1)))
+        return "break"
@@ -0,0 +1,118 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable
+
+
+# ---------------- background tasks for the Tk app --------------------
+# Backend calls (hashing, decrypting, disk and keyring I/O) run on worker threads and their results
+# are handed back to the Tk thread through a queue that is polled with `root.after`.
+# Nothing in here touches tkinter itself, the app passes its `after` method in.
+POLL_INTERVAL_MS = 30
+PROGRESS = 'progress'  # queue marker for progress reports, which don't finish their task
+
+
+class Task:
+    def __init__(self, on_done: Callable = None, on_error: Callable = None, on_progress: Callable = None):
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.future: Future | None = None
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        # a task that already started can't be stopped, but its callbacks will never run
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+
+
+class BackgroundTasks:
+    def __init__(self, schedule: Callable, workers: int = 2, on_busy_change: Callable = None,
+                 on_error: Callable = None):
+        self._schedule = schedule
+        self._results = queue.Queue()
+        self._readers = ThreadPoolExecutor(workers, thread_name_prefix='pm-worker')
+        # vault and keyring writes go through a single thread, so they hit the disk in submission order
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix='pm-writer')
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._polling = False
+        self.on_busy_change = on_busy_change
+        self.on_error = on_error  # used for tasks submitted without their own `on_error`
+
+    @property
+    def busy(self) -> bool:
+        return self._pending > 0
+
+    def submit(self, func: Callable, *args, on_done: Callable = None, on_error: Callable = None,
+               on_progress: Callable = None, write: bool = False) -> Task:
+        # must be called from the Tk thread; `on_done(result)` / `on_error(exc)` run there as well.
+        # With `on_progress`, `func` gets a `progress` keyword argument it can call from the worker
+        # thread, and `on_progress(value)` follows on the Tk thread.
+        task = Task(on_done, on_error, on_progress)
+        executor = self._writer if write else self._readers
+        kwargs = {}
+        if on_progress is not None:
+            kwargs['progress'] = lambda value: self._results.put((task, PROGRESS, value))
+
+        with self._lock:
+            self._pending += 1
+            was_idle = self._pending == 1
+
+        def run():
+            try:
+                self._results.put((task, True, func(*args, **kwargs)))
+            except BaseException as exc:
+                self._results.put((task, False, exc))
+
+        def on_future_done(future: Future):
+            # cancelled before it ever ran: `run` won't report back, so account for it here
+            if future.cancelled():
+                self._results.put((task, None, None))
+
+        task.future = executor.submit(run)
+        task.future.add_done_callback(on_future_done)
+
+        if was_idle and self.on_busy_change is not None:
+            self.on_busy_change(True)
+        if not self._polling:
+            self._polling = True
+            self._schedule(POLL_INTERVAL_MS, self.poll)
+        return task
+
+    def poll(self) -> None:
+        try:
+            while True:
+                try:
+                    task, ok, value = self._results.get_nowait()
+                except queue.Empty:
+                    break
+
+                if ok == PROGRESS:
+                    if not task.cancelled:
+                        task.on_progress(value)
+                    continue
+
+                with self._lock:
+                    self._pending -= 1
+                    now_idle = self._pending == 0
+
+                if not task.cancelled and ok is not None:
+                    callback = task.on_done if ok else (task.on_error or self.on_error)
+                    if callback is not None:
+                        callback(value)
+
+                if now_idle and self.on_busy_change is not None:
+                    self.on_busy_change(False)
+        finally:
+            # keep polling even if a callback blew up, other tasks are still waiting for theirs
+            if self._pending:
+                self._schedule(POLL_INTERVAL_MS, self.poll)
+            else:
+                self._polling = False
+
+    def shutdown(self, wait: bool = True) -> None:
+        # pending writes are always flushed, only queued reads are dropped
+        self._readers.shutdown(wait=wait, cancel_futures=True)
+        self._writer.shutdown(wait=wait)
@@ -0,0 +1,248 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+# ---------------- benchmarks for the backend hot paths --------------------
+#   python benchmark.py                                  sizes 10, 1k and 100k
+#   python benchmark.py --full                           10 up to 1M entries (slow)
+#   python benchmark.py --output new.json --baseline old.json
+#
+# Every vault size runs in its own process with XDG_CONFIG_HOME, XDG_DATA_HOME and TMPDIR pointed
+# into a fresh temp directory and the file keyring (`PM_KEYRING_BACKEND=file`), so a run never
+# touches the real vault, the OS keyring or the previous size's caches. The vaults are synthetic
+# and seeded, the same size always gets the same names and values.
+#
+# A case is run `--repeat` times, or fewer once it has used up `--budget` seconds (but at least
+# once), and reported as min / median / max seconds. With `--baseline` every case also present in
+# the baseline is compared by its fastest run, the one least disturbed by the rest of the machine;
+# slowdowns past `--max-slowdown` are listed as regressions and make the exit code 1.
+SIZES = (10, 1_000, 100_000)
+FULL_SIZES = (10, 100, 1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_REPEAT = 5
+DEFAULT_BUDGET = 10.0
+DEFAULT_MAX_SLOWDOWN = 0.25
+SEED = 1234
+MASTER_PASSWORD = 'benchmark-master-password'
+PASSWORD_GENERATOR_CALLS = 1_000
+
+WORDS = ('mail', 'bank', 'git', 'cloud', 'shop', 'work', 'home', 'router', 'vpn', 'forum', 'news',
+         'music', 'photo', 'travel', 'school', 'game', 'social', 'video', 'health', 'crypto')
+SEARCH_QUERIES = ('', 'git', 'mail-1', 'bnak', 'cloud shop', 'zzz')  # prefix, substring, typo, no hit
+
+
+def synthetic_entries(size: int, seed: int = SEED) -> dict[str, str]:
+    rng = random.Random(seed)
+    alphabet = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_.!'
+    entries = {}
+    for i in range(size):
+        name = f'{rng.choice(WORDS)}-{rng.choice(WORDS)} {i}'
+        entries[name] = ''.join(rng.choices(alphabet, k=rng.randint(12, 32)))
+    return entries
+
+def measure(func, setup=None, repeat: int = DEFAULT_REPEAT, budget: float = DEFAULT_BUDGET) -> dict:
+    timings = []
+    spent = 0.0
+    while len(timings) < repeat and (not timings or spent < budget):
+        if setup is not None:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        spent += elapsed
+    return {
+        'runs': len(timings),
+        'min': round(min(timings), 6),
+        'median': round(statistics.median(timings), 6),
+        'max': round(max(timings), 6),
+    }
+
+
+# ---------------- cases (run inside the isolated worker) --------------------
+def run_fixed_cases(repeat: int, budget: float) -> list[dict]:
+    # independent of the vault size
+    import _backend as b
+    results = []
+
+    stats = measure(lambda: b.hash_password(MASTER_PASSWORD, gen_salt=True), repeat=repeat, budget=budget)
+    results.append({'case': 'hash_password', 'size': None, 'ops': 1, **stats})
+
+    def generate():
+        for _ in range(PASSWORD_GENERATOR_CALLS):
+            b.generate_strong_password(24)
+    stats = measure(generate, repeat=repeat, budget=budget)
+    results.append({'case': 'generate_strong_password', 'size': None, 'ops': PASSWORD_GENERATOR_CALLS, **stats})
+    return results
+
+def run_size_cases(size: int, repeat: int, budget: float) -> list[dict]:
+    import _backend as b
+    from _search import SearchIndex
+    entries = synthetic_entries(size)
+    results = []
+
+    def case(name: str, func, setup=None, ops: int = size):
+        results.append({'case': name, 'size': size, 'ops': ops, **measure(func, setup, repeat, budget)})
+
+    encrypted = b.encrypt_dict(entries)
+    case('encrypt_dict', lambda: b.encrypt_dict(entries))
+    case('decrypt_dict', lambda: b.decrypt_dict(encrypted))
+    case('add_passwords_to_vault', lambda: b.add_passwords_to_vault(entries))
+
+    def drop_cache():
+        b._records_cache = None
+    case('get_passwords_from_vault', b.get_passwords_from_vault, setup=drop_cache)
+    case('get_entries_from_vault', b.get_entries_from_vault, setup=drop_cache)  # what the app loads, names only
+
+    store_dir = b.get_backup_store().directory
+    case('update_backup_files', b.update_backup_files, setup=lambda: shutil.rmtree(store_dir, ignore_errors=True))
+    case('update_backup_files (unchanged)', b.update_backup_files)
+
+    # what `update_listbox` does on every keystroke, after the index was built when the vault loaded
+    names = list(entries)
+    case('SearchIndex build', lambda: SearchIndex(names))
+    index = SearchIndex(names)
+    case('update_listbox search', lambda: [index.search(query) for query in SEARCH_QUERIES], ops=len(SEARCH_QUERIES))
+    return results
+
+def run_worker(size: int, repeat: int, budget: float) -> list[dict]:
+    import _backend as b
+    b.set_new_app_pass(MASTER_PASSWORD)
+    b.initiate_files()
+    b.unlock_session()
+    try:
+        if size == 0:
+            return run_fixed_cases(repeat, budget)
+        return run_size_cases(size, repeat, budget)
+    finally:
+        b.wait_for_compaction()
+        b.lock_session()
+
+
+# ---------------- driver --------------------
+def isolated_env(directory: Path) -> dict[str, str]:
+    env = dict(os.environ)
+    for name in ('XDG_CONFIG_HOME', 'XDG_DATA_HOME', 'TMPDIR'):
+        path = directory / name.lower()
+        path.mkdir()
+        env[name] = str(path)
+    env['PM_KEYRING_BACKEND'] = 'file'
+    env['PM_KEYRING_FILE'] = str(directory / 'keyring.json')
+    env.pop('PM_AGENT_SOCK', None)
+    return env
+
+def run_isolated(size: int, args) -> list[dict]:
+    directory = Path(tempfile.mkdtemp(prefix='pm-benchmark-'))
+    try:
+        command = [sys.executable, os.path.abspath(__file__), '--worker', str(size),
+                   '--repeat', str(args.repeat), '--budget', str(args.budget)]
+        done = subprocess.run(command, env=isolated_env(directory), cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.PIPE, check=True)
+        return json.loads(done.stdout)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def git_revision() -> str | None:
+    try:
+        done = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return done.stdout.strip()
+
+def compare(results: list[dict], baseline: dict, max_slowdown: float) -> list[dict]:
+    old = {(result['case'], result['size']): result for result in baseline['results']}
+    comparison = []
+    for result in results:
+        before = old.get((result['case'], result['size']))
+        if before is None or before['min'] <= 0:
+            continue
+        ratio = result['min'] / before['min']
+        comparison.append({
+            'case': result['case'],
+            'size': result['size'],
+            'baseline_min': before['min'],
+            'min': result['min'],
+            'ratio': round(ratio, 3),
+            'regression': ratio > 1 + max_slowdown,
+        })
+    return comparison
+
+def print_summary(report: dict) -> None:
+    ratios = {(row['case'], row['size']): row for row in report.get('comparison', [])}
+    for result in report['results']:
+        size = '-' if result['size'] is None else f"{result['size']:,}"
+        line = f"{result['case']:<34} {size:>10} {result['min'] * 1000:>12.3f} ms"
+        row = ratios.get((result['case'], result['size']))
+        if row is not None:
+            line += f"  x{row['ratio']:.2f}" + ('  REGRESSION' if row['regression'] else '')
+        print(line, file=sys.stderr)
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='benchmark', description="Time the password manager's backend hot paths.")
+    parser.add_argument('--sizes', type=lambda text: [int(size) for size in text.split(',')],
+                        help=f"comma separated vault sizes (default {','.join(map(str, SIZES))})")
+    parser.add_argument('--full', action='store_true', help="every size from 10 up to 1M entries")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="runs per case")
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET, help="seconds after which a case stops repeating")
+    parser.add_argument('--output', type=Path, help="write the JSON report here instead of stdout")
+    parser.add_argument('--baseline', type=Path, help="an earlier JSON report to compare against")
+    parser.add_argument('--max-slowdown', type=float, default=DEFAULT_MAX_SLOWDOWN,
+                        help="fraction a case may slow down before it counts as a regression")
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    return parser
+
+def main(argv: list[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.worker is not None:
+        json.dump(run_worker(args.worker, args.repeat, args.budget), sys.stdout)
+        return 0
+
+    sizes = args.sizes or (FULL_SIZES if args.full else SIZES)
+    results = run_isolated(0, args)
+    for size in sizes:
+        print(f"benchmarking {size:,} entries...", file=sys.stderr)
+        results.extend(run_isolated(size, args))
+
+    report = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'sizes': list(sizes),
+            'repeat': args.repeat,
+            'budget': args.budget,
+        },
+        'results': results,
+    }
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            report['comparison'] = compare(results, json.load(f), args.max_slowdown)
+
+    print_summary(report)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        sys.stdout.write('\n')
+
+    regressions = [row for row in report.get('comparison', []) if row['regression']]
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
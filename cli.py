@@ -0,0 +1,748 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import _backend as b
+import _metrics
+
+
+# ---------------- headless command line interface --------------------
+# Scripted access to the vault without tkinter:
+#
+#   python -m cli get github               python -m cli list --json
+#   python -m cli set github < secret.txt  python -m cli search git --limit 5
+#   python -m cli delete github            python -m cli generate --length 24 --count 10
+#   python -m cli import chrome.csv        python -m cli export backup.jsonl
+#   python -m cli rotate start --match 'svc-*' --older-than 90, then rotate confirm / rollback
+#   python -m cli key rotate               python -m cli key status
+#   python -m cli check < candidates.txt   python -m cli audit --corpus pwned-passwords-sha1.txt
+#   python -m cli audit --min-length 16 --save   (also reports reused and similar passwords)
+#   python -m cli profile create staging   python -m cli --profile staging get db
+#   python -m cli set github --username alice --url github.com --tags work,code < secret.txt
+#   python -m cli edit github --notes '2FA on the phone'   python -m cli show github
+#   python -m cli get github --field username              python -m cli list --tag work --host github.com
+#   python -m cli search 'git tag:work'
+#
+# The master password is read from `PM_MASTER_PASSWORD`, from stdin with `--password-stdin`,
+# or prompted for on a terminal. `--profile` (or `PM_PROFILE`) picks the vault, every profile has
+# its own master password. `--json` switches output to one JSON object per line.
+#
+# `python -m cli agent start` unlocks once and keeps an agent running in the background (see
+# `_agent.py`); while it is up `get`, `list` and `search` ask it instead of unlocking themselves.
+# `--metrics report.json` writes the backend's timings and counters (see `_metrics.py`) on exit.
+PASSWORD_ENV = 'PM_MASTER_PASSWORD'
+PROFILE_ENV = 'PM_PROFILE'
+
+EXIT_OK = 0
+EXIT_NOT_FOUND = 1
+EXIT_USAGE = 2
+EXIT_AUTH = 3
+
+
+class CliError(Exception):
+    def __init__(self, message: str, code: int):
+        super().__init__(message)
+        self.code = code
+
+
+def emit(args, obj: dict, plain: str) -> None:
+    sys.stdout.write((json.dumps(obj) if args.json else plain) + '\n')
+
+def read_master_password(args) -> str:
+    if args.password_stdin:
+        return sys.stdin.readline().rstrip('\n')
+    if os.getenv(PASSWORD_ENV):
+        return os.environ[PASSWORD_ENV]
+    if sys.stdin.isatty():
+        import getpass
+        return getpass.getpass('Master password: ')
+    raise CliError(f"no master password, set {PASSWORD_ENV} or pass --password-stdin", EXIT_AUTH)
+
+def unlock(args) -> None:
+    if not b.app_pass_exists():
+        raise CliError("no master password set yet, start the app once to create one", EXIT_AUTH)
+    try:
+        is_correct = b.app_pass_is_correct(read_master_password(args))
+    except ValueError as exc:
+        raise CliError(str(exc), EXIT_AUTH)
+    if not is_correct:
+        raise CliError("wrong master password", EXIT_AUTH)
+    b.initiate_files()
+    b.unlock_session()
+
+def get_agent(args):
+    # a connected client when an agent is listening, None otherwise
+    from _agent import AgentClient, agent_is_supported
+    if args.no_agent or not agent_is_supported():
+        return None
+    client = AgentClient()
+    try:
+        client.connect()
+    except OSError:
+        return None
+    return client
+
+def agent_request_many(client, requests: list[dict]) -> list[dict]:
+    # an agent that died or hangs mid-way is an error message, not a traceback
+    from _agent import AgentError
+    try:
+        return client.request_many(requests)
+    except (OSError, AgentError, ValueError) as exc:
+        raise CliError(f"agent: {exc or type(exc).__name__}", EXIT_USAGE)
+
+def agent_request(client, request: dict) -> dict:
+    response = agent_request_many(client, [request])[0]
+    if not response['ok']:
+        raise CliError(f"agent: {response['error']}", EXIT_USAGE)
+    return response
+
+def field_changes(args) -> dict[str, str]:
+    return {field: getattr(args, field) for field in b.ENTRY_FIELDS if getattr(args, field) is not None}
+
+def list_filters(args) -> list[tuple[str, str]]:
+    return [('tag', tag) for tag in args.tag] + [('host', host) for host in args.host] + [('user', user) for user in args.user]
+
+def entry_index(entries: dict):
+    from _search import SearchIndex
+    return SearchIndex(entries, {name: entry.terms for name, entry in entries.items()})
+
+def query_terms(filters: list[tuple[str, str]]) -> list[bytes]:
+    try:
+        return b.query_terms(filters)
+    except ValueError as exc:
+        raise CliError(str(exc), EXIT_USAGE)
+
+def read_names(args) -> list[str]:
+    # `-` reads one name per line from stdin, for pipelines doing many lookups in one process
+    if args.names == ['-']:
+        return [line.rstrip('\n') for line in sys.stdin if line.strip()]
+    return args.names
+
+
+# ---------------- commands --------------------
+def cmd_get(args) -> int:
+    names = read_names(args)
+    client = get_agent(args)
+    if client is not None:
+        # pipelined, one round trip for all the names
+        with client:
+            responses = agent_request_many(client, [{'op': 'get', 'name': name, 'field': args.field} for name in names])
+        values = [response.get('value') for response in responses]
+    else:
+        unlock(args)
+        values = [b.get_password_from_vault(name, args.field) for name in names]
+
+    code = EXIT_OK
+    for name, value in zip(names, values):
+        if value is None:
+            code = EXIT_NOT_FOUND
+            if args.json:
+                emit(args, {'name': name, 'found': False}, '')
+            else:
+                print(f"not found: {name}", file=sys.stderr)
+        else:
+            emit(args, {'name': name, 'found': True, 'value': value}, value)
+    return code
+
+def cmd_set(args) -> int:
+    unlock(args)
+    value = args.value
+    if value is None:
+        value = sys.stdin.readline().rstrip('\n')
+    if not value:
+        raise CliError("empty value", EXIT_USAGE)
+    if b.vault_has_name(args.name) and not args.force:
+        raise CliError(f"{args.name} already exists, pass --force to overwrite it", EXIT_USAGE)
+    b.set_entry_in_vault(args.name, value, field_changes(args))
+    emit(args, {'name': args.name, 'saved': True}, args.name)
+    return EXIT_OK
+
+def cmd_edit(args) -> int:
+    changes = field_changes(args)
+    if not changes:
+        raise CliError("nothing to change, pass --username, --url, --notes or --tags", EXIT_USAGE)
+    unlock(args)
+    if not b.vault_has_name(args.name):
+        raise CliError(f"not found: {args.name}", EXIT_NOT_FOUND)
+    b.set_entry_in_vault(args.name, fields=changes)
+    emit(args, {'name': args.name, 'saved': True}, args.name)
+    return EXIT_OK
+
+def cmd_show(args) -> int:
+    # the entry's fields, the value only when asked for; nothing else is decrypted
+    unlock(args)
+    entry = b.get_entry_from_vault(args.name)
+    if entry is None:
+        raise CliError(f"not found: {args.name}", EXIT_NOT_FOUND)
+    fields = (('value',) if args.value else ()) + b.ENTRY_FIELDS
+    texts = {field: entry.get(field) for field in fields}
+    emit(args, {'name': args.name, **texts}, '\n'.join(f"{field}: {text}" for field, text in texts.items() if text))
+    return EXIT_OK
+
+def cmd_delete(args) -> int:
+    unlock(args)
+    if not b.vault_has_name(args.name):
+        raise CliError(f"not found: {args.name}", EXIT_NOT_FOUND)
+    b.delete_password_from_vault(args.name)
+    emit(args, {'name': args.name, 'deleted': True}, args.name)
+    return EXIT_OK
+
+def cmd_list(args) -> int:
+    filters = list_filters(args)
+    client = get_agent(args)
+    if client is not None:
+        with client:
+            names = agent_request(client, {'op': 'list', 'filters': filters})['names']
+    else:
+        unlock(args)
+        entries = b.get_entries_from_vault()
+        if filters:
+            names = entry_index(entries).search('', terms=query_terms(filters))
+        else:
+            names = sorted(entries, key=str.lower)
+    for name in names:
+        emit(args, {'name': name}, name)
+    return EXIT_OK
+
+def cmd_search(args) -> int:
+    client = get_agent(args)
+    if client is not None and not args.exact:
+        with client:
+            names = agent_request(client, {'op': 'search', 'query': args.query, 'limit': args.limit})['names']
+    else:
+        from _search import parse_query
+        if client is not None:
+            client.close()
+        unlock(args)
+        query, filters = parse_query(args.query)
+        terms = query_terms(filters) if filters else None
+        names = entry_index(b.get_entries_from_vault()).search(query, fuzzy=not args.exact, limit=args.limit, terms=terms)
+    for name in names:
+        emit(args, {'name': name}, name)
+    return EXIT_OK
+
+def generation_policy(args) -> dict:
+    from _passgen import AMBIGUOUS_CHARACTERS, CHARACTER_CLASSES
+    if args.passphrase:
+        return {'mode': 'passphrase', 'words': args.words, 'separator': args.separator,
+                'capitalize': args.capitalize, 'word_list': args.word_list}
+    classes = {name: getattr(args, f'min_{name}') for name in CHARACTER_CLASSES if not getattr(args, f'no_{name}')}
+    exclude = args.exclude + (AMBIGUOUS_CHARACTERS if args.no_ambiguous else '')
+    return {'length': args.length, 'classes': classes, 'exclude': exclude}
+
+def cmd_generate(args) -> int:
+    from _passgen import PolicyError, get_generator
+    try:
+        generator = get_generator(generation_policy(args))
+        passwords = generator.generate(args.count)
+    except (PolicyError, OSError) as exc:
+        raise CliError(str(exc), EXIT_USAGE)
+    if args.entropy:
+        print(f"{generator.entropy:.1f} bits of entropy per password", file=sys.stderr)
+    for password in passwords:
+        emit(args, {'password': password, 'entropy': round(generator.entropy, 1)}, password)
+    return EXIT_OK
+
+def cmd_rotate(args) -> int:
+    import _rotation
+    if args.action == 'start' and not args.dry_run and args.match is None and args.older_than is None and not args.all:
+        # one typo away from replacing every password in the vault
+        raise CliError("rotate start needs --match, --older-than or --all", EXIT_USAGE)
+    try:
+        if args.action == 'status':
+            pending = _rotation.pending_rotation()
+            if pending is None:
+                emit(args, {'pending': None}, "no rotation pending")
+                return EXIT_NOT_FOUND
+            created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(pending['created']))
+            emit(args, {'pending': pending}, f"{pending['count']} entries rotated on {created}, waiting to be confirmed")
+            return EXIT_OK
+
+        if args.action == 'confirm':
+            count = _rotation.confirm()
+            emit(args, {'confirmed': count}, f"confirmed, the previous values of {count} entries are gone")
+            return EXIT_OK
+
+        unlock(args)
+        if args.action == 'rollback':
+            stats = _rotation.rollback(args.names or None)
+            emit(args, stats, f"restored {stats['restored']}, kept {stats['kept']} edited since")
+            return EXIT_OK
+
+        if args.action == 'previous':
+            code = EXIT_OK
+            for name in args.names:
+                value = _rotation.previous_password(name)
+                if value is None:
+                    print(f"error: {name!r} has no previous value", file=sys.stderr)
+                    code = EXIT_NOT_FOUND
+                else:
+                    emit(args, {'name': name, 'value': value}, value)
+            return code
+
+        older_than = None if args.older_than is None else args.older_than * 86400
+        if args.dry_run:
+            names = _rotation.preview(args.match, older_than)
+            for name in names:
+                emit(args, {'name': name}, name)
+            return EXIT_OK if names else EXIT_NOT_FOUND
+
+        from _passgen import PolicyError
+        try:
+            rotated = _rotation.rotate(args.match, older_than, generation_policy(args))
+        except PolicyError as exc:
+            raise CliError(str(exc), EXIT_USAGE)
+    except _rotation.RotationError as exc:
+        raise CliError(str(exc), EXIT_USAGE)
+
+    for name, value in rotated.items():
+        emit(args, {'name': name, 'value': value}, f"{name}\t{value}")
+    if not rotated:
+        print("nothing matched", file=sys.stderr)
+        return EXIT_NOT_FOUND
+    print(f"rotated {len(rotated)} entries, run 'rotate confirm' once they are in use", file=sys.stderr)
+    return EXIT_OK
+
+def cmd_key(args) -> int:
+    import _rekey
+    if args.action == 'status':
+        status = _rekey.status()
+        if not status['pending']:
+            emit(args, status, "one data key, nothing to re-encrypt")
+        else:
+            emit(args, status, f"{status['keys']} data keys, {status['reencrypted']} entries re-encrypted so far")
+        return EXIT_OK
+
+    unlock(args)
+    if args.action == 'rotate':
+        if _rekey.status()['pending'] and not args.force:
+            raise CliError("a key rotation is still running, 'key resume' finishes it (or --force for another key)", EXIT_USAGE)
+        _rekey.start()
+        if args.lazy:
+            emit(args, _rekey.status(), "new data key in use, entries are re-encrypted as they are read")
+            return EXIT_OK
+
+    progress = report_progress(args)
+    try:
+        status = _rekey.run(progress=None if progress is None else (
+            lambda status: progress({'re-encrypted': status['reencrypted']})))
+    finally:
+        if progress is not None:
+            print(file=sys.stderr)
+    emit(args, status, "every entry is under the new data key, the old ones are gone")
+    return EXIT_OK
+
+def cmd_profile(args) -> int:
+    if args.action == 'list':
+        current = b.get_profile()
+        for name in b.list_profiles():
+            emit(args, {'profile': name, 'current': name == current}, ('* ' if name == current else '  ') + name)
+        return EXIT_OK
+
+    if args.name is None:
+        raise CliError(f"profile {args.action} needs a NAME", EXIT_USAGE)
+    previous = b.get_profile()
+    try:
+        if args.action == 'create':
+            # the new profile's master password is read like any other
+            b.check_profile_name(args.name)
+            if b.profile_exists(args.name):
+                raise CliError(f"profile {args.name!r} already exists", EXIT_USAGE)
+            password = read_master_password(args)
+            problem = b.app_pass_problem(password)
+            if problem is not None:
+                raise CliError(problem, EXIT_USAGE)
+            b.create_profile(args.name)
+            b.use_profile(args.name)
+            b.set_new_app_pass(password)
+            b.initiate_files()
+            emit(args, {'profile': args.name}, f"created profile {args.name}")
+        else:
+            # deleting takes the profile's own master password
+            if args.name == previous:
+                raise CliError("the current profile can't be deleted, pass another --profile", EXIT_USAGE)
+            b.use_profile(args.name)
+            unlock(args)
+            b.use_profile(previous)
+            b.delete_profile(args.name)
+            emit(args, {'profile': args.name}, f"deleted profile {args.name}")
+    except ValueError as exc:
+        raise CliError(str(exc), EXIT_USAGE)
+    finally:
+        b.use_profile(previous)
+    return EXIT_OK
+
+def get_corpus(args):
+    # `--corpus` for this run, otherwise the one in the settings; None without either
+    from _breach import CorpusError, HashCorpus
+    try:
+        return HashCorpus(args.corpus) if args.corpus else b.get_breach_corpus()
+    except (OSError, CorpusError) as exc:
+        raise CliError(str(exc), EXIT_USAGE)
+
+def describe_check(check: dict) -> str:
+    text = f"{check['label']} ({check['bits']:.0f} bits)"
+    if check['breached']:
+        text += f", seen {check['breached']:,} times in breaches"
+    return text + ''.join(f", {warning}" for warning in check['warnings'])
+
+def cmd_check(args) -> int:
+    # no unlock needed, nothing is read from the vault; exit code 1 if any password is breached or weak
+    from _breach import estimate_strength
+    if sys.stdin.isatty():
+        import getpass
+        passwords = [getpass.getpass('Password to check: ')]
+    else:
+        passwords = [line.rstrip('\n') for line in sys.stdin if line.strip()]
+    corpus = get_corpus(args)
+    counts = corpus.counts(passwords) if corpus is not None else [None] * len(passwords)
+
+    code = EXIT_OK
+    for password, breached in zip(passwords, counts):
+        check = {**estimate_strength(password), 'breached': breached}
+        emit(args, check, describe_check(check))
+        if breached or check['score'] < args.min_score:
+            code = EXIT_NOT_FOUND
+    return code
+
+def cmd_audit(args) -> int:
+    # one line per entry with a problem, then the groups of reused and similar passwords
+    from _audit import PolicyError, audit, describe
+    unlock(args)
+    overrides = {'min_length': args.min_length, 'min_score': args.min_score, 'min_classes': args.min_classes,
+                 'name': False if args.no_name_check else None}
+    policy = {**b.get_audit_policy(), **{k: v for k, v in overrides.items() if v is not None}}
+    try:
+        if args.save:
+            b.set_audit_policy(policy)
+        corpus = get_corpus(args)
+        progress = report_progress(args)
+        try:
+            report = audit(b.iter_vault_entries(), corpus, policy, progress)
+        finally:
+            if progress is not None:
+                print(file=sys.stderr)
+    except PolicyError as exc:
+        raise CliError(str(exc), EXIT_USAGE)
+
+    for finding in report['findings']:
+        emit(args, finding, f"{finding['name']}\t{describe(finding)}")
+    for kind in ('reused', 'similar'):
+        for group in report[kind]:
+            emit(args, {'group': kind, 'names': group}, f"{kind}\t{', '.join(group)}")
+    if corpus is None:
+        print("no breach corpus set up, nothing was looked up ('corpus set FILE')", file=sys.stderr)
+    print(f"{len(report['findings'])} of {report['checked']} entries have problems; "
+          f"groups: {len(report['reused'])} reused, {len(report['similar'])} similar", file=sys.stderr)
+    return EXIT_NOT_FOUND if report['findings'] else EXIT_OK
+
+def cmd_corpus(args) -> int:
+    from _breach import BLOOM_SUFFIX, CorpusError, build_bloom
+    if args.action == 'set':
+        if args.file is None:
+            raise CliError("corpus set needs a FILE, or 'none' to forget it", EXIT_USAGE)
+        try:
+            b.set_breach_corpus(None if args.file == 'none' else args.file)
+        except (OSError, CorpusError) as exc:
+            raise CliError(str(exc), EXIT_USAGE)
+
+    corpus = get_corpus(args)
+    if corpus is None:
+        emit(args, {'corpus': None}, "no breach corpus set up")
+        return EXIT_NOT_FOUND
+
+    if args.action == 'bloom':
+        progress = report_progress(args)
+        try:
+            build_bloom(corpus.file_path, progress)
+        finally:
+            if progress is not None:
+                print(file=sys.stderr)
+
+    bloom_path = corpus.file_path.with_name(corpus.file_path.name + BLOOM_SUFFIX)
+    info = {'corpus': str(corpus.file_path), 'kind': corpus.kind, 'size': corpus.size, 'bloom': bloom_path.is_file()}
+    emit(args, info, f"{info['corpus']}\t{info['kind']}\t{info['size']:,} bytes" + ('\twith bloom filter' if info['bloom'] else ''))
+    return EXIT_OK
+
+def report_progress(args):
+    # a running count on stderr for interactive imports / exports, nothing when scripted
+    if args.json or not sys.stderr.isatty():
+        return None
+    return lambda stats: print('\r' + ', '.join(f'{k} {v}' for k, v in stats.items()), end='', file=sys.stderr)
+
+def cmd_import(args) -> int:
+    from _transfer import TransferError, import_file
+    unlock(args)
+    progress = report_progress(args)
+    try:
+        stats = import_file(args.file, args.format, overwrite=args.overwrite, progress=progress)
+    except (OSError, TransferError) as exc:
+        raise CliError(str(exc), EXIT_USAGE)
+    finally:
+        if progress is not None:
+            print(file=sys.stderr)
+    emit(args, stats, ', '.join(f'{k} {v}' for k, v in stats.items()))
+    return EXIT_OK
+
+def cmd_export(args) -> int:
+    from _transfer import TransferError, export_file
+    unlock(args)
+    progress = report_progress(args)
+    try:
+        exported = export_file(args.file, args.format, progress=progress)
+    except (OSError, TransferError) as exc:
+        raise CliError(str(exc), EXIT_USAGE)
+    finally:
+        if progress is not None:
+            print(file=sys.stderr)
+    emit(args, {'file': args.file, 'exported': exported}, f"exported {exported}")
+    return EXIT_OK
+
+def cmd_backup(args) -> int:
+    # no unlock needed, backups only ever hold encrypted data
+    store = b.get_backup_store()
+    if args.action == 'create':
+        generation = b.update_backup_files()
+        emit(args, {'generation': generation}, "nothing changed" if generation is None else f"generation {generation}")
+        return EXIT_OK
+
+    if args.action == 'verify':
+        problems = store.verify()
+        for problem in problems:
+            emit(args, {'problem': problem}, problem)
+        return EXIT_NOT_FOUND if problems else EXIT_OK
+
+    for generation in store.generations():
+        manifest = store.read_manifest(generation)
+        size = sum(entry['size'] for entry in manifest['files'].values())
+        created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(manifest['created']))
+        emit(args, {'generation': generation, 'created': manifest['created'], 'size': size},
+             f"{generation}\t{created}\t{size} bytes")
+    return EXIT_OK
+
+def cmd_agent(args) -> int:
+    from _agent import Agent, AgentClient, AgentError, SOCKET_ENV, agent_is_supported
+    if not agent_is_supported():
+        raise CliError("the agent needs Unix domain sockets", EXIT_USAGE)
+
+    if args.action == 'status':
+        client = AgentClient()
+        try:
+            with client:
+                response = client.request({'op': 'ping'})
+        except (OSError, AgentError, ValueError):
+            raise CliError(f"no agent listening on {client.socket_path}", EXIT_NOT_FOUND)
+        emit(args, {'socket': str(client.socket_path), 'expires_in': response['expires_in']},
+             f"{client.socket_path} (locks in {response['expires_in']}s)")
+        return EXIT_OK
+
+    if args.action == 'stop':
+        client = AgentClient()
+        try:
+            with client:
+                client.request({'op': 'stop'})
+        except (OSError, AgentError, ValueError):
+            raise CliError(f"no agent listening on {client.socket_path}", EXIT_NOT_FOUND)
+        return EXIT_OK
+
+    if AgentClient().is_alive():
+        raise CliError(f"an agent is already listening on {AgentClient().socket_path}", EXIT_USAGE)
+    unlock(args)
+    agent = Agent(ttl=args.ttl)
+    try:
+        agent.bind()
+    except AgentError as exc:
+        raise CliError(str(exc), EXIT_USAGE)
+
+    # shell syntax like ssh-agent, so `eval "$(python -m cli agent start)"` works
+    emit(args, {'socket': str(agent.socket_path), 'ttl': args.ttl},
+         f"{SOCKET_ENV}={agent.socket_path}; export {SOCKET_ENV};")
+    sys.stdout.flush()
+    if args.foreground:
+        agent.serve()
+        return EXIT_OK
+
+    if os.fork() > 0:
+        agent.server.server_close()
+        return EXIT_OK
+    # child: detach from the terminal and serve until the TTL runs out or `agent stop`
+    os.setsid()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    try:
+        agent.serve()
+    finally:
+        os._exit(0)
+
+
+def add_policy_arguments(p: argparse.ArgumentParser, length: int) -> None:
+    from _passgen import CHARACTER_CLASSES, CLASS_LABELS, DEFAULT_PASSPHRASE_POLICY, DEFAULT_POLICY
+    p.add_argument('--length', type=int, default=length)
+    for name in CHARACTER_CLASSES:
+        p.add_argument(f'--no-{name}', action='store_true', help=f"leave out {CLASS_LABELS[name]}")
+        p.add_argument(f'--min-{name}', type=int, default=DEFAULT_POLICY['classes'][name], metavar='N',
+                       help=f"at least N {CLASS_LABELS[name]} (default %(default)s)")
+    p.add_argument('--exclude', default='', metavar='CHARS', help="characters never to use")
+    p.add_argument('--no-ambiguous', action='store_true', help="leave out look-alikes such as I, l, 1, O and 0")
+    p.add_argument('--passphrase', action='store_true', help="words from a word list instead of characters")
+    p.add_argument('--words', type=int, default=DEFAULT_PASSPHRASE_POLICY['words'])
+    p.add_argument('--separator', default=DEFAULT_PASSPHRASE_POLICY['separator'])
+    p.add_argument('--capitalize', action='store_true')
+    p.add_argument('--word-list', metavar='FILE', help="whitespace separated words, the bundled list by default")
+
+def add_field_arguments(p: argparse.ArgumentParser) -> None:
+    p.add_argument('--username')
+    p.add_argument('--url')
+    p.add_argument('--notes')
+    p.add_argument('--tags', help="comma separated; '' clears them, like '' does for the other fields")
+
+def build_parser() -> argparse.ArgumentParser:
+    from _agent import DEFAULT_TTL
+    from _passgen import DEFAULT_POLICY
+    from _rotation import DEFAULT_POLICY as ROTATION_POLICY
+    parser = argparse.ArgumentParser(prog='python -m cli', description="Password manager command line")
+    parser.add_argument('--json', action='store_true', help="one JSON object per output line")
+    parser.add_argument('--password-stdin', action='store_true', help="read the master password from the first stdin line")
+    parser.add_argument('--profile', default=os.getenv(PROFILE_ENV, b.DEFAULT_PROFILE),
+                        help=f"the profile whose vault to use (default: ${PROFILE_ENV} or {b.DEFAULT_PROFILE})")
+    parser.add_argument('--no-agent', action='store_true', help="unlock in this process even when an agent is running")
+    parser.add_argument('--metrics', metavar='FILE', help="record timings and counters, write them to FILE as JSON on exit")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('get', help="print the value of one or more entries")
+    p.add_argument('names', nargs='+', help="entry names, or - to read them from stdin")
+    p.add_argument('--field', default='value', choices=('value',) + b.ENTRY_FIELDS, help="print this field instead")
+    p.set_defaults(func=cmd_get)
+
+    p = commands.add_parser('set', help="add or overwrite an entry")
+    p.add_argument('name')
+    p.add_argument('--value', help="the value, read from stdin when left out")
+    p.add_argument('--force', action='store_true', help="overwrite an existing entry (fields not given are kept)")
+    add_field_arguments(p)
+    p.set_defaults(func=cmd_set)
+
+    p = commands.add_parser('edit', help="change the username, URL, notes or tags of an entry")
+    p.add_argument('name')
+    add_field_arguments(p)
+    p.set_defaults(func=cmd_edit)
+
+    p = commands.add_parser('show', help="print the username, URL, notes and tags of an entry")
+    p.add_argument('name')
+    p.add_argument('--value', action='store_true', help="print the value too")
+    p.set_defaults(func=cmd_show)
+
+    p = commands.add_parser('delete', help="delete an entry")
+    p.add_argument('name')
+    p.set_defaults(func=cmd_delete)
+
+    p = commands.add_parser('list', help="print all entry names")
+    p.add_argument('--tag', action='append', default=[], help="only entries with this tag (repeatable)")
+    p.add_argument('--host', action='append', default=[], help="only entries whose URL is on this host or domain")
+    p.add_argument('--user', action='append', default=[], help="only entries with this username")
+    p.set_defaults(func=cmd_list)
+
+    p = commands.add_parser('search', help="print entry names matching a query")
+    p.add_argument('query', help="text to look for in the names, plus tag:, host: and user: filters")
+    p.add_argument('--limit', type=int)
+    p.add_argument('--exact', action='store_true', help="no typo tolerant matches")
+    p.set_defaults(func=cmd_search)
+
+    p = commands.add_parser('generate', help="print strong random passwords or passphrases")
+    p.add_argument('--count', type=int, default=1)
+    add_policy_arguments(p, DEFAULT_POLICY['length'])
+    p.add_argument('--entropy', action='store_true', help="print the entropy per password to stderr")
+    p.set_defaults(func=cmd_generate)
+
+    p = commands.add_parser('import', help="add entries from a CSV or JSON Lines dump")
+    p.add_argument('file')
+    p.add_argument('--format', choices=['csv', 'jsonl'], help="taken from the file extension when left out")
+    p.add_argument('--overwrite', action='store_true', help="replace entries that already exist")
+    p.set_defaults(func=cmd_import)
+
+    p = commands.add_parser('export', help="write all entries, in plaintext, to a CSV or JSON Lines file")
+    p.add_argument('file')
+    p.add_argument('--format', choices=['csv', 'jsonl'], help="taken from the file extension when left out")
+    p.set_defaults(func=cmd_export)
+
+    p = commands.add_parser('backup', help="create, list or verify versioned backups")
+    p.add_argument('action', choices=['create', 'list', 'verify'])
+    p.set_defaults(func=cmd_backup)
+
+    p = commands.add_parser('agent', help="keep the vault unlocked in a background agent")
+    p.add_argument('action', choices=['start', 'stop', 'status'])
+    p.add_argument('--ttl', type=int, default=DEFAULT_TTL, help="seconds until the agent locks and exits")
+    p.add_argument('--foreground', action='store_true', help="serve in this process instead of forking")
+    p.set_defaults(func=cmd_agent)
+
+    p = commands.add_parser('check', help="rate passwords read from stdin and look them up in the breach corpus")
+    p.add_argument('--corpus', metavar='FILE', help="a sorted SHA-1 or NTLM hash list, instead of the one set up")
+    p.add_argument('--min-score', type=int, default=b.MIN_APP_PASS_SCORE, choices=range(5),
+                   help="scores below this count as weak (0-4)")
+    p.set_defaults(func=cmd_check)
+
+    p = commands.add_parser('audit', help="list breached, weak, reused and similar passwords and policy violations")
+    p.add_argument('--corpus', metavar='FILE', help="a sorted SHA-1 or NTLM hash list, instead of the one set up")
+    p.add_argument('--min-score', type=int, choices=range(5), help="scores below this count as weak (0-4)")
+    p.add_argument('--min-length', type=int, help="values shorter than this violate the policy")
+    p.add_argument('--min-classes', type=int, choices=range(1, 5),
+                   help="kinds of characters (lower, upper, digits, symbols) a value needs")
+    p.add_argument('--no-name-check', action='store_true', help="allow values that contain their entry's name")
+    p.add_argument('--save', action='store_true', help="keep these policy settings for later audits and the app")
+    p.set_defaults(func=cmd_audit)
+
+    p = commands.add_parser('corpus', help="set up the breach corpus used by check, audit and the app")
+    p.add_argument('action', choices=['show', 'set', 'bloom'])
+    p.add_argument('file', nargs='?', help="for set: the hash list, 'none' to forget it")
+    p.set_defaults(func=cmd_corpus, corpus=None)
+
+    p = commands.add_parser('key', help="rotate the key the vault is encrypted with")
+    p.add_argument('action', choices=['rotate', 'resume', 'status'])
+    p.add_argument('--lazy', action='store_true',
+                   help="only start using the new key, entries are re-encrypted as they are read or by 'key resume'")
+    p.add_argument('--force', action='store_true', help="rotate again while a rotation is still running")
+    p.set_defaults(func=cmd_key)
+
+    p = commands.add_parser('profile', help="list, create or delete profiles, each a vault of its own")
+    p.add_argument('action', choices=['list', 'create', 'delete'])
+    p.add_argument('name', nargs='?')
+    p.set_defaults(func=cmd_profile)
+
+    p = commands.add_parser('rotate', help="give many entries new generated values in one atomic write")
+    p.add_argument('action', choices=['start', 'status', 'confirm', 'rollback', 'previous'])
+    p.add_argument('names', nargs='*', help="for rollback (all by default) and previous")
+    p.add_argument('--match', metavar='PATTERN', help="only names matching this glob, e.g. 'svc-*'")
+    p.add_argument('--older-than', type=float, metavar='DAYS', help="only values set at least DAYS ago")
+    p.add_argument('--all', action='store_true', help="every entry, when neither --match nor --older-than is given")
+    p.add_argument('--dry-run', action='store_true', help="list what would be rotated")
+    add_policy_arguments(p, ROTATION_POLICY['length'])
+    p.set_defaults(func=cmd_rotate)
+
+    return parser
+
+def main(argv: list[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        _metrics.enable()
+    try:
+        try:
+            b.use_profile(args.profile)
+        except ValueError as exc:
+            raise CliError(str(exc), EXIT_USAGE)
+        return args.func(args)
+    except CliError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return exc.code
+    finally:
+        # write out coalesced edits and let a compaction they started finish before the process goes away
+        b.flush_writes(sync=True)
+        b.wait_for_compaction()
+        b.lock_session()
+        if args.metrics:
+            _metrics.write_report(args.metrics)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,29 @@
+import pytest
+
+import _backend as b
+import _credentials
+
+
+@pytest.fixture
+def vault(tmp_path, monkeypatch):
+    # a fresh, unlocked vault of the default profile in `tmp_path`, on the file keyring
+    for name in ('XDG_DATA_HOME', 'XDG_CONFIG_HOME', 'TMPDIR'):
+        (tmp_path / name).mkdir()
+        monkeypatch.setenv(name, str(tmp_path / name))
+    monkeypatch.setenv(_credentials.BACKEND_ENV, 'file')
+    monkeypatch.setenv(_credentials.FILE_ENV, str(tmp_path / _credentials.FILE_KEYRING_NAME))
+    monkeypatch.delenv(b.BREACH_CORPUS_ENV, raising=False)
+    monkeypatch.setattr(_credentials, '_backend', None)
+    monkeypatch.setattr(b, '_profile', b.DEFAULT_PROFILE)
+    monkeypatch.setattr(b, '_durability', None)
+    b.restore_session(None)
+
+    assert b.set_new_app_pass('Xk9#mq2!vLp7-test')
+    b.initiate_files()
+    b.unlock_session()
+    yield b.get_vault_directory()
+
+    b.wait_for_compaction()
+    b.wait_for_backup()
+    b.lock_session()
+    b.restore_session(None)
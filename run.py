@@ -1,21 +1,122 @@
+import time
+startup_started = time.perf_counter()  # taken before the other imports, so `--measure-startup` counts them
+import json
+import os
+import sys
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
 import tkinter.font as tkFont
 import _backend as b
+import _metrics
+import _passgen
+from _worker import BackgroundTasks
+from _search import SearchIndex, parse_query
+from _widgets import VirtualListbox
 
 # ---------- DATA ----------
-passwords = {}
+entries = {}  # name -> `_backend.Entry`, fields are decrypted when they are shown
+search_index = SearchIndex()
+pending_searches = {}  # listbox -> `after` id of its debounced search
+pending_strength_checks = {}  # password entry -> `after` id of its debounced strength check
+stale_listboxes = set()  # listboxes on hidden tabs, refreshed when their tab is shown
+built_tabs = set()  # tabs whose widgets exist, the others are built when first selected
+load_task = None  # the vault load started by the last login, cancelled on logout
+session_generation = 0  # counts logouts, a vault load started before one must not unlock the session
+key_rotation_running = False  # re-encrypting under a new data key, a chunk at a time
 
 font_big = ("Arial", 14)
 font_medium = ("Arial", 12)
 font_small = ("Arial", 10)
 
+SEARCH_DEBOUNCE_MS = 150
+SEARCH_WINDOW = 200  # results ranked per search, the listbox asks for more when scrolled near the end
+MAX_AUDIT_LINES = 2_000  # the rest of a long report is only counted
+AUDIT_FILTERS = ('everything', 'breached', 'reused', 'similar', 'weak', 'policy')
+MEASURE_STARTUP = '--measure-startup' in sys.argv or os.getenv('PM_MEASURE_STARTUP') == '1'
+STRENGTH_COLORS = ('red', 'red', 'orange', 'green', 'green')  # by score, see `_breach.STRENGTH_LABELS`
+FIELD_LABELS = {'username': "Username", 'url': "URL", 'tags': "Tags", 'notes': "Notes"}  # in the order they are shown
+DURABILITY_LABELS = {
+    'always': "immediately",
+    'batched': "in batches",
+    'close': "on close",
+}
+
 # ---------- UTILITY FUNCTIONS ----------
-def update_listbox(lb, search_string = ''):
-    lb.delete(0, tk.END)
-    for key in passwords.keys():
-        if search_string in key:
-            lb.insert(tk.END, key)
+startup_marks = {}  # milliseconds since `startup_started`, only filled with `MEASURE_STARTUP`
+
+def mark_startup(name):
+    if MEASURE_STARTUP and name not in startup_marks:
+        startup_marks[name] = round((time.perf_counter() - startup_started) * 1000, 1)
+
+def finish_startup_measurement():
+    # prints the marks once the app is usable and warmed up, then quits
+    if 'ready' not in startup_marks or 'warm' not in startup_marks:
+        root.after(10, finish_startup_measurement)
+        return
+    print(json.dumps(startup_marks), file=sys.stderr)
+    root.destroy()
+
+def update_listbox(lb, search_string = '', keep_position = False):
+    # `tag:work host:github.com user:alice` in the search narrow it down, see `_search.parse_query`
+    stale_listboxes.discard(lb)
+    query, filters = parse_query(search_string)
+    terms = b.query_terms(filters) if filters else None
+
+    def fetch(count):
+        return search_index.search(query, terms=terms, limit=count)
+
+    # a refresh in place keeps as many rows as were loaded, so the scroll position is still there
+    count = max(SEARCH_WINDOW, lb.size()) if keep_position else SEARCH_WINDOW
+    items = fetch(count)
+    lb.set_items(items, keep_position=keep_position, more=fetch if len(items) == count else None)
+
+def entry_text(entry):
+    # what was typed into an entry with a placeholder, '' while the placeholder shows
+    return '' if getattr(entry, 'is_placeholder', False) else entry.get()
+
+def entry_terms(entry):
+    # the search index terms of an entry edited here, from its fields as they are now
+    return b.split_terms(b.field_terms({field: entry.get(field) for field in b.FILTER_FIELDS.values()}))
+
+def schedule_search(lb, search_var):
+    # search as the user types, but only once they pause for `SEARCH_DEBOUNCE_MS`
+    if lb in pending_searches:
+        root.after_cancel(pending_searches[lb])
+
+    def run_search():
+        pending_searches.pop(lb, None)
+        update_listbox(lb, search_var.get())
+
+    pending_searches[lb] = root.after(SEARCH_DEBOUNCE_MS, run_search)
+
+def built_listboxes():
+    # (listbox, search variable, tab) for the listbox tabs that exist so far
+    found = []
+    if tab1 in built_tabs:
+        found.append((listbox__view, search_var__view, tab1))
+    if tab3 in built_tabs:
+        found.append((listbox__update, search_var__update, tab3))
+    return found
+
+def refresh_listboxes():
+    # only the listbox on screen is redrawn now, the other one when its tab gets selected
+    for lb, search_var, tab in built_listboxes():
+        if notebook.select() == str(tab):
+            update_listbox(lb, search_var.get(), keep_position=True)
+        else:
+            stale_listboxes.add(lb)
+
+def build_tab(tab):
+    if tab not in built_tabs:
+        built_tabs.add(tab)
+        tab_builders[tab]()
+
+def on_tab_changed(event):
+    build_tab(notebook.nametowidget(notebook.select()))
+    for lb, search_var, tab in built_listboxes():
+        if lb in stale_listboxes and notebook.select() == str(tab):
+            update_listbox(lb, search_var.get(), keep_position=True)
 
 def add_placeholder(entry, placeholder):
     entry.insert(0, placeholder)
@@ -73,23 +174,76 @@ def add_show_hide_toggle(entry):
 
     toggle_btn.config(command=toggle)
 
+def add_strength_meter(entry, label):
+    # rates the value once the user pauses typing, the breach list lookup runs off the Tk thread
+    def check():
+        pending_strength_checks.pop(entry, None)
+        password = entry.get()
+        if entry.is_placeholder or not password:
+            label.config(text="")
+            return
+
+        def on_checked(result):
+            if entry.get() != password:
+                return  # typed on meanwhile, a newer check follows
+            if result['breached']:
+                label.config(text=f"Seen {result['breached']:,} times in data breaches", fg='red')
+                return
+            text = f"Strength: {result['label']}"
+            if result['warnings']:
+                text += f" ({result['warnings'][0]})"
+            label.config(text=text, fg=STRENGTH_COLORS[result['score']])
+
+        tasks.submit(b.check_password, password, on_done=on_checked,
+                     on_error=lambda exc: label.config(text=f"Can't check strength: {exc}", fg='grey'))
+
+    def schedule(event):
+        if entry in pending_strength_checks:
+            root.after_cancel(pending_strength_checks[entry])
+        pending_strength_checks[entry] = root.after(SEARCH_DEBOUNCE_MS, check)
+
+    entry.bind("<KeyRelease>", schedule, add='+')
+
+def set_busy(busy):
+    root.config(cursor="watch" if busy else "")
+    status_label.config(text="Working..." if busy else "")
+
+def show_task_error(exc):
+    messagebox.showerror("Error", f"Something went wrong: {exc}")
+
 def show_login_after_time():
+    global session_generation
+    if load_task is not None:
+        load_task.cancel()
+    # locking waits for the vault lock and fsyncs, so it goes to the writer behind any pending saves
+    session_generation += 1
+    tasks.submit(b.lock_session, write=True)
+    entries.clear()
+    search_index.clear()
     set_pass_frame.pack_forget()
     app_frame.pack_forget()
     login_frame.pack(fill=tk.BOTH, expand=True)
 
+def close_vault():
+    # the backup keeps running after the window is gone, python waits for it before exiting
+    b.flush_writes(sync=True)
+    b.wait_for_compaction()
+    b.start_backup()
+    b.lock_session()
+
 def before_app_close():
-    b.update_backup_files()
-    root.destroy()
+    # hide the window right away, the backup starts on the writer thread after any pending saves
+    root.withdraw()
+    tasks.submit(close_vault, write=True,
+                 on_done=lambda _: root.destroy(), on_error=lambda _: root.destroy())
 
 # ---------- APP LOGIC FUNCTIONS ----------
 def on_listbox_key_select__view(event):
     selection = listbox__view.curselection()
-    if selection:
-        key = listbox__view.get(selection[0])
-        password_var__view.set(passwords[key])
-    else:
-        password_var__view.set("")
+    entry = entries[listbox__view.get(selection[0])] if selection else None
+    password_var__view.set(entry.get() if entry else "")
+    for field, var in field_vars__view.items():
+        var.set(entry.get(field) if entry else "")
 
 def copy_selected_password__view():
     password = password_var__view.get()
@@ -105,17 +259,52 @@ def copy_generated_password__tools():
         root.clipboard_append(password)
         root.update()
 
+def get_policy__tools():
+    if mode_var__tools.get() == 'passphrase':
+        return {'mode': 'passphrase', 'words': password_length_var__tools.get()}
+    classes = {name: 1 for name, var in class_vars__tools.items() if var.get()}
+    exclude = _passgen.AMBIGUOUS_CHARACTERS if no_ambiguous_var__tools.get() else ''
+    return {'length': password_length_var__tools.get(), 'classes': classes, 'exclude': exclude}
+
+def update_entropy__tools(*_):
+    try:
+        entropy = _passgen.policy_entropy(get_policy__tools())
+    except _passgen.PolicyError as exc:
+        entropy_label__tools.config(text=str(exc), fg='red')
+        return
+    entropy_label__tools.config(text=f"Entropy: {entropy:.0f} bits", fg='grey')
+
+def generate_password__tools():
+    try:
+        password = _passgen.generate_passwords(1, get_policy__tools())[0]
+    except _passgen.PolicyError as exc:
+        entropy_label__tools.config(text=str(exc), fg='red')
+        return
+    generated_pass_var__tools.set(password)
+
+def set_mode__tools(mode):
+    # the slider picks the number of words for passphrases
+    if mode == 'passphrase':
+        password_length_scale__tools.config(label="Words", from_=3, to=12)
+        password_length_var__tools.set(_passgen.DEFAULT_PASSPHRASE_POLICY['words'])
+    else:
+        password_length_scale__tools.config(label="Password Length", from_=8, to=32)
+        password_length_var__tools.set(_passgen.DEFAULT_POLICY['length'])
+    for checkbutton in class_checkbuttons__tools:
+        checkbutton.config(state=tk.DISABLED if mode == 'passphrase' else tk.NORMAL)
+    update_entropy__tools()
+
 def on_listbox_key_select__update(event):
     selection = listbox__update.curselection()
-    if selection:
-        key = listbox__update.get(selection[0])
-        current_password_label__update.config(text=f"Current Password: {passwords[key]}")
-    else:
-        current_password_label__update.config(text="Current Password: ")
+    entry = entries[listbox__update.get(selection[0])] if selection else None
+    current_password_label__update.config(text=f"Current Password: {entry.get() if entry else ''}")
+    for field, var in field_vars__update.items():
+        var.set(entry.get(field) if entry else "")
 
 def add_new_password():
     key = key_entry__add.get().strip()
-    if passwords.get(key, False):
+    # `entries` already holds saves that are still queued on the writer thread
+    if key in entries:
         feedback_label__add.config(
             text="Key already exists. Visit update tab to update it's password",
             fg="red"
@@ -129,32 +318,133 @@ def add_new_password():
     if password != password_repeat:
         feedback_label__add.config(text="Passwords do not match", fg="red")
         return
-    passwords[key] = password
-    b.add_passwords_to_vault(passwords)
+    fields = {field: entry_text(widget) for field, widget in field_entries__add.items()}
+    entries[key] = b.Entry(key, plain={'value': password, **fields})
+    search_index.add(key, entry_terms(entries[key]))
+    tasks.submit(b.set_entry_in_vault, key, password, fields, write=True)
     feedback_label__add.config(text="New password saved", fg="green")
-    update_listbox(listbox__view)
-    update_listbox(listbox__update)
+    refresh_listboxes()
 
 def save_updated_password__update():
     selection = listbox__update.curselection()
     if not selection:
         feedback_label__update.config(text="Please select a key", fg="red")
         return
-    new_password = new_password_entry__update.get()
-    repeat_password = repeat_password_entry__update.get()
-    if not new_password or not repeat_password:
+    # the password only changes when a new one was typed, the fields when they were edited
+    key = listbox__update.get(selection[0])
+    entry = entries[key]
+    new_password = entry_text(new_password_entry__update)
+    repeat_password = entry_text(repeat_password_entry__update)
+    changes = {field: var.get() for field, var in field_vars__update.items() if var.get() != entry.get(field)}
+    if not new_password and not repeat_password and not changes:
         feedback_label__update.config(text="Please fill all fields", fg="red")
         return
     if new_password != repeat_password:
         feedback_label__update.config(text="Passwords do not match", fg="red")
         return
-    key = listbox__update.get(selection[0])
-    passwords[key] = new_password
-    b.add_passwords_to_vault(passwords)
-    feedback_label__update.config(text="Password updated successfully", fg="green")
-    update_listbox(listbox__view)
-    update_listbox(listbox__update)
-    current_password_label__update.config(text=f"Current Password: {new_password}")
+    entries[key] = entry.edited({'value': new_password, **changes} if new_password else changes)
+    if set(changes) & set(b.FILTER_FIELDS.values()):
+        search_index.set_terms(key, entry_terms(entries[key]))
+    tasks.submit(b.set_entry_in_vault, key, new_password or None, changes, write=True)
+    feedback_label__update.config(text="Password updated successfully" if new_password else "Entry updated", fg="green")
+    refresh_listboxes()
+    current_password_label__update.config(text=f"Current Password: {entries[key].get()}")
+
+def open_rotation__update():
+    # new generated values for every entry matching a pattern and / or age, kept reversible until confirmed
+    import _rotation
+    window = tk.Toplevel(root)
+    window.title("Rotate passwords")
+
+    tk.Label(window, text="Names matching (* and ? work)", font=font_medium).pack(pady=(10, 0))
+    pattern_var = tk.StringVar(value='*')
+    tk.Entry(window, textvariable=pattern_var, font=font_medium).pack(fill=tk.X, padx=10, pady=5)
+
+    tk.Label(window, text="Not changed for at least (days, empty for any)", font=font_medium).pack()
+    days_var = tk.StringVar()
+    tk.Entry(window, textvariable=days_var, font=font_medium).pack(fill=tk.X, padx=10, pady=5)
+
+    length_var = tk.IntVar(value=_rotation.DEFAULT_POLICY['length'])
+    tk.Scale(window, variable=length_var, from_=8, to=64, orient=tk.HORIZONTAL, label="New password length",
+             font=font_medium).pack(fill=tk.X, padx=10, pady=5)
+
+    status_label__rotation = tk.Label(window, text="", font=font_medium, wraplength=400)
+
+    def selection():
+        days = days_var.get().strip()
+        return pattern_var.get() or '*', float(days) * 86400 if days else None
+
+    def show_pending():
+        pending = _rotation.pending_rotation()
+        if pending is None:
+            status_label__rotation.config(text="No rotation pending", fg='grey')
+        else:
+            status_label__rotation.config(
+                text=f"{pending['count']} entries rotated, the old values are kept until you confirm",
+                fg='black'
+                )
+
+    def on_error(exc):
+        status_label__rotation.config(text=str(exc), fg='red')
+
+    def rotate():
+        try:
+            pattern, older_than = selection()
+        except ValueError:
+            status_label__rotation.config(text="Days must be a number", fg='red')
+            return
+        policy = {'length': length_var.get()}
+
+        def on_previewed(names):
+            if not names:
+                status_label__rotation.config(text="Nothing matches", fg='red')
+                return
+            if not messagebox.askyesno("Rotate passwords", f"Give {len(names)} entries new passwords?", parent=window):
+                return
+            tasks.submit(run_rotation, pattern, older_than, policy, session_generation, write=True,
+                         on_done=on_rotated, on_error=on_error)
+
+        tasks.submit(_rotation.preview, pattern, older_than, on_done=on_previewed, on_error=on_error)
+
+    def run_rotation(pattern, older_than, policy, generation):
+        rotated = _rotation.rotate(pattern, older_than, policy)
+        return rotated, load_vault(generation)
+
+    def on_rotated(result):
+        global entries, search_index
+        _, loaded = result
+        if loaded is None:  # logged out meanwhile
+            return
+        entries, search_index = loaded
+        refresh_listboxes()
+        show_pending()
+
+    def confirm():
+        if messagebox.askyesno("Confirm rotation", "Forget the previous values for good?", parent=window):
+            finish(_rotation.confirm)
+
+    def finish(func):
+        def on_done(_):
+            tasks.submit(load_vault, session_generation, on_done=on_reloaded)
+        tasks.submit(func, write=True, on_done=on_done, on_error=on_error)
+
+    def on_reloaded(result):
+        global entries, search_index
+        if result is None:
+            return
+        entries, search_index = result
+        refresh_listboxes()
+        show_pending()
+
+    buttons_frame = tk.Frame(window)
+    buttons_frame.pack(pady=5)
+    tk.Button(buttons_frame, text="Rotate", font=font_medium, bg="lightgreen", command=rotate).pack(side=tk.LEFT, padx=5)
+    tk.Button(buttons_frame, text="Confirm", font=font_medium,
+              command=confirm).pack(side=tk.LEFT, padx=5)
+    tk.Button(buttons_frame, text="Roll back", font=font_medium,
+              command=lambda: finish(_rotation.rollback)).pack(side=tk.LEFT, padx=5)
+    status_label__rotation.pack(pady=5)
+    show_pending()
 
 def delete_selected_key():
     selection = listbox__view.curselection()
@@ -164,28 +454,154 @@ def delete_selected_key():
     confirm = messagebox.askyesno("Confirm Deletion", f"Are you sure you want to delete '{key}'?\nThis action can not be reversed.")
     if not confirm:
         return
-    del passwords[key]
-    b.add_passwords_to_vault(passwords)
-    update_listbox(listbox__view)
-    update_listbox(listbox__update)
+    del entries[key]
+    search_index.remove(key)
+    tasks.submit(b.delete_password_from_vault, key, write=True)
+    refresh_listboxes()
     password_var__view.set("")
+    for var in field_vars__view.values():
+        var.set("")
 
 # ---------- LOGIN & SET PASSWORD SCREENS ----------
+def load_vault(generation):
+    # None when the user logged out after the load was started for session `generation`
+    b.initiate_files()  # normally done already by `check_start_screen`, cheap when it was
+    if not b.unlock_session(lambda: generation == session_generation):
+        return None
+    data = b.get_entries_from_vault()  # names only, the rest is decrypted when it is shown
+    return data, SearchIndex(data, {name: entry.terms for name, entry in data.items()})
+
 def show_main_app():
-    global passwords
-    passwords = b.get_passwords_from_vault()
-    update_listbox(listbox__view)
-    update_listbox(listbox__update)
-    login_frame.pack_forget()
-    set_pass_frame.pack_forget()
-    app_frame.pack(fill=tk.BOTH, expand=True)
+    global load_task
+
+    def on_loaded(result):
+        global entries, search_index
+        if result is None:
+            return
+        entries, search_index = result
+        refresh_listboxes()
+        login_frame.pack_forget()
+        set_pass_frame.pack_forget()
+        app_frame.pack(fill=tk.BOTH, expand=True)
+        import _rekey
+        tasks.submit(_rekey.status, on_done=continue_key_rotation)
+        tasks.submit(b.remember_profile, write=True)
+
+    load_task = tasks.submit(load_vault, session_generation, on_done=on_loaded)
+    # the first tab is built while the vault is decrypted
+    build_tab(notebook.nametowidget(notebook.select()))
 
 def check_login():
     pwd = password_entry__login.get()
-    if b.app_pass_is_correct(pwd):
-        show_main_app()
-    else:
-        feedback_label__login.config(text="Wrong password", fg="red")
+    login_button.config(state=tk.DISABLED)
+
+    def on_checked(is_correct):
+        login_button.config(state=tk.NORMAL)
+        if is_correct:
+            show_main_app()
+        else:
+            feedback_label__login.config(text="Wrong password", fg="red")
+
+    def on_error(exc):
+        login_button.config(state=tk.NORMAL)
+        show_task_error(exc)
+
+    tasks.submit(b.app_pass_is_correct, pwd, on_done=on_checked, on_error=on_error)
+
+def check_start_screen():
+    b.use_profile(b.get_last_profile())
+    b.initiate_files()
+    return b.app_pass_exists()
+
+def on_start_screen_checked(pass_exists):
+    show_profile()
+    login_button.config(state=tk.NORMAL)
+    if not pass_exists:
+        login_frame.pack_forget()
+        tasks.submit(b.reset_all, write=True)
+        set_pass_frame.pack(fill=tk.BOTH, expand=True)
+    mark_startup('ready')
+
+def show_profile():
+    # the window title and the profile menus name the profile in use
+    profile = b.get_profile()
+    root.title("Password Manager" if profile == b.DEFAULT_PROFILE else f"Password Manager - {profile}")
+    menus = [(profile_menu__login, profile_var__login)]
+    if tab5 in built_tabs:
+        menus.append((profile_menu__settings, profile_var__settings))
+    for option_menu, profile_var in menus:
+        profile_var.set(profile)
+        menu = option_menu['menu']
+        menu.delete(0, tk.END)
+        for name in b.list_profiles():
+            menu.add_command(label=name, command=lambda name=name: switch_profile(name))
+        menu.add_separator()
+        menu.add_command(label="New profile...", command=new_profile)
+
+def switch_profile(name):
+    # a vault still unlocked from earlier in this session opens right away (see `_backend.use_profile`),
+    # the others ask for their master password
+    global key_rotation_running
+    if name == b.get_profile():
+        return
+    if load_task is not None:
+        load_task.cancel()
+    key_rotation_running = False  # a running rotation carries on when its profile is opened again
+
+    def use(name):
+        unlocked = b.use_profile(name)
+        b.initiate_files()
+        return unlocked, b.app_pass_exists()
+
+    def on_switched(result):
+        unlocked, pass_exists = result
+        entries.clear()
+        search_index.clear()
+        refresh_listboxes()
+        show_profile()
+        if unlocked:
+            show_main_app()
+            return
+        app_frame.pack_forget()
+        set_pass_frame.pack_forget()
+        login_frame.pack_forget()
+        feedback_label__login.config(text="")
+        (login_frame if pass_exists else set_pass_frame).pack(fill=tk.BOTH, expand=True)
+
+    tasks.submit(use, name, write=True, on_done=on_switched, on_error=show_task_error)
+
+def new_profile():
+    from tkinter import simpledialog
+    name = simpledialog.askstring("New profile", "Name of the new profile (letters, digits, . _ -)", parent=root)
+    if not name:
+        return
+
+    def create(name):
+        b.create_profile(name)
+        return name
+
+    tasks.submit(create, name.strip(), write=True, on_done=switch_profile, on_error=show_task_error)
+
+def warm_up():
+    b.warm_up()
+    mark_startup('warm')
+
+def create_app_pass(pwd):
+    # first run: pick key derivation parameters for this machine before the first hash is stored.
+    # Returns why the password was refused, None once it is set
+    problem = b.app_pass_problem(pwd)
+    if problem is not None:
+        return problem
+    if b.get_setting('kdf') is None:
+        b.calibrate_kdf()
+    b.set_new_app_pass(pwd)
+    return None
+
+def change_app_pass(pwd):
+    problem = b.app_pass_problem(pwd)
+    if problem is None:
+        b.set_new_app_pass(pwd)
+    return problem
 
 # this is called on app open when password does not exist
 def set_app_pass__set_pass():
@@ -196,12 +612,15 @@ def set_app_pass__set_pass():
         msg = "Please fill out all fields"
     elif pwd != pwd2:
         msg = "Passwords do not match"
-    elif b.set_new_app_pass(pwd):
-        show_main_app()
-        return
     else:
-        # todo: add proper and descriptive "password not valid" message
-        msg = "Password is not valid!"
+        def on_set(problem):
+            if problem is None:
+                show_main_app()
+            else:
+                feedback_label__set_pass.config(text=problem, fg='red')
+
+        tasks.submit(create_app_pass, pwd, write=True, on_done=on_set)
+        return
 
     feedback_label__set_pass.config(text=msg, fg='red')
 
@@ -214,11 +633,274 @@ def set_app_pass__settings():
         feedback_label__settings.config(text="Please fill out all fields", fg='red')
     elif pwd != pwd2:
         feedback_label__settings.config(text="Passwords do not match", fg='red')
-    elif b.set_new_app_pass(pwd):
-        feedback_label__settings.config(text="New password set successfully", fg='green')
     else:
-        # todo: add proper and descriptive "password not valid" message
-        feedback_label__settings.config(text="Password is not valid!", fg='red')
+        def on_set(problem):
+            if problem is None:
+                feedback_label__settings.config(text="New password set successfully", fg='green')
+            else:
+                feedback_label__settings.config(text=problem, fg='red')
+
+        tasks.submit(change_app_pass, pwd, write=True, on_done=on_set)
+
+def calibrate_kdf__settings():
+    calibrate_button__settings.config(state=tk.DISABLED)
+    feedback_label__settings.config(text="Measuring this machine...", fg='grey')
+
+    def on_calibrated(params):
+        calibrate_button__settings.config(state=tk.NORMAL)
+        options = ', '.join(f'{k}={v}' for k, v in params.items() if k != 'algorithm')
+        feedback_label__settings.config(
+            text=f"{params['algorithm']} ({options}), applied on next login",
+            fg='green'
+            )
+
+    def on_error(exc):
+        calibrate_button__settings.config(state=tk.NORMAL)
+        show_task_error(exc)
+
+    tasks.submit(b.calibrate_kdf, write=True, on_done=on_calibrated, on_error=on_error)
+
+def set_durability__settings(mode):
+    def on_set(_):
+        feedback_label__settings.config(text=f"Edits are now saved: {DURABILITY_LABELS[mode]}", fg='green')
+
+    tasks.submit(b.set_durability, mode, write=True, on_done=on_set)
+
+def import_file__settings():
+    from tkinter import filedialog
+    file_path = filedialog.askopenfilename(title="Import passwords",
+                                           filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl *.ndjson")])
+    if not file_path:
+        return
+    overwrite = messagebox.askyesno("Import", "Overwrite entries that already exist?")
+
+    def run_import(generation, progress):
+        import _transfer
+        stats = _transfer.import_file(file_path, overwrite=overwrite, progress=progress)
+        return stats, load_vault(generation)
+
+    def on_progress(stats):
+        status_label.config(text=f"Importing... {stats['read']:,} read")
+
+    def on_imported(result):
+        global entries, search_index
+        stats, loaded = result
+        if loaded is None:
+            return
+        entries, search_index = loaded
+        refresh_listboxes()
+        feedback_label__settings.config(
+            text=f"Imported {stats['imported']}, overwrote {stats['overwritten']}, skipped {stats['skipped'] + stats['invalid']}",
+            fg='green'
+            )
+
+    tasks.submit(run_import, session_generation, write=True, on_done=on_imported, on_progress=on_progress)
+
+def export_file__settings():
+    from tkinter import filedialog
+    if not messagebox.askyesno("Export", "The export is NOT encrypted, anyone who can read the file sees every password. Continue?"):
+        return
+    file_path = filedialog.asksaveasfilename(title="Export passwords", defaultextension=".csv",
+                                             filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl")])
+    if not file_path:
+        return
+
+    def run_export(progress):
+        import _transfer
+        return _transfer.export_file(file_path, progress=progress)
+
+    def on_progress(stats):
+        status_label.config(text=f"Exporting... {stats['exported']:,} written")
+
+    def on_exported(exported):
+        feedback_label__settings.config(text=f"Exported {exported} entries", fg='green')
+
+    tasks.submit(run_export, write=True, on_done=on_exported, on_progress=on_progress)
+
+def rotate_key__settings():
+    import _rekey
+    if not messagebox.askyesno("Rotate encryption key",
+                               "Encrypt the vault with a new key? Entries are re-encrypted in the background, "
+                               "the app can be used meanwhile."):
+        return
+    rotate_key_button__settings.config(state=tk.DISABLED)
+
+    def on_error(exc):
+        rotate_key_button__settings.config(state=tk.NORMAL)
+        show_task_error(exc)
+
+    tasks.submit(_rekey.start, write=True, on_done=continue_key_rotation, on_error=on_error)
+
+def continue_key_rotation(status):
+    # one chunk per writer task, so saves made meanwhile only ever wait for a single chunk.
+    # Also picks up a rotation an earlier session didn't finish, right after login.
+    import _rekey
+    global key_rotation_running
+    if not b.session_is_unlocked():
+        key_rotation_running = False
+        return  # logged out, the next login carries on
+    if status['pending']:
+        key_rotation_running = True
+        if tab5 in built_tabs:
+            rotate_key_button__settings.config(state=tk.DISABLED)
+            feedback_label__settings.config(text=f"Re-encrypting... {status['reencrypted']:,} entries", fg='grey')
+        tasks.submit(_rekey.step, write=True, on_done=continue_key_rotation, on_error=show_task_error)
+    elif key_rotation_running:
+        key_rotation_running = False
+        if tab5 in built_tabs:
+            rotate_key_button__settings.config(state=tk.NORMAL)
+            feedback_label__settings.config(text="The vault is encrypted with the new key", fg='green')
+
+def open_audit__settings():
+    # breached, weak, reused and similar passwords and policy violations, worst first. Audits the
+    # entries in memory, so saves still queued on the writer are included
+    import _audit
+    import _breach
+    window = tk.Toplevel(root)
+    window.title("Password audit")
+    policy = b.get_audit_policy()
+    report__audit = None
+
+    corpus_label__audit = tk.Label(window, text="", font=font_small, fg='grey', wraplength=460)
+    corpus_label__audit.pack(pady=(10, 0))
+
+    policy_frame__audit = tk.Frame(window)
+    policy_frame__audit.pack(fill=tk.X, padx=10)
+    min_length_var__audit = tk.IntVar(value=policy['min_length'])
+    tk.Scale(policy_frame__audit, variable=min_length_var__audit, from_=6, to=32, orient=tk.HORIZONTAL,
+             label="Minimum length", font=font_small).pack(side=tk.LEFT, fill=tk.X, expand=True)
+    min_score_var__audit = tk.StringVar(value=_breach.STRENGTH_LABELS[policy['min_score']])
+    tk.Label(policy_frame__audit, text="at least", font=font_small).pack(side=tk.LEFT, padx=(10, 0))
+    tk.OptionMenu(policy_frame__audit, min_score_var__audit, *_breach.STRENGTH_LABELS).pack(side=tk.LEFT)
+    name_var__audit = tk.BooleanVar(value=policy['name'])
+    tk.Checkbutton(window, text="Flag passwords containing the entry's name", variable=name_var__audit,
+                   font=font_small).pack()
+
+    filter_var__audit = tk.StringVar(value='everything')
+    findings_text__audit = tk.Text(window, font=("Courier", 10), width=64, height=16, state=tk.DISABLED)
+    status_label__audit = tk.Label(window, text="", font=font_medium, wraplength=460)
+
+    def show_corpus():
+        path = b.get_breach_corpus_path()
+        corpus_label__audit.config(text=f"Breach list: {path}" if path else "No breach list set, nothing is looked up")
+
+    def on_error(exc):
+        audit_button__audit.config(state=tk.NORMAL)
+        status_label__audit.config(text=str(exc), fg='red')
+
+    def run_audit():
+        new_policy = {**policy, 'min_length': min_length_var__audit.get(), 'name': name_var__audit.get(),
+                      'min_score': _breach.STRENGTH_LABELS.index(min_score_var__audit.get())}
+        snapshot = list(entries.values())  # the dict keeps changing on this thread
+
+        def audit_entries(progress):
+            # values are decrypted a chunk at a time, on the reader
+            chunks = ([(entry.name, value) for entry, value in zip(chunk, b.entry_values(chunk))]
+                      for chunk in _audit.chunked(snapshot))
+            return _audit.audit(chunks, b.get_breach_corpus(), new_policy, progress)
+
+        audit_button__audit.config(state=tk.DISABLED)
+        status_label__audit.config(text="Checking...", fg='grey')
+        tasks.submit(b.set_audit_policy, new_policy, write=True, on_error=on_error)
+        tasks.submit(audit_entries, on_done=on_audited, on_error=on_error, on_progress=on_progress)
+
+    def on_progress(stats):
+        status_label__audit.config(text=f"Checked {stats['checked']:,} entries, {stats['found']:,} found", fg='grey')
+
+    def on_audited(report):
+        nonlocal report__audit
+        report__audit = report
+        audit_button__audit.config(state=tk.NORMAL)
+        status_label__audit.config(
+            text=f"{len(report['findings']):,} of {report['checked']:,} entries have problems, "
+                 f"reused passwords: {len(report['reused']):,}",
+            fg='red' if report['findings'] else 'green'
+            )
+        show_report()
+
+    def show_report(*_):
+        if report__audit is None:
+            return
+        shown = filter_var__audit.get()
+        lines = []
+        if shown in ('reused', 'similar'):
+            for group in report__audit[shown]:
+                lines.append(', '.join(group))
+        else:
+            for finding in report__audit['findings']:
+                if shown == 'everything' or shown in finding['problems'] \
+                        or (shown == 'policy' and {'short', 'classes', 'name'} & set(finding['problems'])):
+                    lines.append(f"{finding['name'][:24]:<24} {_audit.describe(finding)}")
+        if len(lines) > MAX_AUDIT_LINES:
+            lines[MAX_AUDIT_LINES:] = [f"... and {len(lines) - MAX_AUDIT_LINES:,} more"]
+
+        findings_text__audit.config(state=tk.NORMAL)
+        findings_text__audit.delete('1.0', tk.END)
+        findings_text__audit.insert(tk.END, '\n'.join(lines) or "Nothing found")
+        findings_text__audit.config(state=tk.DISABLED)
+
+    def choose_corpus():
+        from tkinter import filedialog
+        file_path = filedialog.askopenfilename(parent=window, title="Breach list (SHA-1 or NTLM hashes, sorted)",
+                                               filetypes=[("Text", "*.txt"), ("All files", "*")])
+        if file_path:
+            tasks.submit(b.set_breach_corpus, file_path, write=True, on_done=lambda _: show_corpus(), on_error=on_error)
+
+    filter_frame__audit = tk.Frame(window)
+    filter_frame__audit.pack(fill=tk.X, padx=5)
+    tk.Label(filter_frame__audit, text="Show", font=font_small).pack(side=tk.LEFT)
+    tk.OptionMenu(filter_frame__audit, filter_var__audit, *AUDIT_FILTERS, command=show_report).pack(side=tk.LEFT)
+    findings_text__audit.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+    status_label__audit.pack(pady=5)
+
+    buttons_frame = tk.Frame(window)
+    buttons_frame.pack(pady=5)
+    audit_button__audit = tk.Button(buttons_frame, text="Check", font=font_medium, bg="lightgreen", command=run_audit)
+    audit_button__audit.pack(side=tk.LEFT, padx=5)
+    tk.Button(buttons_frame, text="Breach list...", font=font_medium, command=choose_corpus).pack(side=tk.LEFT, padx=5)
+    show_corpus()
+
+def open_diagnostics__settings():
+    # timings and counters recorded by `_metrics`, recording itself is opt in
+    window = tk.Toplevel(root)
+    window.title("Diagnostics")
+
+    enabled_var = tk.BooleanVar(value=_metrics.enabled)
+    report_text = tk.Text(window, font=("Courier", 10), width=64, height=22)
+
+    def refresh():
+        report_text.config(state=tk.NORMAL)
+        report_text.delete('1.0', tk.END)
+        if _metrics.enabled:
+            report_text.insert(tk.END, _metrics.format_report(_metrics.report()))
+        else:
+            report_text.insert(tk.END, "Recording is off, nothing is measured.")
+        report_text.config(state=tk.DISABLED)
+
+    def toggle():
+        tasks.submit(b.set_metrics_enabled, enabled_var.get(), write=True, on_done=lambda _: refresh())
+
+    def reset():
+        _metrics.reset()
+        refresh()
+
+    def export():
+        from tkinter import filedialog
+        file_path = filedialog.asksaveasfilename(parent=window, title="Export diagnostics", defaultextension=".json",
+                                                 filetypes=[("JSON", "*.json")])
+        if file_path:
+            _metrics.write_report(file_path)
+
+    tk.Checkbutton(window, text="Record timings and counters", variable=enabled_var, font=font_medium,
+                   command=toggle).pack(pady=5)
+    report_text.pack(fill=tk.BOTH, expand=True, padx=5)
+
+    buttons_frame = tk.Frame(window)
+    buttons_frame.pack(pady=5)
+    tk.Button(buttons_frame, text="Refresh", font=font_medium, command=refresh).pack(side=tk.LEFT, padx=5)
+    tk.Button(buttons_frame, text="Reset", font=font_medium, command=reset).pack(side=tk.LEFT, padx=5)
+    tk.Button(buttons_frame, text="Export...", font=font_medium, command=export).pack(side=tk.LEFT, padx=5)
+    refresh()
 
 # ---------- MAIN WINDOW ----------
 root = tk.Tk()
@@ -228,12 +910,25 @@ root.resizable(False, False)
 
 root.bind_class("Button", "<Return>", lambda e: e.widget.invoke())
 
+tasks = BackgroundTasks(root.after, on_busy_change=set_busy, on_error=show_task_error)
+
+status_label = tk.Label(root, text="", font=font_small, fg="grey")
+status_label.pack(side=tk.BOTTOM, fill=tk.X)
+
 # ---------- LOGIN FRAME ----------
 login_frame = tk.Frame(root)
 
 label__login = tk.Label(login_frame, text="Enter Password", font=font_big)
 label__login.pack(pady=20)
 
+profile_frame__login = tk.Frame(login_frame)
+profile_frame__login.pack()
+tk.Label(profile_frame__login, text="Profile", font=font_medium).pack(side=tk.LEFT, padx=5)
+profile_var__login = tk.StringVar(value=b.DEFAULT_PROFILE)
+profile_menu__login = tk.OptionMenu(profile_frame__login, profile_var__login, b.DEFAULT_PROFILE)
+profile_menu__login.config(font=font_medium)
+profile_menu__login.pack(side=tk.LEFT, padx=5)
+
 password_entry_frame__login = tk.Frame(login_frame)
 password_entry_frame__login.pack(pady=10, fill=tk.X, padx=50)
 password_entry__login = tk.Entry(password_entry_frame__login, font=font_medium)
@@ -241,7 +936,8 @@ password_entry__login.pack(side=tk.LEFT, fill=tk.X, expand=True)
 add_placeholder_password(password_entry__login, "password")
 add_show_hide_toggle(password_entry__login)
 
-login_button = tk.Button(login_frame, text="Login", font=font_medium, command=check_login)
+# enabled once `check_start_screen` knows which profile and master password a login is checked against
+login_button = tk.Button(login_frame, text="Login", font=font_medium, command=check_login, state=tk.DISABLED)
 login_button.pack(pady=10)
 
 feedback_label__login = tk.Label(login_frame, text="", font=font_medium)
@@ -259,6 +955,9 @@ new_password_entry__set_pass = tk.Entry(new_password_entry_frame__set_pass, font
 new_password_entry__set_pass.pack(side=tk.LEFT, fill=tk.X, expand=True)
 add_placeholder_password(new_password_entry__set_pass, "new password")
 add_show_hide_toggle(new_password_entry__set_pass)
+strength_label__set_pass = tk.Label(set_pass_frame, text="", font=font_small)
+strength_label__set_pass.pack()
+add_strength_meter(new_password_entry__set_pass, strength_label__set_pass)
 
 repeat_password_entry_frame__set_pass = tk.Frame(set_pass_frame)
 repeat_password_entry_frame__set_pass.pack(fill=tk.X, padx=50, pady=5)
@@ -278,6 +977,7 @@ app_frame = tk.Frame(root)
 
 notebook = ttk.Notebook(app_frame)
 notebook.pack(fill=tk.BOTH, expand=True)
+notebook.bind("<<NotebookTabChanged>>", on_tab_changed)
 
 screen_width = root.winfo_screenwidth()
 screen_height = root.winfo_screenheight()
@@ -289,223 +989,345 @@ target_px_height = int(screen_height * 0.34)
 listbox_width = target_px_width // char_width
 listbox_height = target_px_height // char_height
 
-# ---------------TAB 1: VIEW--------------------
+# tabs are empty frames until they are first shown, see `build_tab`
 tab1 = ttk.Frame(notebook)
 notebook.add(tab1, text="View")
-
-search_frame__view = tk.Frame(tab1)
-search_frame__view.pack(fill="x", padx=10, pady=(10, 0))
-
-search_var__view = tk.StringVar()
-search_entry__view = tk.Entry(
-    search_frame__view,
-    textvariable=search_var__view,
-    font=font_medium
-)
-search_entry__view.pack(side="left", fill="x", expand=True)
-
-search_button__view = tk.Button(
-    search_frame__view,
-    text="🔍",
-    font=font_small,
-    command=lambda: update_listbox(listbox__view, search_var__view.get())
-)
-search_button__view.pack(side="right", padx=(5, 0))
-
-frame__view = tk.Frame(tab1)
-frame__view.pack(pady=10)
-scrollbar__view = tk.Scrollbar(frame__view)
-scrollbar__view.pack(side=tk.RIGHT, fill=tk.Y)
-listbox__view = tk.Listbox(frame__view, yscrollcommand=scrollbar__view.set,
-                          font=font_big, width=listbox_width, height=listbox_height)
-listbox__view.pack(side=tk.LEFT, fill=tk.BOTH)
-scrollbar__view.config(command=listbox__view.yview)
-listbox__view.bind("<<ListboxSelect>>", on_listbox_key_select__view)
-
-delete_button__view = tk.Button(tab1, text="Delete", fg="white", bg="red",
-                          font=font_medium, command=delete_selected_key)
-delete_button__view.pack(pady=5)
-
-show_password_frame__view = tk.Frame(tab1)
-show_password_frame__view.pack(fill="x", padx=10, pady=10)
-
-password_label__view = tk.Label(show_password_frame__view, text="Password: ", font=font_small)
-password_label__view.pack(side="left")
-
-password_var__view = tk.StringVar()
-password_entry__view = tk.Entry(
-    show_password_frame__view,
-    textvariable=password_var__view,
-    font=font_medium,
-    state="readonly"
-)
-password_entry__view.pack(side="left", fill="x", expand=True, padx=(5,5))
-
-copy_button__view = tk.Button(show_password_frame__view, text="Copy",
-                        font=font_small, command=copy_selected_password__view)
-copy_button__view.pack(side="right", padx=(5,0))
-
-update_listbox(listbox__view)
-
-# ---------------TAB 2: ADD--------------------
 tab2 = ttk.Frame(notebook)
 notebook.add(tab2, text="Add")
-
-label__add = tk.Label(tab2, text="Add new password", font=font_medium)
-label__add.pack(pady=5)
-
-key_entry__add = tk.Entry(tab2, font=font_medium)
-key_entry__add.pack(fill=tk.X, padx=5, pady=5)
-add_placeholder(key_entry__add, "key")
-
-password_entry_frame__add = tk.Frame(tab2)
-password_entry_frame__add.pack(fill=tk.X, padx=5, pady=5)
-password_entry__add = tk.Entry(password_entry_frame__add, font=font_medium)
-password_entry__add.pack(side=tk.LEFT, fill=tk.X, expand=True)
-add_placeholder_password(password_entry__add, "value")
-add_show_hide_toggle(password_entry__add)
-
-repeat_entry_frame__add = tk.Frame(tab2)
-repeat_entry_frame__add.pack(fill=tk.X, padx=5, pady=5)
-repeat_entry__add = tk.Entry(repeat_entry_frame__add, font=font_medium)
-repeat_entry__add.pack(side=tk.LEFT, fill=tk.X, expand=True)
-add_placeholder_password(repeat_entry__add, "repeat value")
-add_show_hide_toggle(repeat_entry__add)
-
-save_button__add = tk.Button(tab2, text="Save", font=font_medium, command=add_new_password)
-save_button__add.pack(pady=5)
-
-feedback_label__add = tk.Label(tab2, text="", font=font_medium)
-feedback_label__add.pack(pady=5)
-
-# ---------------TAB 3: UPDATE--------------------
 tab3 = ttk.Frame(notebook)
 notebook.add(tab3, text="Update")
-
-search_frame__update = tk.Frame(tab3)
-search_frame__update.pack(fill="x", padx=10, pady=(10, 0))
-
-search_var__update = tk.StringVar()
-search_entry__update = tk.Entry(
-    search_frame__update,
-    textvariable=search_var__update,
-    font=font_medium
-)
-search_entry__update.pack(side="left", fill="x", expand=True)
-
-search_button__update = tk.Button(
-    search_frame__update,
-    text="🔍",
-    font=font_small,
-    command=lambda: update_listbox(listbox__update, search_var__update.get())
-)
-search_button__update.pack(side="right", padx=(5, 0))
-
-frame__update = tk.Frame(tab3)
-frame__update.pack(pady=10)
-scrollbar__update = tk.Scrollbar(frame__update)
-scrollbar__update.pack(side=tk.RIGHT, fill=tk.Y)
-listbox__update = tk.Listbox(frame__update, yscrollcommand=scrollbar__update.set,
-                            font=font_big, width=listbox_width, height=listbox_height - 4)
-listbox__update.pack(side=tk.LEFT, fill=tk.BOTH)
-scrollbar__update.config(command=listbox__update.yview)
-listbox__update.bind("<<ListboxSelect>>", on_listbox_key_select__update)
-update_listbox(listbox__update)
-
-current_password_label__update = tk.Label(tab3, text="Current Password: ", font=font_medium)
-current_password_label__update.pack(pady=5)
-
-new_password_entry_frame__update = tk.Frame(tab3)
-new_password_entry_frame__update.pack(fill=tk.X, padx=5, pady=5)
-new_password_entry__update = tk.Entry(new_password_entry_frame__update, font=font_medium)
-new_password_entry__update.pack(side=tk.LEFT, fill=tk.X, expand=True)
-add_placeholder_password(new_password_entry__update, "new password")
-add_show_hide_toggle(new_password_entry__update)
-
-repeat_entry_frame__update = tk.Frame(tab3)
-repeat_entry_frame__update.pack(fill=tk.X, padx=5, pady=5)
-repeat_password_entry__update = tk.Entry(repeat_entry_frame__update, font=font_medium)
-repeat_password_entry__update.pack(side=tk.LEFT, fill=tk.X, expand=True)
-add_placeholder_password(repeat_password_entry__update, "repeat new password")
-add_show_hide_toggle(repeat_password_entry__update)
-
-save_button__update = tk.Button(tab3, text="Save", font=font_medium, command=save_updated_password__update)
-save_button__update.pack(pady=5)
-
-feedback_label__update = tk.Label(tab3, text="", font=font_medium)
-feedback_label__update.pack(pady=5)
-
-# --------------------TAB 4: TOOLS------------------
 tab4 = ttk.Frame(notebook)
 notebook.add(tab4, text="Tools")
-
-label__tools = tk.Label(tab4, text="Strong password generator", font=font_medium)
-label__tools.pack(pady=5)
-
-password_entry_frame__tools = tk.Frame(tab4)
-password_entry_frame__tools.pack(fill=tk.X, padx=5, pady=5)
-generated_pass_var__tools = tk.StringVar()
-
-password_length_var__tools = tk.IntVar(value=12)
-password_length_scale__tools = tk.Scale(tab4, variable=password_length_var__tools, from_=8, to=32,
-                                        orient=tk.HORIZONTAL, label="Password Length", font=font_medium)
-password_length_scale__tools.pack(pady=5, fill=tk.X)
-
-generated_password_entry__tools = tk.Entry(password_entry_frame__tools,
-                                           font=font_medium,
-                                           textvariable=generated_pass_var__tools,
-                                           state="readonly")
-generated_password_entry__tools.pack(side=tk.LEFT, fill=tk.X, expand=True)
-add_placeholder_password(generated_password_entry__tools, "Generated Password")
-add_show_hide_toggle(generated_password_entry__tools)
-
-generate_button__tools = tk.Button(tab4, text="Generate", font=font_medium, bg="lightgreen",
-                                command=lambda: generated_pass_var__tools.set(b.generate_strong_password(password_length_var__tools.get())))
-generate_button__tools.pack(pady=5)
-
-copy_button__tools = tk.Button(tab4, text="Copy", font=font_medium, bg="lightyellow",
-                               command=copy_generated_password__tools)
-copy_button__tools.pack(pady=5)
-
-feedback_label__tools = tk.Label(tab4, text="", font=font_medium)
-feedback_label__tools.pack(pady=5)
-
-# --------------------TAB 5: SETTINGS------------------
 tab5 = ttk.Frame(notebook)
 notebook.add(tab5, text="Settings")
 
-label__settings = tk.Label(tab5, text="Set new password for the app", font=font_medium)
-label__settings.pack(pady=5)
+# ---------------TAB 1: VIEW--------------------
+def add_field_rows(parent, readonly):
+    # a labelled text entry per entry field, returns their variables by field
+    fields_frame = tk.Frame(parent)
+    fields_frame.pack(fill="x", padx=10)
+    fields_frame.columnconfigure(1, weight=1)
+    field_vars = {}
+    for row, (field, label) in enumerate(FIELD_LABELS.items()):
+        tk.Label(fields_frame, text=f"{label}: ", font=font_small).grid(row=row, column=0, sticky="w")
+        field_vars[field] = tk.StringVar()
+        tk.Entry(fields_frame, textvariable=field_vars[field], font=font_small,
+                 state="readonly" if readonly else "normal").grid(row=row, column=1, sticky="ew", pady=1)
+    return field_vars
+
+def build_tab__view():
+    global search_var__view, listbox__view, password_var__view, field_vars__view
+
+    search_frame__view = tk.Frame(tab1)
+    search_frame__view.pack(fill="x", padx=10, pady=(10, 0))
+
+    search_var__view = tk.StringVar()
+    search_var__view.trace_add("write", lambda *_: schedule_search(listbox__view, search_var__view))
+    search_entry__view = tk.Entry(
+        search_frame__view,
+        textvariable=search_var__view,
+        font=font_medium
+    )
+    search_entry__view.pack(side="left", fill="x", expand=True)
+
+    search_button__view = tk.Button(
+        search_frame__view,
+        text="🔍",
+        font=font_small,
+        command=lambda: update_listbox(listbox__view, search_var__view.get())
+    )
+    search_button__view.pack(side="right", padx=(5, 0))
+
+    listbox__view = VirtualListbox(tab1, height=listbox_height, font=font_big, width=listbox_width)
+    listbox__view.pack(pady=10)
+    listbox__view.bind("<<ListboxSelect>>", on_listbox_key_select__view)
+
+    delete_button__view = tk.Button(tab1, text="Delete", fg="white", bg="red",
+                              font=font_medium, command=delete_selected_key)
+    delete_button__view.pack(pady=5)
+
+    show_password_frame__view = tk.Frame(tab1)
+    show_password_frame__view.pack(fill="x", padx=10, pady=10)
+
+    password_label__view = tk.Label(show_password_frame__view, text="Password: ", font=font_small)
+    password_label__view.pack(side="left")
+
+    password_var__view = tk.StringVar()
+    password_entry__view = tk.Entry(
+        show_password_frame__view,
+        textvariable=password_var__view,
+        font=font_medium,
+        state="readonly"
+    )
+    password_entry__view.pack(side="left", fill="x", expand=True, padx=(5,5))
+
+    copy_button__view = tk.Button(show_password_frame__view, text="Copy",
+                            font=font_small, command=copy_selected_password__view)
+    copy_button__view.pack(side="right", padx=(5,0))
+
+    field_vars__view = add_field_rows(tab1, readonly=True)
 
-password_entry_frame__settings = tk.Frame(tab5)
-password_entry_frame__settings.pack(fill=tk.X, padx=5, pady=5)
-new_password_entry__settings = tk.Entry(password_entry_frame__settings, font=font_medium)
-new_password_entry__settings.pack(side=tk.LEFT, fill=tk.X, expand=True)
-add_placeholder_password(new_password_entry__settings, "new password")
-add_show_hide_toggle(new_password_entry__settings)
+    update_listbox(listbox__view)
 
-repeat_entry_frame__settings = tk.Frame(tab5)
-repeat_entry_frame__settings.pack(fill=tk.X, padx=5, pady=5)
-repeat_password_entry__settings = tk.Entry(repeat_entry_frame__settings, font=font_medium)
-repeat_password_entry__settings.pack(side=tk.LEFT, fill=tk.X, expand=True)
-add_placeholder_password(repeat_password_entry__settings, "repeat new password")
-add_show_hide_toggle(repeat_password_entry__settings)
+# ---------------TAB 2: ADD--------------------
+def build_tab__add():
+    global key_entry__add, password_entry__add, repeat_entry__add, feedback_label__add, field_entries__add
+
+    label__add = tk.Label(tab2, text="Add new password", font=font_medium)
+    label__add.pack(pady=5)
+
+    key_entry__add = tk.Entry(tab2, font=font_medium)
+    key_entry__add.pack(fill=tk.X, padx=5, pady=5)
+    add_placeholder(key_entry__add, "key")
+
+    password_entry_frame__add = tk.Frame(tab2)
+    password_entry_frame__add.pack(fill=tk.X, padx=5, pady=5)
+    password_entry__add = tk.Entry(password_entry_frame__add, font=font_medium)
+    password_entry__add.pack(side=tk.LEFT, fill=tk.X, expand=True)
+    add_placeholder_password(password_entry__add, "value")
+    add_show_hide_toggle(password_entry__add)
+    strength_label__add = tk.Label(tab2, text="", font=font_small)
+    strength_label__add.pack()
+    add_strength_meter(password_entry__add, strength_label__add)
+
+    repeat_entry_frame__add = tk.Frame(tab2)
+    repeat_entry_frame__add.pack(fill=tk.X, padx=5, pady=5)
+    repeat_entry__add = tk.Entry(repeat_entry_frame__add, font=font_medium)
+    repeat_entry__add.pack(side=tk.LEFT, fill=tk.X, expand=True)
+    add_placeholder_password(repeat_entry__add, "repeat value")
+    add_show_hide_toggle(repeat_entry__add)
+
+    # optional, the tags comma separated
+    field_entries__add = {}
+    for field, label in FIELD_LABELS.items():
+        field_entries__add[field] = tk.Entry(tab2, font=font_medium)
+        field_entries__add[field].pack(fill=tk.X, padx=5, pady=5)
+        add_placeholder(field_entries__add[field], label.lower() + (" (comma separated)" if field == 'tags' else ""))
+
+    save_button__add = tk.Button(tab2, text="Save", font=font_medium, command=add_new_password)
+    save_button__add.pack(pady=5)
+
+    feedback_label__add = tk.Label(tab2, text="", font=font_medium)
+    feedback_label__add.pack(pady=5)
 
-save_button__settings = tk.Button(tab5, text="Save", font=font_medium, command=set_app_pass__settings)
-save_button__settings.pack(pady=5)
+# ---------------TAB 3: UPDATE--------------------
+def build_tab__update():
+    global search_var__update, listbox__update, current_password_label__update, new_password_entry__update, repeat_password_entry__update, feedback_label__update
+    global field_vars__update
+
+    search_frame__update = tk.Frame(tab3)
+    search_frame__update.pack(fill="x", padx=10, pady=(10, 0))
+
+    search_var__update = tk.StringVar()
+    search_var__update.trace_add("write", lambda *_: schedule_search(listbox__update, search_var__update))
+    search_entry__update = tk.Entry(
+        search_frame__update,
+        textvariable=search_var__update,
+        font=font_medium
+    )
+    search_entry__update.pack(side="left", fill="x", expand=True)
+
+    search_button__update = tk.Button(
+        search_frame__update,
+        text="🔍",
+        font=font_small,
+        command=lambda: update_listbox(listbox__update, search_var__update.get())
+    )
+    search_button__update.pack(side="right", padx=(5, 0))
+
+    listbox__update = VirtualListbox(tab3, height=listbox_height - 4, font=font_big, width=listbox_width)
+    listbox__update.pack(pady=10)
+    listbox__update.bind("<<ListboxSelect>>", on_listbox_key_select__update)
+    update_listbox(listbox__update)
 
-feedback_label__settings = tk.Label(tab5, text="", font=font_medium)
-feedback_label__settings.pack(pady=5)
+    current_password_label__update = tk.Label(tab3, text="Current Password: ", font=font_medium)
+    current_password_label__update.pack(pady=5)
+
+    new_password_entry_frame__update = tk.Frame(tab3)
+    new_password_entry_frame__update.pack(fill=tk.X, padx=5, pady=5)
+    new_password_entry__update = tk.Entry(new_password_entry_frame__update, font=font_medium)
+    new_password_entry__update.pack(side=tk.LEFT, fill=tk.X, expand=True)
+    add_placeholder_password(new_password_entry__update, "new password")
+    add_show_hide_toggle(new_password_entry__update)
+    strength_label__update = tk.Label(tab3, text="", font=font_small)
+    strength_label__update.pack()
+    add_strength_meter(new_password_entry__update, strength_label__update)
+
+    repeat_entry_frame__update = tk.Frame(tab3)
+    repeat_entry_frame__update.pack(fill=tk.X, padx=5, pady=5)
+    repeat_password_entry__update = tk.Entry(repeat_entry_frame__update, font=font_medium)
+    repeat_password_entry__update.pack(side=tk.LEFT, fill=tk.X, expand=True)
+    add_placeholder_password(repeat_password_entry__update, "repeat new password")
+    add_show_hide_toggle(repeat_password_entry__update)
+
+    field_vars__update = add_field_rows(tab3, readonly=False)
+
+    buttons_frame__update = tk.Frame(tab3)
+    buttons_frame__update.pack(pady=5)
+    save_button__update = tk.Button(buttons_frame__update, text="Save", font=font_medium, command=save_updated_password__update)
+    save_button__update.pack(side=tk.LEFT, padx=5)
+    rotate_button__update = tk.Button(buttons_frame__update, text="Rotate...", font=font_medium, command=open_rotation__update)
+    rotate_button__update.pack(side=tk.LEFT, padx=5)
+
+    feedback_label__update = tk.Label(tab3, text="", font=font_medium)
+    feedback_label__update.pack(pady=5)
 
-# ---------- Decide Start Screen ----------
-b.initiate_files()
+# --------------------TAB 4: TOOLS------------------
+def build_tab__tools():
+    global generated_pass_var__tools, password_length_var__tools, password_length_scale__tools, mode_var__tools
+    global class_vars__tools, class_checkbuttons__tools, no_ambiguous_var__tools, entropy_label__tools
+
+    label__tools = tk.Label(tab4, text="Strong password generator", font=font_medium)
+    label__tools.pack(pady=5)
+
+    password_entry_frame__tools = tk.Frame(tab4)
+    password_entry_frame__tools.pack(fill=tk.X, padx=5, pady=5)
+    generated_pass_var__tools = tk.StringVar()
+
+    mode_var__tools = tk.StringVar(value='characters')
+    mode_menu__tools = tk.OptionMenu(tab4, mode_var__tools, *_passgen.MODES, command=set_mode__tools)
+    mode_menu__tools.config(font=font_medium)
+    mode_menu__tools.pack(pady=5)
+
+    password_length_var__tools = tk.IntVar(value=_passgen.DEFAULT_POLICY['length'])
+    password_length_scale__tools = tk.Scale(tab4, variable=password_length_var__tools, from_=8, to=32,
+                                            orient=tk.HORIZONTAL, label="Password Length", font=font_medium,
+                                            command=update_entropy__tools)
+    password_length_scale__tools.pack(pady=5, fill=tk.X)
+
+    classes_frame__tools = tk.Frame(tab4)
+    classes_frame__tools.pack(pady=5)
+    class_vars__tools = {}
+    class_checkbuttons__tools = []
+    for name in _passgen.CHARACTER_CLASSES:
+        class_vars__tools[name] = tk.BooleanVar(value=True)
+        checkbutton = tk.Checkbutton(classes_frame__tools, text=_passgen.CLASS_LABELS[name].split()[0],
+                                     variable=class_vars__tools[name], font=font_small, command=update_entropy__tools)
+        checkbutton.pack(side=tk.LEFT)
+        class_checkbuttons__tools.append(checkbutton)
+    no_ambiguous_var__tools = tk.BooleanVar(value=False)
+    no_ambiguous_checkbutton__tools = tk.Checkbutton(classes_frame__tools, text="no look-alikes",
+                                                     variable=no_ambiguous_var__tools, font=font_small,
+                                                     command=update_entropy__tools)
+    no_ambiguous_checkbutton__tools.pack(side=tk.LEFT)
+    class_checkbuttons__tools.append(no_ambiguous_checkbutton__tools)
+
+    generated_password_entry__tools = tk.Entry(password_entry_frame__tools,
+                                               font=font_medium,
+                                               textvariable=generated_pass_var__tools,
+                                               state="readonly")
+    generated_password_entry__tools.pack(side=tk.LEFT, fill=tk.X, expand=True)
+    add_placeholder_password(generated_password_entry__tools, "Generated Password")
+    add_show_hide_toggle(generated_password_entry__tools)
+
+    generate_button__tools = tk.Button(tab4, text="Generate", font=font_medium, bg="lightgreen",
+                                    command=generate_password__tools)
+    generate_button__tools.pack(pady=5)
+
+    copy_button__tools = tk.Button(tab4, text="Copy", font=font_medium, bg="lightyellow",
+                                   command=copy_generated_password__tools)
+    copy_button__tools.pack(pady=5)
+
+    entropy_label__tools = tk.Label(tab4, text="", font=font_medium)
+    entropy_label__tools.pack(pady=5)
+    update_entropy__tools()
 
-if b.app_pass_exists():
-    login_frame.pack(fill=tk.BOTH, expand=True)
-else:
-    b.reset_all()
-    set_pass_frame.pack(fill=tk.BOTH, expand=True)
+# --------------------TAB 5: SETTINGS------------------
+def build_tab__settings():
+    global new_password_entry__settings, repeat_password_entry__settings, calibrate_button__settings, feedback_label__settings
+    global rotate_key_button__settings, profile_var__settings, profile_menu__settings
+
+    profile_frame__settings = tk.Frame(tab5)
+    profile_frame__settings.pack(pady=5)
+    tk.Label(profile_frame__settings, text="Profile", font=font_medium).pack(side=tk.LEFT, padx=5)
+    profile_var__settings = tk.StringVar(value=b.get_profile())
+    profile_menu__settings = tk.OptionMenu(profile_frame__settings, profile_var__settings, b.get_profile())
+    profile_menu__settings.config(font=font_medium)
+    profile_menu__settings.pack(side=tk.LEFT, padx=5)
+
+    label__settings = tk.Label(tab5, text="Set new password for the app", font=font_medium)
+    label__settings.pack(pady=5)
+
+    password_entry_frame__settings = tk.Frame(tab5)
+    password_entry_frame__settings.pack(fill=tk.X, padx=5, pady=5)
+    new_password_entry__settings = tk.Entry(password_entry_frame__settings, font=font_medium)
+    new_password_entry__settings.pack(side=tk.LEFT, fill=tk.X, expand=True)
+    add_placeholder_password(new_password_entry__settings, "new password")
+    add_show_hide_toggle(new_password_entry__settings)
+    strength_label__settings = tk.Label(tab5, text="", font=font_small)
+    strength_label__settings.pack()
+    add_strength_meter(new_password_entry__settings, strength_label__settings)
+
+    repeat_entry_frame__settings = tk.Frame(tab5)
+    repeat_entry_frame__settings.pack(fill=tk.X, padx=5, pady=5)
+    repeat_password_entry__settings = tk.Entry(repeat_entry_frame__settings, font=font_medium)
+    repeat_password_entry__settings.pack(side=tk.LEFT, fill=tk.X, expand=True)
+    add_placeholder_password(repeat_password_entry__settings, "repeat new password")
+    add_show_hide_toggle(repeat_password_entry__settings)
+
+    save_button__settings = tk.Button(tab5, text="Save", font=font_medium, command=set_app_pass__settings)
+    save_button__settings.pack(pady=5)
+
+    calibrate_button__settings = tk.Button(tab5, text="Calibrate unlock time", font=font_medium,
+                                           command=calibrate_kdf__settings)
+    calibrate_button__settings.pack(pady=5)
+
+    durability_frame__settings = tk.Frame(tab5)
+    durability_frame__settings.pack(pady=5)
+    tk.Label(durability_frame__settings, text="Save edits", font=font_medium).pack(side=tk.LEFT, padx=5)
+    durability_var__settings = tk.StringVar(value=b.get_durability())
+    durability_menu__settings = tk.OptionMenu(durability_frame__settings, durability_var__settings, *b.DURABILITY_MODES,
+                                              command=set_durability__settings)
+    durability_menu__settings.config(font=font_medium)
+    durability_menu__settings.pack(side=tk.LEFT, padx=5)
+
+    transfer_frame__settings = tk.Frame(tab5)
+    transfer_frame__settings.pack(pady=5)
+    import_button__settings = tk.Button(transfer_frame__settings, text="Import...", font=font_medium,
+                                        command=import_file__settings)
+    import_button__settings.pack(side=tk.LEFT, padx=5)
+    export_button__settings = tk.Button(transfer_frame__settings, text="Export...", font=font_medium,
+                                        command=export_file__settings)
+    export_button__settings.pack(side=tk.LEFT, padx=5)
+
+    rotate_key_button__settings = tk.Button(tab5, text="Rotate encryption key", font=font_medium,
+                                            command=rotate_key__settings,
+                                            state=tk.DISABLED if key_rotation_running else tk.NORMAL)
+    rotate_key_button__settings.pack(pady=5)
+
+    tools_frame__settings = tk.Frame(tab5)
+    tools_frame__settings.pack(pady=5)
+    audit_button__settings = tk.Button(tools_frame__settings, text="Password audit...", font=font_medium,
+                                       command=open_audit__settings)
+    audit_button__settings.pack(side=tk.LEFT, padx=5)
+    diagnostics_button__settings = tk.Button(tools_frame__settings, text="Diagnostics...", font=font_medium,
+                                             command=open_diagnostics__settings)
+    diagnostics_button__settings.pack(side=tk.LEFT, padx=5)
+
+    feedback_label__settings = tk.Label(tab5, text="", font=font_medium)
+    feedback_label__settings.pack(pady=5)
+    show_profile()
+
+
+tab_builders = {
+    tab1: build_tab__view,
+    tab2: build_tab__add,
+    tab3: build_tab__update,
+    tab4: build_tab__tools,
+    tab5: build_tab__settings,
+}
 
+# ---------- Decide Start Screen ----------
+# The login frame goes up right away. Whether a master password exists (a keyring lookup) is
+# checked in the background and swaps in the set password frame if needed, while the key material
+# is probed on another thread so the first unlock doesn't have to wait for it.
+mark_startup('imports_and_widgets')
+login_frame.pack(fill=tk.BOTH, expand=True)
+tasks.submit(check_start_screen, write=True, on_done=on_start_screen_checked)
+threading.Thread(target=warm_up, daemon=True).start()
+root.after_idle(lambda: mark_startup('first_frame'))
+if MEASURE_STARTUP:
+    finish_startup_measurement()
 
 root.after(300_000, show_login_after_time)  # app returns to login frame after 5 minutes (300_000 mili seconds)
 
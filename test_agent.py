@@ -0,0 +1,63 @@
+import json
+import socket
+import threading
+
+import pytest
+
+import _backend as b
+import cli
+from _agent import Agent, AgentClient, PIPELINE_BYTES, agent_is_supported
+
+pytestmark = pytest.mark.skipif(not agent_is_supported(), reason="the agent needs Unix domain sockets")
+
+
+@pytest.fixture
+def agent(vault, tmp_path):
+    agent = Agent(tmp_path / 'agent.sock', ttl=60)
+    agent.bind()
+    thread = threading.Thread(target=agent.serve, daemon=True)
+    thread.start()
+    yield agent
+    agent.server.shutdown()
+    thread.join(5)
+
+
+def test_a_batch_larger_than_the_socket_buffers_is_answered(agent):
+    b.add_passwords_to_vault({f'name{i}': f'value{i}' for i in range(50)})
+    # the ids are echoed back, so requests and answers both run into megabytes
+    padding = 'x' * 1000
+    count = 20 * PIPELINE_BYTES // len(padding)
+    requests = [{'op': 'get', 'name': f'name{i % 60}', 'id': f'{i}{padding}'} for i in range(count)]
+    with AgentClient(agent.socket_path) as client:
+        responses = client.request_many(requests)
+    assert [response['id'] for response in responses] == [request['id'] for request in requests]
+    assert [response.get('value') for response in responses[:60]] == [f'value{i}' for i in range(50)] + [None] * 10
+
+def test_an_agent_that_does_not_answer_is_a_cli_error(tmp_path):
+    socket_path = tmp_path / 'silent.sock'
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(socket_path))
+        server.listen()
+        with AgentClient(socket_path, timeout=0.2) as client:
+            with pytest.raises(cli.CliError, match='agent: timed out'):
+                cli.agent_request(client, {'op': 'ping'})
+
+def test_bad_requests_are_answered_with_their_id(agent):
+    lines = [
+        {'op': 'get', 'id': 1},
+        {'op': 'search', 'name': 'git', 'id': 2},
+        {'op': 'list', 'filters': [['color', 'red']], 'id': 3},  # raises in the agent
+        {'op': 'get', 'name': 'github', 'id': 4},
+    ]
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(agent.socket_path))
+        sock.sendall(b''.join(json.dumps(line).encode() + b'\n' for line in lines) + b'{"op": \n[1, 2]\n')
+        with sock.makefile('rb') as f:
+            responses = [json.loads(f.readline()) for _ in range(len(lines) + 2)]
+
+    assert [response.get('id') for response in responses] == [1, 2, 3, 4, None, None]
+    assert not any(response['ok'] for response in responses)
+    errors = [response['error'] for response in responses]
+    assert errors[:2] == ["get needs a 'name' string", "search needs a 'query' string"]
+    assert 'unknown filter' in errors[2] and errors[3] == 'not found'
+    assert errors[4].startswith('bad request: ') and errors[5] == 'bad request: expected a JSON object'
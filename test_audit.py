@@ -0,0 +1,70 @@
+import pytest
+
+import _audit as a
+import _breach
+import _passgen
+
+
+@pytest.fixture
+def strong() -> list[str]:
+    return _passgen.generate_passwords(4, {'length': 20})
+
+
+def test_normal_forms():
+    assert a.normal_forms('P@ssw0rd2024!') == {'password'}
+    assert a.normal_forms('acme-corp.gmail') == {'acme-corp.gmail', 'acmecorp'}
+    assert a.normal_forms('Acme-Corp.yahoo') & a.normal_forms('acme-corp.gmail') == {'acmecorp'}
+    assert a.normal_forms('ab1!') == set()
+
+def test_strong_unique_passwords_have_no_findings(strong):
+    report = a.audit(a.chunked([(f'site{i}', value) for i, value in enumerate(strong)]))
+    assert report['checked'] == 4
+    assert report['findings'] == [] and report['reused'] == [] and report['similar'] == []
+
+def test_reused_and_similar_passwords_are_grouped(strong):
+    entries = [('github', strong[0]), ('gitlab', strong[0]), ('GitHub work', strong[0]),
+               ('mail', 'Sunflower-2019!x'), ('bank', 'sunflower-2020?x'), ('shop', strong[1])]
+    report = a.audit(a.chunked(entries, 2))
+    assert report['reused'] == [['github', 'GitHub work', 'gitlab']]
+    assert report['similar'] == [['bank', 'mail']]
+
+    findings = {finding['name']: finding for finding in report['findings']}
+    assert set(findings) == {'github', 'gitlab', 'GitHub work', 'mail', 'bank'}
+    assert findings['github']['problems'] == ['reused'] and findings['github']['reused'] == 2
+    assert findings['mail']['problems'] == ['similar'] and findings['mail']['similar'] == 1
+    assert a.describe(findings['github']) == "same password as 2 other entries"
+    assert a.describe(findings['mail']) == "similar to 1 other entry"
+    # the most reused come first
+    assert [finding['name'] for finding in report['findings']][:3] == ['github', 'GitHub work', 'gitlab']
+
+def test_policy_problems(strong):
+    entries = [('short', 'Xk9#mq2!'), ('digits', '839201748392017483'), ('paypal', 'my-paypal-Xk9#mq2!vLp7'),
+               ('weak', 'password123456')]
+    report = a.audit([entries], policy={'min_classes': 2})
+    problems = {finding['name']: finding['problems'] for finding in report['findings']}
+    assert problems['short'] == ['short']
+    assert problems['digits'] == ['classes']
+    assert problems['paypal'] == ['name']
+    assert 'weak' in problems['weak']
+    report = a.audit([entries], policy={'min_classes': 2, 'name': False})
+    assert 'paypal' not in {finding['name'] for finding in report['findings']}
+
+def test_breached_passwords_come_first(tmp_path, strong):
+    corpus_path = tmp_path / 'corpus.txt'
+    lines = sorted(_breach.password_hash(value, 'sha1').decode() + f':{count}'
+                   for value, count in ((strong[0], 3), (strong[1], 50)))
+    corpus_path.write_text('\n'.join(lines) + '\n', encoding='ascii')
+    with _breach.HashCorpus(corpus_path) as corpus:
+        report = a.audit([[('a', strong[0]), ('b', strong[1]), ('c', strong[2])]], corpus)
+    assert report['corpus'] == str(corpus_path)
+    assert [(finding['name'], finding['breached']) for finding in report['findings']] == [('b', 50), ('a', 3)]
+    assert a.describe(report['findings'][0]) == "seen 50 times in breaches"
+
+@pytest.mark.parametrize('policy, message', [
+    ({'max_length': 3}, 'unknown policy settings'),
+    ({'min_score': 5}, 'min_score'),
+    ({'min_classes': 0}, 'min_classes'),
+])
+def test_bad_policies_are_refused(policy, message):
+    with pytest.raises(a.PolicyError, match=message):
+        a.audit([], policy=policy)
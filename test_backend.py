@@ -0,0 +1,350 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import _backend as b
+from _search import SearchIndex
+
+
+def test_journal_edits_survive_compaction(vault):
+    b.add_passwords_to_vault({'old': 'v0'})
+    b.set_password_in_vault('a', 'v1')
+    b.delete_password_from_vault('old')
+    b.flush_writes(sync=True)
+    assert b.compact_vault()
+    b._records_cache = None
+    assert b.get_passwords_from_vault() == {'a': 'v1'}
+
+
+def test_compaction_drops_its_fold_when_the_snapshot_changed(vault, monkeypatch):
+    b.add_passwords_to_vault({'old': 'v0'})
+    b.set_password_in_vault('journaled', 'v1')
+    b.flush_writes(sync=True)
+
+    # hold the compaction between its two phases, while a bulk write lands
+    folding, resume = threading.Event(), threading.Event()
+    fold_journal = b.fold_journal
+
+    def slow_fold(records, journal):
+        if threading.current_thread().name == 'compaction':
+            folding.set()
+            resume.wait(5)
+        return fold_journal(records, journal)
+
+    monkeypatch.setattr(b, 'fold_journal', slow_fold)
+    result = []
+    thread = threading.Thread(target=lambda: result.append(b.compact_vault()), name='compaction')
+    thread.start()
+    assert folding.wait(5)
+    b.add_passwords_to_vault({'new1': 'v2', 'new2': 'v3'})
+    resume.set()
+    thread.join(5)
+
+    assert result == [False]
+    b._records_cache = None
+    assert set(b.get_passwords_from_vault()) == {'new1', 'new2'}
+
+
+def test_compaction_keeps_edits_appended_while_folding(vault, monkeypatch):
+    b.set_password_in_vault('a', 'v1')
+    b.flush_writes(sync=True)
+
+    folding, resume = threading.Event(), threading.Event()
+    fold_journal = b.fold_journal
+
+    def slow_fold(records, journal):
+        if threading.current_thread().name == 'compaction':
+            folding.set()
+            resume.wait(5)
+        return fold_journal(records, journal)
+
+    monkeypatch.setattr(b, 'fold_journal', slow_fold)
+    thread = threading.Thread(target=b.compact_vault, name='compaction')
+    thread.start()
+    assert folding.wait(5)
+    b.set_password_in_vault('b', 'v2')
+    b.flush_writes(sync=True)
+    resume.set()
+    thread.join(5)
+
+    b._records_cache = None
+    assert b.get_passwords_from_vault() == {'a': 'v1', 'b': 'v2'}
+
+
+def test_loaded_records_do_not_change_under_the_caller(vault):
+    b.add_passwords_to_vault({'a': 'v1'})
+    records = b.load_vault_records()
+    before = dict(records)
+    b.set_password_in_vault('b', 'v2')
+    b.delete_password_from_vault('a')
+    b.flush_writes(sync=True)
+    assert records == before
+    assert set(b.get_passwords_from_vault()) == {'b'}
+
+
+def test_batches_keep_their_order_across_key_rotation(vault):
+    texts = [f'text-{i}' for i in range(3000)]
+    tokens = b.encrypt_many(texts)
+    b.rotate_data_key()
+    tokens += b.encrypt_many(['newest'])
+    assert [text.decode() for text in b.decrypt_many(tokens)] == texts + ['newest']
+
+
+def test_a_login_without_a_master_password_fails(vault):
+    assert b.app_pass_is_correct('Xk9#mq2!vLp7-test')
+    assert not b.app_pass_is_correct('wrong')
+    b.get_app_pass_store().delete()
+    assert not b.app_pass_exists()
+    assert not b.app_pass_is_correct('Xk9#mq2!vLp7-test')
+
+
+def test_switching_profiles_compacts_without_deadlocking(vault, monkeypatch):
+    # the flush on the way out starts a compaction, which needs the lock the switch holds
+    monkeypatch.setattr(b, 'JOURNAL_COMPACT_MIN_BYTES', 1)
+    monkeypatch.setattr(b, 'JOURNAL_COMPACT_RATIO', 0)
+    b.set_durability('close')
+    b.add_passwords_to_vault({'a': 'v1'})
+    b.set_password_in_vault('b', 'v2')
+    b.create_profile('other')
+
+    switch = threading.Thread(target=b.use_profile, args=('other',), daemon=True)
+    switch.start()
+    switch.join(10)
+    assert not switch.is_alive()
+    assert b.get_profile() == 'other'
+
+    assert b.use_profile(b.DEFAULT_PROFILE)
+    assert not b.journal_needs_compaction()
+    b._records_cache = None
+    assert b.get_passwords_from_vault() == {'a': 'v1', 'b': 'v2'}
+
+
+@pytest.mark.parametrize('name, fields', [
+    ('github.com (alice)', {'username': 'alice', 'url': 'github.com'}),
+    ('https://github.com/login', {'url': 'https://github.com/login'}),
+    ('alice@example.com', {'username': 'alice@example.com'}),
+    ('My Bank (old)', {}),
+    ('plain', {}),
+])
+def test_fields_from_name(name, fields):
+    assert b.fields_from_name(name) == fields
+
+def test_a_legacy_json_vault_gets_its_fields(vault):
+    # the oldest layout: encrypted names mapped straight to encrypted values
+    names = ['github.com (alice)', 'https://bank.example.com/login', 'bob@mail.example.com', 'plain']
+    tokens = b.encrypt_many(names + ['v1', 'v2', 'v3', 'v4'])
+    for file_name in (b.VAULT_FILE_NAME, b.JOURNAL_FILE_NAME):
+        (vault / file_name).unlink(missing_ok=True)
+    (vault / b.LEGACY_VAULT_FILE_NAME).write_text(json.dumps(dict(zip(tokens[:4], tokens[4:]))))
+    b._records_cache = None
+
+    b.initiate_files()
+    assert not (vault / b.LEGACY_VAULT_FILE_NAME).exists()
+    assert b.get_passwords_from_vault() == dict(zip(names, ['v1', 'v2', 'v3', 'v4']))
+    assert b.get_password_from_vault('github.com (alice)', 'username') == 'alice'
+    assert b.get_password_from_vault('github.com (alice)', 'url') == 'github.com'
+    assert b.get_password_from_vault('https://bank.example.com/login', 'url') == 'https://bank.example.com/login'
+    assert b.get_password_from_vault('bob@mail.example.com', 'username') == 'bob@mail.example.com'
+    assert b.get_password_from_vault('plain', 'username') == ''
+    assert b.migrate_vault_file() == 0
+
+def test_entries_are_found_by_their_fields(vault):
+    b.set_entry_in_vault('gh', 'pw', {'username': 'Alice', 'url': 'https://gist.GitHub.com/x', 'tags': 'Work, personal'})
+    b.set_entry_in_vault('gl', 'pw', {'username': 'bob', 'url': 'gitlab.com', 'tags': 'work'})
+    b.set_entry_in_vault('bank', 'pw')
+
+    def found(*filters, query=''):
+        entries = b.get_entries_from_vault()
+        index = SearchIndex(entries, {name: entry.terms for name, entry in entries.items()})
+        return index.search(query, terms=b.query_terms(filters))
+
+    assert found(('tag', 'work')) == ['gh', 'gl']
+    assert found(('tag', ' WORK '), ('user', 'alice')) == ['gh']
+    assert found(('host', 'github.com')) == ['gh']
+    assert found(('host', 'https://www.gitlab.com/')) == ['gl']
+    assert found(('tag', 'work'), query='gl') == ['gl']
+    assert found(('tag', 'nope')) == []
+
+    # an edit moves the entry between filters, the other fields stay
+    b.set_entry_in_vault('gl', fields={'tags': 'home'})
+    assert found(('tag', 'work')) == ['gh']
+    assert found(('tag', 'home'), ('user', 'bob')) == ['gl']
+    with pytest.raises(ValueError, match='unknown filter'):
+        b.query_terms([('color', 'red')])
+
+
+def test_hash_records():
+    params = {'algorithm': 'scrypt', 'n': 2 ** 15, 'r': 8, 'p': 1}
+    record = b.format_hash_record(params, 'a' * b.HASH_SALT_LENGTH, 'ab' * 32)
+    assert record == f"$scrypt$n=32768,r=8,p=1${'a' * b.HASH_SALT_LENGTH}${'ab' * 32}"
+    assert b.parse_hash_record(record) == (params, 'a' * b.HASH_SALT_LENGTH, 'ab' * 32)
+    # the records from before: the salt straight followed by a pbkdf2 digest
+    assert b.parse_hash_record('s' * b.HASH_SALT_LENGTH + 'cd' * 32) == (b.KDF_LEGACY_PARAMS, 's' * b.HASH_SALT_LENGTH, 'cd' * 32)
+
+@pytest.mark.parametrize('record', [
+    '',
+    '$scrypt$n=16384$salt',
+    '$scrypt$n=16384$salt$' + 'ab' * 32 + '$',
+    '$scrypt$n=lots$salt$' + 'ab' * 32,
+    '$scrypt$n$salt$' + 'ab' * 32,
+    '$scrypt$n=16384$$' + 'ab' * 32,
+    '$$n=16384$salt$' + 'ab' * 32,
+    '$scrypt$n=16384$salt$' + 'zz' * 32,
+    's' * 20 + 'ab' * 20,
+])
+def test_malformed_hash_records_are_refused(record):
+    with pytest.raises(ValueError, match='malformed'):
+        b.parse_hash_record(record)
+
+def test_a_legacy_hash_still_logs_in_and_is_moved_to_the_current_parameters(vault):
+    salt = b.generate_salt()
+    legacy = salt + b.run_kdf('Xk9#mq2!vLp7-test', salt, b.KDF_LEGACY_PARAMS).hex()
+    b.get_app_pass_store().set(legacy)
+
+    assert not b.app_pass_is_correct('wrong')
+    assert b.get_app_pass_record() == legacy
+    assert b.app_pass_is_correct('Xk9#mq2!vLp7-test')
+    params, new_salt, _ = b.parse_hash_record(b.get_app_pass_record())
+    assert params == b.get_kdf_params() and new_salt != salt
+    assert b.app_pass_is_correct('Xk9#mq2!vLp7-test')
+
+def test_a_login_rehashes_when_the_parameters_changed(vault):
+    record = b.get_app_pass_record()
+    b.set_setting('kdf', {'algorithm': 'scrypt', 'n': 2 ** 15, 'r': 8, 'p': 1})
+    assert not b.app_pass_is_correct('wrong')
+    assert b.get_app_pass_record() == record
+    assert b.app_pass_is_correct('Xk9#mq2!vLp7-test')
+    assert b.get_app_pass_record().startswith('$scrypt$n=32768,r=8,p=1$')
+
+    # nothing changes while they stay the same
+    record = b.get_app_pass_record()
+    assert b.app_pass_is_correct('Xk9#mq2!vLp7-test')
+    assert b.get_app_pass_record() == record
+
+def test_a_malformed_record_fails_the_login_instead_of_matching(vault):
+    b.get_app_pass_store().set('$scrypt$n=16384$broken')
+    with pytest.raises(ValueError, match='malformed'):
+        b.app_pass_is_correct('Xk9#mq2!vLp7-test')
+
+
+def journaled_indexes() -> set[str]:
+    return {entry['idx'] for entry in b.read_journal()[0]}
+
+def test_batched_edits_reach_the_disk_once_the_timer_fires(vault, monkeypatch):
+    monkeypatch.setattr(b, 'WRITE_COALESCE_SECONDS', 0.05)
+    b.set_durability('batched')
+    b.set_password_in_vault('a', 'v1')
+    b.set_password_in_vault('a', 'v2')
+    assert b.name_index('a') not in journaled_indexes()
+    assert b.get_password_from_vault('a') == 'v2'  # lookups see what is still pending
+
+    timer = b._flush_timer
+    timer.join(5)
+    assert not timer.is_alive() and b._flush_timer is None
+    assert [entry['idx'] for entry in b.read_journal()[0]].count(b.name_index('a')) == 1
+    assert not b._unsynced_journal
+    b._records_cache = None
+    assert b.get_password_from_vault('a') == 'v2'
+
+def test_batched_edits_are_written_on_exit(vault):
+    # the timer never gets to fire, the atexit hook writes the edit
+    script = ("import _backend as b; b.initiate_files(); b.unlock_session(); "
+              "b.WRITE_COALESCE_SECONDS = 60; b.set_durability('batched'); b.set_password_in_vault('a', 'v1')")
+    subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(__file__), check=True, timeout=60)
+    assert b.name_index('a') in journaled_indexes()
+    b._records_cache = None
+    assert b.get_password_from_vault('a') == 'v1'
+
+def test_close_mode_writes_and_syncs_on_lock(vault, monkeypatch):
+    monkeypatch.setattr(b, 'WRITE_COALESCE_SECONDS', 60)
+    b.set_durability('close')
+    b.set_password_in_vault('a', 'v1')
+    b.flush_writes()
+    assert b.name_index('a') in journaled_indexes() and b._unsynced_journal
+
+    b.set_password_in_vault('b', 'v2')
+    assert b.name_index('b') not in journaled_indexes()
+    synced = []
+    with monkeypatch.context() as patch:
+        patch.setattr(b.os, 'fsync', lambda fd: synced.append(fd))
+        b.lock_session()
+    assert synced and not b._unsynced_journal and not b._pending_writes
+    assert {b.name_index('a'), b.name_index('b')} <= journaled_indexes()
+
+
+def test_a_fourth_unlocked_profile_locks_the_least_recently_used(vault):
+    for name in ('a', 'b', 'c'):
+        b.create_profile(name)
+    default_keys = b._session_keys + [b._session_index_key]
+    assert all(isinstance(key, bytearray) and any(key) for key in default_keys)
+
+    for name in ('a', 'b'):
+        assert not b.use_profile(name)
+        b.initiate_files()
+        b.unlock_session()
+    assert list(b._unlocked_vaults) == [b.DEFAULT_PROFILE, 'a']
+    b.use_profile('c')
+    b.initiate_files()
+    b.unlock_session()
+
+    # three unlocked at most, counting the current one: the default profile went first
+    assert list(b._unlocked_vaults) == ['a', 'b']
+    assert all(not any(key) for key in default_keys)
+    assert b.use_profile('a')
+    assert list(b._unlocked_vaults) == ['b', 'c']
+    assert not b.use_profile(b.DEFAULT_PROFILE)
+    assert list(b._unlocked_vaults) == ['c', 'a']
+
+
+def test_locking_wipes_the_keys_and_drops_the_cipher(vault, monkeypatch):
+    b.set_password_in_vault('a', 'v1')
+    buffers = b._session_keys + [b._session_index_key]
+    b.lock_session()
+    assert not b.session_is_unlocked() and b._session_cipher is None
+    assert b._session_keys is None and b._session_index_key is None
+    assert all(not any(buffer) for buffer in buffers)
+
+    # without a session every call reads the key file again, and doesn't unlock one
+    monkeypatch.setattr(b._metrics, 'enabled', True)
+    b._metrics.reset()
+    assert b.get_password_from_vault('a') == 'v1'
+    assert b._metrics.report()['counters']['key_file.reads'] >= 1
+    assert not b.session_is_unlocked()
+
+    b.unlock_session()
+    b._metrics.reset()
+    assert b.get_password_from_vault('a') == 'v1'
+    assert 'key_file.reads' not in b._metrics.report()['counters']
+    b._metrics.reset()
+
+def test_a_lookup_racing_the_lock_never_sees_a_wiped_key(vault):
+    b.set_password_in_vault('a', 'v1')
+    expected = b.name_index('a'), b.get_data_keys()
+    seen, errors, done = [], [], threading.Event()
+
+    def lookups():
+        while not done.is_set():
+            try:
+                seen.append((b.name_index('a'), b.get_data_keys()))
+                b.get_cipher().encrypt(b'text')
+            except Exception as exc:
+                errors.append(exc)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    thread = threading.Thread(target=lookups)
+    thread.start()
+    try:
+        for _ in range(1000):
+            b.lock_session()
+            b.unlock_session()
+    finally:
+        done.set()
+        thread.join()
+        sys.setswitchinterval(interval)
+    assert seen and errors == []
+    assert all(keys == expected for keys in seen)
@@ -0,0 +1,85 @@
+import hashlib
+import os
+
+import _backup as bk
+import _vaultfile as vf
+
+
+def make_records(start: int, count: int) -> list[tuple[bytes, int, list[bytes]]]:
+    return [(hashlib.sha256(b'%d' % i).digest(), 0, [b'name%d' % i, b'value%d' % i]) for i in range(start, start + count)]
+
+def write_vault(file_path, records, version: int) -> None:
+    with open(file_path, 'wb') as f:
+        vf.write_vault_file(f, records)
+    # a distinct mtime for every version, so the snapshot never takes it for unchanged
+    os.utime(file_path, ns=(version * 10 ** 9, version * 10 ** 9))
+
+def read_vault(file_path) -> list[tuple[bytes, int, list[bytes]]]:
+    with vf.VaultReader(file_path) as reader:
+        return [(idx, flags, [bytes(field) for field in fields]) for idx, flags, fields in reader]
+
+
+def test_file_digest_reads_in_blocks(tmp_path):
+    file_path = tmp_path / 'data'
+    data = os.urandom(bk.BLOCK_SIZE * 2 + 123)
+    file_path.write_bytes(data)
+    assert bk.file_digest(file_path) == hashlib.sha256(data).hexdigest()
+
+def test_restore_takes_the_newest_generation_that_verifies(tmp_path):
+    store = bk.BackupStore(tmp_path / 'backups')
+    vault, journal = tmp_path / 'vault.pmv', tmp_path / 'journal'
+    files = {'vault': (vault, bk.KIND_VAULT), 'journal': (journal, bk.KIND_BLOCKS)}
+    write_vault(vault, make_records(0, 100), 1)
+    assert store.snapshot(files) == 1
+    assert store.snapshot(files) is None  # nothing changed
+
+    first = read_vault(vault)
+    write_vault(vault, make_records(0, 150), 2)
+    journal.write_bytes(b'edits\n')
+    assert store.snapshot(files) == 2
+
+    # damage a chunk only the newest generation has
+    old_chunks = set(store.read_manifest(1)['files']['vault']['chunks'])
+    damaged = next(digest for digest in store.latest()['files']['vault']['chunks'] if digest not in old_chunks)
+    store.object_path(damaged).write_bytes(b'rot')
+    assert store.verify() == [f"vault: corrupted backup object {damaged}"]
+
+    os.remove(vault)
+    assert store.restore({'vault': vault, 'journal': journal}, optional=('journal',)) == 1
+    assert read_vault(vault) == first
+    assert not journal.exists()  # the first generation had none, an edit on top of the newer vault can't stay
+    assert not (tmp_path / 'vault.pmv.restore').exists()
+
+def test_salvage_keeps_the_intact_chunks_of_a_damaged_backup(tmp_path):
+    store = bk.BackupStore(tmp_path / 'backups')
+    vault = tmp_path / 'vault.pmv'
+    write_vault(vault, make_records(0, 400), 1)
+    assert store.snapshot({'vault': (vault, bk.KIND_VAULT)}) == 1
+    records = read_vault(vault)
+    chunks = store.latest()['files']['vault']['chunks']
+    assert len(chunks) > 2
+
+    lost = list(vf.decode_records(store.get_object(chunks[1])))
+    os.remove(store.object_path(chunks[1]))
+    os.remove(vault)
+    assert store.restore({'vault': vault}) is None
+    assert store.salvage('vault', vault) == 1
+
+    salvaged = read_vault(vault)
+    assert len(salvaged) == len(records) - len(lost)
+    assert sorted(salvaged + lost) == sorted(records)
+
+def test_only_the_newest_generations_are_kept(tmp_path):
+    store = bk.BackupStore(tmp_path / 'backups')
+    vault = tmp_path / 'vault.pmv'
+    for version in range(1, 13):
+        write_vault(vault, make_records(version * 1000, 10), version)
+        assert store.snapshot({'vault': (vault, bk.KIND_VAULT)}) == version
+
+    assert store.keep == bk.KEEP_GENERATIONS == 10
+    assert store.generations() == list(range(3, 13))
+    # the objects of the dropped generations went with them
+    referenced = {digest for generation in store.generations()
+                  for digest in store.read_manifest(generation)['files']['vault']['chunks']}
+    assert {path.name for path in store.objects_dir.glob('*/*')} == referenced
+    assert all(store.verify(generation) == [] for generation in store.generations())
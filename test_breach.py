@@ -0,0 +1,82 @@
+import hashlib
+import os
+
+import pytest
+
+import _breach as br
+import _passgen
+
+
+def write_corpus(file_path, passwords: dict[str, int], kind: str = 'sha1', lowercase: bool = False):
+    lines = sorted(br.password_hash(password, kind).decode() + f':{count}' for password, count in passwords.items())
+    # upper case with CRLF like the Have I Been Pwned downloads, or lower case with LF
+    text = '\r\n'.join(lines) if not lowercase else '\n'.join(line.lower() for line in lines)
+    file_path.write_text(text + '\n', encoding='ascii')
+    return file_path
+
+@pytest.fixture
+def breached() -> dict[str, int]:
+    return {f'leaked-{i}': i + 1 for i in range(5000)}
+
+
+def test_md4():
+    assert br._md4(b'').hex() == '31d6cfe0d16ae931b73c59d7e0c089c0'
+    assert br._md4(b'abc').hex() == 'a448017aaf21d8525fc10ae87aa6729d'
+    assert br._md4(b'x' * 200) == br.md4(b'x' * 200)
+    assert br.password_hash('password', 'ntlm') == b'8846F7EAEE8FB117AD06BDD830B7586C'
+    assert br.password_hash('password', 'sha1') == hashlib.sha1(b'password').hexdigest().upper().encode()
+
+@pytest.mark.parametrize('kind, lowercase', [('sha1', False), ('sha1', True), ('ntlm', False)])
+def test_lookups_find_every_breached_password_and_nothing_else(tmp_path, breached, kind, lowercase):
+    with br.HashCorpus(write_corpus(tmp_path / 'corpus.txt', breached, kind, lowercase)) as corpus:
+        assert corpus.kind == kind
+        for password in list(breached)[::97]:
+            assert corpus.count(password) == breached[password]
+        assert corpus.count('never-leaked') == 0
+        passwords = list(breached)[:300] + [f'safe-{i}' for i in range(300)]
+        assert corpus.counts(passwords) == [breached.get(password, 0) for password in passwords]
+
+def test_the_bloom_filter_answers_the_same(tmp_path, breached):
+    corpus_path = write_corpus(tmp_path / 'corpus.txt', breached)
+    bloom_path = br.build_bloom(corpus_path)
+    assert bloom_path.name == 'corpus.txt' + br.BLOOM_SUFFIX
+    passwords = list(breached)[::7] + [f'safe-{i}' for i in range(2000)]
+    with br.HashCorpus(corpus_path) as corpus:
+        assert corpus.bloom is not None and corpus.bloom.items == len(breached)
+        assert corpus.counts(passwords) == [breached.get(password, 0) for password in passwords]
+
+    # a corpus changed after its filter was built doesn't use it
+    os.utime(corpus_path, (os.path.getmtime(bloom_path) + 10,) * 2)
+    with br.HashCorpus(corpus_path) as corpus:
+        assert corpus.bloom is None
+
+def test_counts_are_optional(tmp_path):
+    corpus_path = tmp_path / 'corpus.txt'
+    corpus_path.write_text(br.password_hash('hunter2', 'sha1').decode() + '\n', encoding='ascii')
+    with br.HashCorpus(corpus_path) as corpus:
+        assert corpus.count('hunter2') == 1
+
+@pytest.mark.parametrize('content', ['', 'not a hash:12\n', 'ABCDEF:1\n'])
+def test_bad_corpora_are_refused(tmp_path, content):
+    corpus_path = tmp_path / 'corpus.txt'
+    corpus_path.write_text(content, encoding='ascii')
+    with pytest.raises(br.CorpusError):
+        br.HashCorpus(corpus_path)
+
+@pytest.mark.parametrize('password, warning', [
+    ('password', 'common'),
+    ('P@ssw0rd', 'common'),
+    ('qwertyuiop', 'keyboard'),
+    ('abcdefgh12345', 'sequence'),
+    ('zzzzzzzzzzzz', 'repeat'),
+])
+def test_patterns_make_passwords_weak(password, warning):
+    strength = br.estimate_strength(password)
+    assert strength['score'] <= 1
+    assert br.WARNINGS[warning] in strength['warnings']
+
+def test_random_passwords_are_strong():
+    for password in _passgen.generate_passwords(20, {'length': 20}):
+        strength = br.estimate_strength(password)
+        assert strength['score'] == 4 and strength['label'] == br.STRENGTH_LABELS[4]
+    assert "shorter than 8 characters" in br.estimate_strength('Xk9#m')['warnings']
@@ -0,0 +1,82 @@
+import io
+import json
+
+import pytest
+
+import cli
+
+
+@pytest.fixture
+def run(vault, monkeypatch, capsys):
+    # runs the CLI in this process against the test vault, returning (exit code, stdout lines, stderr)
+    monkeypatch.setenv(cli.PASSWORD_ENV, 'Xk9#mq2!vLp7-test')
+    monkeypatch.delenv(cli.PROFILE_ENV, raising=False)
+
+    def run(*argv: str, stdin: str = None) -> tuple[int, list[str], str]:
+        capsys.readouterr()
+        with monkeypatch.context() as patch:
+            if stdin is not None:
+                patch.setattr('sys.stdin', io.StringIO(stdin))
+            code = cli.main(['--no-agent', *argv])
+        out, err = capsys.readouterr()
+        return code, out.splitlines(), err
+    return run
+
+
+def test_added_entries_can_be_read_back(run):
+    assert run('set', 'github', '--value', 'pw1', '--username', 'alice', '--tags', 'work')[0] == cli.EXIT_OK
+    assert run('set', 'bank', stdin='pw2\n') == (cli.EXIT_OK, ['bank'], '')
+
+    assert run('get', 'github') == (cli.EXIT_OK, ['pw1'], '')
+    assert run('get', 'github', '--field', 'username') == (cli.EXIT_OK, ['alice'], '')
+    assert run('get', '-', stdin='bank\ngithub\n') == (cli.EXIT_OK, ['pw2', 'pw1'], '')
+    code, lines, _ = run('--json', 'get', 'bank')
+    assert code == cli.EXIT_OK and json.loads(lines[0]) == {'name': 'bank', 'found': True, 'value': 'pw2'}
+
+def test_an_existing_entry_is_only_overwritten_with_force(run):
+    run('set', 'github', '--value', 'pw1', '--username', 'alice')
+    code, _, err = run('set', 'github', '--value', 'pw2')
+    assert code == cli.EXIT_USAGE and 'pass --force' in err
+    assert run('get', 'github')[1] == ['pw1']
+
+    assert run('set', 'github', '--value', 'pw2', '--force')[0] == cli.EXIT_OK
+    assert run('get', 'github')[1] == ['pw2']
+    assert run('get', 'github', '--field', 'username')[1] == ['alice']  # fields not given are kept
+
+def test_list(run):
+    for name, tags in (('github', 'work'), ('Bank', ''), ('gitlab', 'work,code')):
+        run('set', name, '--value', 'pw', '--tags', tags)
+    assert run('list') == (cli.EXIT_OK, ['Bank', 'github', 'gitlab'], '')
+    assert run('list', '--tag', 'work')[1] == ['github', 'gitlab']
+    assert run('list', '--tag', 'code', '--tag', 'work')[1] == ['gitlab']
+    assert run('list', '--tag', 'none')[1] == []
+    code, lines, _ = run('--json', 'list')
+    assert [json.loads(line) for line in lines] == [{'name': 'Bank'}, {'name': 'github'}, {'name': 'gitlab'}]
+
+def test_missing_entries_exit_with_not_found(run):
+    run('set', 'github', '--value', 'pw1')
+    code, lines, err = run('get', 'github', 'nothing')
+    assert code == cli.EXIT_NOT_FOUND
+    assert lines == ['pw1'] and err == "not found: nothing\n"
+    code, lines, _ = run('--json', 'get', 'nothing')
+    assert code == cli.EXIT_NOT_FOUND and json.loads(lines[0]) == {'name': 'nothing', 'found': False}
+
+@pytest.mark.parametrize('argv, stdin, message', [
+    (('set', 'github'), '\n', 'empty value'),
+    (('--profile', 'nobody', 'list'), None, "no profile named 'nobody'"),
+    (('edit', 'github'), None, 'nothing to change'),
+])
+def test_usage_errors(run, argv, stdin, message):
+    code, lines, err = run(*argv, stdin=stdin)
+    assert code == cli.EXIT_USAGE and lines == []
+    assert err.startswith('error: ') and message in err
+
+def test_bad_arguments_exit_with_usage(run):
+    with pytest.raises(SystemExit) as exc:
+        run('get')
+    assert exc.value.code == cli.EXIT_USAGE
+
+def test_a_wrong_master_password_is_refused(run, monkeypatch):
+    monkeypatch.setenv(cli.PASSWORD_ENV, 'wrong')
+    code, lines, err = run('list')
+    assert code == cli.EXIT_AUTH and lines == [] and 'wrong master password' in err
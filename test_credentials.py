@@ -0,0 +1,75 @@
+import os
+
+import _backend as b
+import _credentials as c
+import _metrics
+
+
+class CountingKeyring(c.FileKeyring):
+    def __init__(self, file_path):
+        super().__init__(file_path)
+        self.gets = 0
+
+    def get_password(self, service, username):
+        self.gets += 1
+        return super().get_password(service, username)
+
+
+def test_file_keyring(tmp_path):
+    keyring = c.FileKeyring(tmp_path / c.FILE_KEYRING_NAME)
+    assert keyring.get_password('service', 'alice') is None
+    keyring.set_password('service', 'alice', 'secret')
+    keyring.set_password('service', 'bob', 'other')
+    keyring.set_password('elsewhere', 'alice', 'third')
+    assert os.stat(keyring.file_path).st_mode & 0o777 == 0o600
+
+    # a second instance reads what the first one wrote
+    keyring = c.FileKeyring(tmp_path / c.FILE_KEYRING_NAME)
+    assert keyring.get_password('service', 'alice') == 'secret'
+    keyring.delete_password('service', 'alice')
+    keyring.delete_password('service', 'nobody')
+    assert keyring.get_password('service', 'alice') is None
+    assert keyring.get_password('service', 'bob') == 'other'
+    assert keyring.get_password('elsewhere', 'alice') == 'third'
+    assert not (tmp_path / (c.FILE_KEYRING_NAME + '.tmp')).exists()
+
+def test_the_store_fetches_once_until_invalidated(tmp_path, monkeypatch):
+    keyring = CountingKeyring(tmp_path / c.FILE_KEYRING_NAME)
+    keyring.set_password('service', 'alice', 'secret')
+    store = c.CredentialStore('service', 'alice', keyring)
+    assert [store.get() for _ in range(5)] == ['secret'] * 5
+    assert keyring.gets == 1
+
+    store.set('changed')
+    store.delete()
+    assert store.get() is None and keyring.gets == 1
+    store.delete()  # nothing left to delete, the keyring isn't asked
+
+    store.invalidate()
+    keyring.set_password('service', 'alice', 'from outside')
+    assert store.get() == 'from outside' and keyring.gets == 2
+
+    monkeypatch.setattr(_metrics, 'enabled', True)
+    _metrics.reset()
+    store.invalidate()
+    store.get()
+    assert _metrics.report()['spans']['keyring.get']['calls'] == 1
+    _metrics.reset()
+
+def test_the_keyring_is_asked_once_per_session(vault, monkeypatch):
+    keyring = CountingKeyring(os.environ[c.FILE_ENV])
+    monkeypatch.setattr(c, '_backend', keyring)
+    b.lock_session()
+    b.restore_session(None)
+
+    assert b.app_pass_exists()
+    assert b.app_pass_is_correct('Xk9#mq2!vLp7-test')
+    assert not b.app_pass_is_correct('wrong')
+    b.unlock_session()
+    b.get_salt_from_keyring()
+    assert keyring.gets == 1
+
+    # locking forgets the record, the next login asks again
+    b.lock_session()
+    assert b.app_pass_is_correct('Xk9#mq2!vLp7-test')
+    assert keyring.gets == 2
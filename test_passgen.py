@@ -0,0 +1,69 @@
+import math
+from collections import Counter
+from itertools import product
+
+import pytest
+
+import _passgen as pg
+
+
+def count_by_brute_force(classes: list[tuple[str, int]], length: int) -> int:
+    alphabet = ''.join(chars for chars, _ in classes)
+    return sum(all(sum(char in chars for char in text) >= minimum for chars, minimum in classes)
+               for text in product(alphabet, repeat=length))
+
+def test_valid_passwords_are_counted_exactly():
+    classes = [('ab', 1), ('c', 2), ('de', 0)]
+    for length in range(6):
+        assert pg.count_valid(classes, length)[0][length] == count_by_brute_force(classes, length)
+
+@pytest.mark.parametrize('policy', [
+    {'length': 16, 'classes': {'upper': 1, 'lower': 1, 'digits': 2, 'special': 1}},
+    {'length': 12, 'classes': {'upper': 2, 'lower': 2, 'digits': 4, 'special': 4}},  # rare enough for the exact path
+    {'length': 8, 'classes': {'lower': 0, 'digits': 0}, 'exclude': pg.AMBIGUOUS_CHARACTERS},
+])
+def test_passwords_follow_their_policy(policy):
+    generator = pg.PasswordGenerator(policy)
+    passwords = generator.generate(300)
+    assert len(passwords) == 300 and len(set(passwords)) == 300
+    for password in passwords:
+        assert len(password) == policy['length']
+        assert set(password) <= set(generator.alphabet)
+        assert not set(password) & set(policy.get('exclude', ''))
+        for name, minimum in policy['classes'].items():
+            assert sum(char in pg.CHARACTER_CLASSES[name] for char in password) >= minimum
+
+def test_the_exact_path_is_taken_for_strict_policies():
+    strict = pg.PasswordGenerator({'length': 12, 'classes': {'upper': 2, 'lower': 2, 'digits': 4, 'special': 4}})
+    assert strict.acceptance < pg.MIN_ACCEPTANCE
+    assert pg.PasswordGenerator().acceptance >= pg.MIN_ACCEPTANCE
+
+def test_characters_are_uniform():
+    # 40 000 draws over 10 digits: every digit within 7.5% (five standard deviations) of its expected 4 000
+    counts = Counter(pg.RandomSource().characters(pg.DIGITS, 40_000))
+    assert set(counts) == set(pg.DIGITS)
+    assert all(abs(count - 4_000) < 300 for count in counts.values())
+
+def test_passphrases(tmp_path):
+    word_list = tmp_path / 'words.txt'
+    word_list.write_text('alpha beta gamma delta alpha\n', encoding='utf-8')
+    policy = {'mode': 'passphrase', 'words': 5, 'separator': ' ', 'capitalize': True, 'word_list': str(word_list)}
+    generator = pg.PasswordGenerator(policy)
+    assert generator.entropy == pytest.approx(5 * math.log2(4))
+    for phrase in generator.generate(50):
+        words = phrase.split(' ')
+        assert len(words) == 5 and set(words) <= {'Alpha', 'Beta', 'Gamma', 'Delta'}
+
+@pytest.mark.parametrize('policy, message', [
+    ({'mode': 'pin'}, 'unknown mode'),
+    ({'classes': {'emoji': 1}}, 'unknown character classes'),
+    ({'classes': {}}, 'at least one'),
+    ({'length': 0}, 'between 1 and'),
+    ({'length': 3, 'classes': {'digits': 4}}, 'shorter than'),
+    ({'classes': {'digits': -1}}, 'negative'),
+    ({'classes': {'digits': 1}, 'exclude': pg.DIGITS}, 'every digits character is excluded'),
+    ({'mode': 'passphrase', 'words': 0}, 'words'),
+])
+def test_impossible_policies_are_refused(policy, message):
+    with pytest.raises(pg.PolicyError, match=message):
+        pg.PasswordGenerator(policy)
@@ -0,0 +1,72 @@
+import pytest
+
+import _backend as b
+import _rekey
+
+
+@pytest.fixture
+def values(vault) -> dict[str, str]:
+    values = {f'name{i}': f'value{i}' for i in range(50)}
+    b.add_passwords_to_vault(values)
+    return values
+
+def current_records() -> int:
+    key = b.get_data_keys()[0]
+    return sum(b.record_is_current(record, key) for record in b.load_vault_records().values())
+
+
+def test_records_under_the_old_key_stay_readable(values):
+    old_key = b.get_data_keys()[0]
+    _rekey.start()
+    keys = b.get_data_keys()
+    assert len(keys) == 2 and keys[1] == old_key
+    assert current_records() == 0
+    assert b.get_passwords_from_vault() == values
+
+    # half way through, both kinds are read through the ring
+    _rekey.step(chunk_size=25)
+    assert current_records() == 25
+    b._records_cache = None
+    assert b.get_passwords_from_vault() == values
+    assert _rekey.status()['pending']
+
+def test_an_interrupted_pass_resumes_from_its_checkpoint(values, monkeypatch):
+    _rekey.start()
+    _rekey.step(chunk_size=20)
+    checkpoint = _rekey.read_state()
+    assert checkpoint['reencrypted'] == 20 and checkpoint['position']
+
+    # the next chunk dies before anything of it reaches the journal
+    def crash(records, sync=True):
+        raise OSError("disk gone")
+    with monkeypatch.context() as patch:
+        patch.setattr(b, 'append_to_journal', crash)
+        with pytest.raises(OSError):
+            _rekey.step(chunk_size=20)
+    assert _rekey.read_state() == checkpoint
+    assert current_records() == 20
+
+    result = _rekey.run()
+    assert not result['pending'] and result['keys'] == 1
+    assert not _rekey.get_state_path().exists()
+    assert current_records() == 50
+    assert b.get_passwords_from_vault() == values
+
+def test_old_keys_are_kept_until_every_record_is_current(values):
+    _rekey.start()
+    old_cipher = b.make_cipher(b.get_data_keys()[1])
+    _rekey.step(chunk_size=20)
+    _rekey.step(chunk_size=20)
+    position = _rekey.read_state()['position']
+
+    # another process, still on the old key, writes an entry the pass has already gone by
+    name = next(f'late{i}' for i in range(10_000) if b.name_index(f'late{i}') < position)
+    b.queue_journal_record(b.journal_entry(b.name_index(name), b.encrypt_record(name, 'late', old_cipher)))
+    b.flush_writes(sync=True)
+
+    result = _rekey.step(chunk_size=20)  # the end of the pass finds it, and goes round again
+    assert result['pending'] and result['keys'] == 2 and result['position'] == ''
+    result = _rekey.run()
+    assert result['keys'] == 1
+    assert current_records() == 51
+    assert b.get_passwords_from_vault() == {**values, name: 'late'}
@@ -0,0 +1,72 @@
+import pytest
+
+import _backend as b
+import _rotation
+import cli
+
+
+@pytest.fixture
+def values(vault) -> dict[str, str]:
+    values = {'svc-db': 'old-db', 'svc-web': 'old-web', 'svc-mail': 'old-mail', 'personal': 'old-personal'}
+    b.add_passwords_to_vault(values)
+    return values
+
+
+def test_old_values_are_kept_until_confirm(values):
+    rotated = _rotation.rotate('SVC-*')
+    assert sorted(rotated) == ['svc-db', 'svc-mail', 'svc-web']
+    assert all(len(value) == _rotation.DEFAULT_POLICY['length'] for value in rotated.values())
+    assert b.get_passwords_from_vault() == {**values, **rotated}
+
+    assert _rotation.pending_rotation()['count'] == 3
+    assert _rotation.previous_password('svc-db') == 'old-db'
+    assert _rotation.previous_password('personal') is None
+    with pytest.raises(_rotation.RotationError):
+        _rotation.rotate('personal')
+
+    assert _rotation.confirm() == 3
+    assert not _rotation.get_rotation_path().exists()
+    assert _rotation.previous_password('svc-db') is None
+    with pytest.raises(_rotation.RotationError):
+        _rotation.rollback()
+
+def test_entries_are_picked_by_age(values):
+    assert _rotation.preview(older_than=3600) == []
+    assert _rotation.preview(older_than=0) == sorted(values, key=str.lower)
+
+def test_a_failed_write_leaves_the_vault_as_it_was(values, monkeypatch):
+    def write_half(f, records):
+        f.write(b'half a vault')
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(b.vf, 'write_vault_file', write_half)
+        with pytest.raises(OSError):
+            _rotation.rotate('svc-*')
+
+    b._records_cache = None
+    assert b.get_passwords_from_vault() == values
+    # the old values went to vault.rotation first; nothing holds a rotated value, so nothing is restored
+    assert _rotation.previous_password('svc-web') == 'old-web'
+    assert _rotation.rollback() == {'restored': 0, 'kept': 3}
+    assert b.get_passwords_from_vault() == values
+
+def test_rollback_keeps_entries_edited_since(values):
+    _rotation.rotate('svc-*')
+    b.set_password_in_vault('svc-web', 'edited')
+    b.set_entry_in_vault('svc-db', fields={'notes': 'moved to the new cluster'})
+    b.delete_password_from_vault('svc-mail')
+
+    assert _rotation.rollback(['svc-db']) == {'restored': 1, 'kept': 0}
+    assert _rotation.pending_rotation()['count'] == 2
+    assert _rotation.rollback() == {'restored': 0, 'kept': 2}
+    assert _rotation.pending_rotation() is None
+
+    b._records_cache = None
+    assert b.get_passwords_from_vault() == {'svc-db': 'old-db', 'svc-web': 'edited', 'personal': 'old-personal'}
+    assert b.get_password_from_vault('svc-db', 'notes') == 'moved to the new cluster'
+
+def test_the_cli_wants_a_selector(values, capsys):
+    assert cli.main(['rotate', 'start']) == cli.EXIT_USAGE
+    assert '--all' in capsys.readouterr().err
+    assert _rotation.pending_rotation() is None
@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+from _search import SearchIndex, edit_distance, parse_query
+
+
+WORDS = ['git', 'mail', 'bank', 'home', 'work', 'shop', 'cloud', 'news', 'a', 'ab']
+
+def make_names(count: int) -> list[str]:
+    rng = random.Random(7)
+    names = (f'{rng.choice(WORDS)}{rng.choice("-. _")}{rng.choice(WORDS)}{rng.randrange(1000)}'.title()
+             if i % 5 else rng.choice(WORDS) + str(i) for i in range(count))
+    return list(dict.fromkeys(names))
+
+def ranked(index: SearchIndex, names: list[str], query: str) -> list[str]:
+    # the whole ranking the long way: every hit, by tier then (length, lowercase, name)
+    lower = query.lower()
+    hits = [name for name in names if lower in name.lower()]
+    return sorted(hits, key=lambda name: (index.rank(query, name), len(name), name.lower(), name))
+
+
+def test_tiers_come_in_order():
+    index = SearchIndex(['git', 'GitHub', 'my-git', 'legit', 'gitlab.com', 'mail'])
+    assert index.search('git', fuzzy=False) == ['git', 'GitHub', 'gitlab.com', 'my-git', 'legit']
+    assert index.search('GIT', fuzzy=False, limit=2) == ['git', 'GitHub']
+    assert index.search('') == ['git', 'GitHub', 'gitlab.com', 'legit', 'mail', 'my-git']
+    assert index.search('', limit=2) == ['git', 'GitHub']
+
+@pytest.mark.parametrize('query', ['a', 'g', 'gi', 'git', 'mail-', 'o', 'work', 'k1', 'zz', 'Bank Home'])
+def test_a_limit_returns_the_start_of_the_full_ranking(query):
+    names = make_names(3000)
+    index = SearchIndex(names)
+    expected = ranked(index, names, query)
+    assert index.search(query, fuzzy=False) == expected
+    for limit in (1, 7, 50, 400):
+        assert index.search(query, fuzzy=False, limit=limit) == expected[:limit]
+
+def test_added_and_removed_names_are_found_or_not():
+    names = make_names(500)
+    index = SearchIndex(names[:250])
+    for name in names[250:]:
+        index.add(name)
+    for name in names[:100]:
+        index.remove(name)
+    rest = names[100:]
+    assert len(index) == len(rest) and names[0] not in index
+    for query in ('a', 'git', 'home-', 'o'):
+        assert index.search(query, fuzzy=False) == ranked(index, rest, query)
+        assert index.search(query, fuzzy=False, limit=10) == ranked(index, rest, query)[:10]
+
+def test_terms_narrow_the_search():
+    index = SearchIndex(['github', 'gitlab', 'mail'], {'github': [b'work'], 'gitlab': [b'work', b'alice']})
+    assert index.search('', terms=[b'work']) == ['github', 'gitlab']
+    assert index.search('git', terms=[b'alice']) == ['gitlab']
+    assert index.search('it', terms=[b'work'], limit=1) == ['github']
+    index.set_terms('github', [b'alice'])
+    assert index.search('', terms=[b'work', b'alice']) == ['gitlab']
+    assert index.search('mail', terms=[b'nobody']) == []
+
+def test_typos_are_found_after_the_hits():
+    index = SearchIndex(['github', 'gitlab', 'paypal', 'my bank'])
+    assert index.search('githbu') == ['github']
+    assert index.search('paypla') == ['paypal']
+    assert index.search('gitlab', limit=5) == ['gitlab']
+    assert index.search('githbu', fuzzy=False) == []
+
+def test_parse_query():
+    assert parse_query('git  tag:work user:alice  hub') == ('git hub', [('tag', 'work'), ('user', 'alice')])
+    assert parse_query('host:github.com') == ('', [('host', 'github.com')])
+
+def reference_distance(a: str, b: str) -> int:
+    d = [[i + j if i * j == 0 else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[-1][-1]
+
+def test_edit_distance_matches_the_full_table():
+    rng = random.Random(3)
+    for _ in range(2000):
+        a = ''.join(rng.choice('abc') for _ in range(rng.randrange(7)))
+        b = ''.join(rng.choice('abc') for _ in range(rng.randrange(7)))
+        limit = rng.randrange(4)
+        distance = reference_distance(a, b)
+        if distance <= limit:
+            assert edit_distance(a, b, limit) == distance
+        else:
+            assert edit_distance(a, b, limit) > limit
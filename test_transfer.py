@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+import _backend as b
+import _transfer as t
+
+
+def test_detect_format():
+    assert t.detect_format('dump.CSV') == 'csv'
+    assert t.detect_format('dump.ndjson') == 'jsonl'
+    assert t.detect_format('dump.txt', 'jsonl') == 'jsonl'
+    with pytest.raises(t.TransferError):
+        t.detect_format('dump.txt')
+    with pytest.raises(t.TransferError):
+        t.detect_format('dump.csv', 'xml')
+
+def test_rows_of_other_exports():
+    # Bitwarden style, named after the host and the username when there is no name
+    row = {'login_uri': 'https://github.com/login', 'login_username': 'alice', 'login_password': 'pw'}
+    assert t.entry_from_row(row) == ('github.com (alice)', 'pw', {'username': 'alice', 'url': 'https://github.com/login'})
+    assert t.entry_from_row({'Title': ' Bank ', 'Password': 'pw', 'Group': 'money'}) == ('Bank', 'pw', {'tags': 'money'})
+    assert t.entry_from_row({'name': 'no password'}) is None
+    assert t.entry_from_row({'url': 'https://example.com', 'password': ''}) is None
+    assert t.entry_from_row({'name': 'json', 'value': 12}) is None
+    assert t.entry_from_row({'name': 'json', 'value': 'pw', 'notes': ['not', 'text']}) is None
+
+def test_import_counts_what_it_did(vault, tmp_path):
+    b.set_password_in_vault('existing', 'old')
+    dump = tmp_path / 'dump.csv'
+    dump.write_text('﻿name,password,notes\nexisting,new,\nfresh,pw,hello\nbroken,,\nfresh,again,\n', encoding='utf-8')
+
+    stats = t.import_file(dump)
+    assert (stats['imported'], stats['skipped'], stats['invalid']) == (1, 2, 1)
+    assert b.get_password_from_vault('existing') == 'old'
+    assert b.get_password_from_vault('fresh') == 'pw'
+    assert b.get_password_from_vault('fresh', 'notes') == 'hello'
+
+    stats = t.import_file(dump, overwrite=True)
+    assert stats['overwritten'] == 2
+    assert b.get_password_from_vault('existing') == 'new'
+
+def test_broken_json_lines_are_refused(vault, tmp_path):
+    dump = tmp_path / 'dump.jsonl'
+    dump.write_text('{"name": "a", "value": "pw"}\n\n[1, 2]\n', encoding='utf-8')
+    with pytest.raises(t.TransferError, match=':3: expected a JSON object'):
+        t.import_file(dump)
+
+def test_export_is_private_and_complete(vault, tmp_path):
+    b.add_passwords_to_vault({f'name{i}': f'pw{i}' for i in range(25)})
+    dump = tmp_path / 'dump.csv'
+    assert t.export_file(dump) == 25
+    assert os.stat(dump).st_mode & 0o777 == 0o600
+    lines = dump.read_text(encoding='utf-8').splitlines()
+    assert lines[0] == ','.join(['name', 'password'] + list(b.ENTRY_FIELDS))
+    assert len(lines) == 26 and not (tmp_path / 'dump.csv.tmp').exists()
+
+@pytest.mark.parametrize('file_format', t.FORMATS)
+def test_an_export_imports_back_under_the_same_names(vault, tmp_path, file_format):
+    b.set_entry_in_vault('github', 'pw1', {'username': 'alice', 'url': 'https://github.com', 'tags': 'work'})
+    b.set_entry_in_vault('github.com (bob)', 'pw2', {'username': 'bob'})
+    b.set_entry_in_vault('bank', 'pw3')
+    before = {name: [b.get_password_from_vault(name, field) for field in ('value',) + b.ENTRY_FIELDS]
+              for name in b.get_entries_from_vault()}
+    dump = tmp_path / f'dump.{file_format}'
+    assert t.export_file(dump) == 3
+
+    for name in before:
+        b.delete_password_from_vault(name)
+    assert t.import_file(dump)['imported'] == 3
+    after = {name: [b.get_password_from_vault(name, field) for field in ('value',) + b.ENTRY_FIELDS]
+             for name in b.get_entries_from_vault()}
+    assert after == before
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+import _vaultfile as vf
+
+
+def make_records(count: int) -> list[tuple[bytes, int, list[bytes]]]:
+    return [(os.urandom(32), i % 2, [b'name%d' % i, b'value%d' % i] + ([b'', b'url', b'terms'] if i % 3 else []))
+            for i in range(count)]
+
+def write(tmp_path, records) -> object:
+    file_path = tmp_path / 'vault.pmv'
+    with open(file_path, 'wb') as f:
+        assert vf.write_vault_file(f, records) == len(records)
+    return file_path
+
+
+def test_records_read_back_in_order(tmp_path):
+    records = make_records(50)
+    with vf.VaultReader(write(tmp_path, records)) as reader:
+        assert reader.version == vf.VERSION
+        assert len(reader) == 50
+        assert [(idx, flags, [bytes(field) for field in fields]) for idx, flags, fields in reader] == records
+
+def test_get_finds_every_record_and_nothing_else(tmp_path):
+    records = make_records(200)
+    with vf.VaultReader(write(tmp_path, records)) as reader:
+        for idx, flags, fields in records:
+            found_flags, found_fields = reader.get(idx)
+            assert found_flags == flags and [bytes(field) for field in found_fields] == fields
+        assert reader.get(b'\x00' * 32) is None
+        assert reader.get(b'\xff' * 32) is None
+
+def test_empty_vault(tmp_path):
+    with vf.VaultReader(write(tmp_path, [])) as reader:
+        assert len(reader) == 0
+        assert list(reader) == []
+        assert reader.get(os.urandom(32)) is None
+
+def test_raw_records_decode_to_the_same_records(tmp_path):
+    records = make_records(20)
+    with vf.VaultReader(write(tmp_path, records)) as reader:
+        raw = b''.join(bytes(data) for _, data in reader.iter_raw())
+    assert list(vf.decode_records(raw)) == records
+    with pytest.raises(vf.VaultFormatError):
+        list(vf.decode_records(raw[:-1]))
+
+def test_v2_files_are_readable(tmp_path):
+    file_path = write(tmp_path, make_records(3))
+    data = bytearray(file_path.read_bytes())
+    magic, _, flags, count, table_offset, reserved = vf.HEADER.unpack_from(data, 0)
+    vf.HEADER.pack_into(data, 0, magic, 2, flags, count, table_offset, reserved)
+    file_path.write_bytes(bytes(data))
+    with vf.VaultReader(file_path) as reader:
+        assert reader.version == 2 and len(list(reader)) == 3
+
+@pytest.mark.parametrize('content, message', [
+    (b'', 'empty'),
+    (b'not a vault' + bytes(64), 'not a vault'),
+    (vf.HEADER.pack(vf.MAGIC, 99, 0, 0, vf.HEADER.size, 0), 'unsupported'),
+])
+def test_bad_files_are_refused(tmp_path, content, message):
+    file_path = tmp_path / 'vault.pmv'
+    file_path.write_bytes(content)
+    with pytest.raises(vf.VaultFormatError, match=message):
+        vf.VaultReader(file_path)
+    assert vf.is_vault_file(file_path) == content.startswith(vf.MAGIC)